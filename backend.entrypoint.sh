@@ -38,6 +38,18 @@ else:
     print(f"Superuser '{username}' already exists.")
 EOF
 
+# blacklisted tokens of the token_blacklist tables move to the Redis blacklist, expired rows are removed
+python manage.py purge_expired_tokens
+
 python manage.py rqworker default &
+# periodic jobs (token cleanup at TOKEN_CLEANUP_CRON, email outbox flush every EMAIL_FLUSH_INTERVAL seconds)
+python manage.py rqcron &
+# transactional emails: SimpleWorker runs the jobs in the worker process, so the SMTP connection is reused
+python manage.py rqworker emails --worker-class rq.worker.SimpleWorker &
+
+# HLS_ASYNC_STREAMING=True serves the async streaming views via ASGI (uvicorn workers)
+if [ "$HLS_ASYNC_STREAMING" = "True" ]; then
+  exec gunicorn core.asgi:application -k uvicorn_worker.UvicornWorker --bind 0.0.0.0:8000 --reload
+fi
 
 exec gunicorn core.wsgi:application --bind 0.0.0.0:8000 --reload
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 from dotenv import load_dotenv
 from datetime import timedelta
 
@@ -129,6 +130,90 @@ RQ_QUEUES = {
     },
 }
 
+# HLS transcoding
+# 'per_rendition': one ffmpeg process per resolution, audio muxed into every rendition
+# 'single_decode': one ffmpeg process for all resolutions with a shared audio rendition
+HLS_TRANSCODE_MODE = os.environ.get(
+    "HLS_TRANSCODE_MODE", default="per_rendition")
+# segment container: 'mpegts' (.ts, HLS only) or 'fmp4' (CMAF .m4s segments with an init segment,
+# referenced by the HLS playlists and a DASH manifest)
+HLS_SEGMENT_FORMAT = os.environ.get("HLS_SEGMENT_FORMAT", default="mpegts")
+# one media file per rendition, addressed with EXT-X-BYTERANGE, instead of a file per segment
+HLS_SINGLE_FILE = os.environ.get("HLS_SINGLE_FILE", default="False") == "True"
+# how many renditions are encoded at the same time in 'per_rendition' mode
+HLS_MAX_PARALLEL_RENDITIONS = int(
+    os.environ.get("HLS_MAX_PARALLEL_RENDITIONS", default=3))
+# ffmpeg threads per rendition, 0 shares the CPU cores between the parallel encodes
+HLS_THREADS_PER_RENDITION = int(
+    os.environ.get("HLS_THREADS_PER_RENDITION", default=0))
+# split long sources into keyframe aligned chunks that are encoded as separate RQ jobs
+HLS_CHUNKED_TRANSCODING = os.environ.get(
+    "HLS_CHUNKED_TRANSCODING", default="False") == "True"
+HLS_CHUNK_SECONDS = int(os.environ.get("HLS_CHUNK_SECONDS", default=120))
+HLS_CHUNK_QUEUE = os.environ.get("HLS_CHUNK_QUEUE", default="default")
+RQ_QUEUES.setdefault(HLS_CHUNK_QUEUE, RQ_QUEUES['default'])
+# seconds between two progress writes of a running transcode job
+HLS_PROGRESS_UPDATE_INTERVAL = float(
+    os.environ.get("HLS_PROGRESS_UPDATE_INTERVAL", default=2))
+# how segment bytes are sent: 'django' (FileResponse, sendfile via gunicorn),
+# 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache/lighttpd)
+HLS_SEGMENT_DELIVERY = os.environ.get("HLS_SEGMENT_DELIVERY", default="django")
+# internal nginx location that aliases MEDIA_ROOT/hls/
+HLS_X_ACCEL_PREFIX = os.environ.get(
+    "HLS_X_ACCEL_PREFIX", default="/protected-hls/")
+# segment URLs change with every transcode, so the segments themselves never change
+HLS_SEGMENT_CACHE_CONTROL = os.environ.get(
+    "HLS_SEGMENT_CACHE_CONTROL", default="private, max-age=31536000, immutable")
+# single-file mode: media files every worker process keeps open, seconds until an open file is checked again
+HLS_OPEN_FILES = int(os.environ.get("HLS_OPEN_FILES", default=256))
+HLS_OPEN_FILE_TTL = float(os.environ.get("HLS_OPEN_FILE_TTL", default=5))
+# trick-play: a preview frame every HLS_TRICKPLAY_INTERVAL seconds, HLS_TRICKPLAY_WIDTH px wide,
+# tiled into sprite sheets of HLS_TRICKPLAY_COLUMNS x HLS_TRICKPLAY_ROWS
+HLS_TRICKPLAY = os.environ.get("HLS_TRICKPLAY", default="True") == "True"
+HLS_TRICKPLAY_INTERVAL = int(
+    os.environ.get("HLS_TRICKPLAY_INTERVAL", default=10))
+HLS_TRICKPLAY_WIDTH = int(os.environ.get("HLS_TRICKPLAY_WIDTH", default=160))
+HLS_TRICKPLAY_COLUMNS = int(
+    os.environ.get("HLS_TRICKPLAY_COLUMNS", default=10))
+HLS_TRICKPLAY_ROWS = int(os.environ.get("HLS_TRICKPLAY_ROWS", default=10))
+# readiness index of playable renditions: seconds a process trusts its local copy
+HLS_READINESS_LOCAL_TTL = float(
+    os.environ.get("HLS_READINESS_LOCAL_TTL", default=5))
+HLS_READINESS_CACHE_SIZE = int(
+    os.environ.get("HLS_READINESS_CACHE_SIZE", default=2048))
+# seconds Redis keeps an empty entry (a video that is not ready or does not exist); entries with renditions don't expire
+HLS_READINESS_EMPTY_TIMEOUT = int(
+    os.environ.get("HLS_READINESS_EMPTY_TIMEOUT", default=60))
+# serve manifests and segments with the async views (run core.asgi:application with uvicorn workers)
+HLS_ASYNC_STREAMING = os.environ.get(
+    "HLS_ASYNC_STREAMING", default="False") == "True"
+# signed segment URLs (HMAC bound to user, video, resolution and expiry)
+HLS_SIGNED_SEGMENT_URLS = os.environ.get(
+    "HLS_SIGNED_SEGMENT_URLS", default="False") == "True"
+# seconds a signature stays valid; every media playlist fetch is signed again, so it can be short
+HLS_SIGNED_URL_TTL = int(os.environ.get(
+    "HLS_SIGNED_URL_TTL", default=60 * 10))
+HLS_SIGNING_KEY = os.environ.get("HLS_SIGNING_KEY", default=SECRET_KEY)
+# rewritten manifests: entries of the in-process LRU and lifetime in Redis (seconds)
+HLS_MANIFEST_CACHE_SIZE = int(
+    os.environ.get("HLS_MANIFEST_CACHE_SIZE", default=512))
+HLS_MANIFEST_CACHE_TIMEOUT = int(
+    os.environ.get("HLS_MANIFEST_CACHE_TIMEOUT", default=60 * 60))
+
+# where sources and HLS output are stored: 'local' (MEDIA_ROOT) or 's3' (S3 compatible bucket via
+# django-storages); with 's3' the transcode jobs stage their output in HLS_WORK_DIR and upload it
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", default="local")
+HLS_WORK_DIR = os.environ.get(
+    "HLS_WORK_DIR", default=os.path.join(tempfile.gettempdir(), "videoflix-hls"))
+HLS_UPLOAD_INTERVAL = float(os.environ.get("HLS_UPLOAD_INTERVAL", default=2))
+S3_BUCKET = os.environ.get("S3_BUCKET", default="videoflix")
+S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL", default="")
+S3_REGION = os.environ.get("S3_REGION", default="")
+S3_ACCESS_KEY_ID = os.environ.get("S3_ACCESS_KEY_ID", default="")
+S3_SECRET_ACCESS_KEY = os.environ.get("S3_SECRET_ACCESS_KEY", default="")
+# lifetime of the presigned segment URLs the segment endpoint redirects to
+S3_URL_EXPIRE = int(os.environ.get("S3_URL_EXPIRE", default=600))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -185,6 +270,17 @@ EMAIL_HOST_PASSWORD = os.environ.get(
     'EMAIL_HOST_PASSWORD', default='your_smtp_password')
 EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', default='True') == 'True'
 EMAIL_USE_SSL = os.environ.get('EMAIL_USE_SSL', default='False') == 'True'
+# transactional emails are sent by RQ jobs on EMAIL_QUEUE (worker: rqworker emails --worker-class rq.worker.SimpleWorker)
+EMAIL_QUEUE = os.environ.get('EMAIL_QUEUE', default='emails')
+RQ_QUEUES.setdefault(EMAIL_QUEUE, RQ_QUEUES['default'])
+# emails taken from the outbox at a time, idle seconds before the worker reconnects,
+# seconds until a pending flush job no longer keeps new emails from enqueueing another one,
+# seconds between the periodic flushes by rqcron (which send the emails of a lost flush job)
+EMAIL_BATCH_SIZE = int(os.environ.get('EMAIL_BATCH_SIZE', default=50))
+EMAIL_CONNECTION_MAX_IDLE = int(
+    os.environ.get('EMAIL_CONNECTION_MAX_IDLE', default=30))
+EMAIL_FLUSH_TIMEOUT = int(os.environ.get('EMAIL_FLUSH_TIMEOUT', default=60))
+EMAIL_FLUSH_INTERVAL = int(os.environ.get('EMAIL_FLUSH_INTERVAL', default=60))
 
 PASSWORD_RESET_TIMEOUT = 60 * 60 * 24
 
@@ -193,10 +289,57 @@ REST_FRAMEWORK = {
         "user_auth_app.api.authentication.CookieJWTAuthentication",
         "rest_framework_simplejwt.authentication.JWTAuthentication",
     ),
+    # token buckets of the auth endpoints ('<requests>/<sec|min|hour|day>'), per client IP and per email address
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': os.environ.get('THROTTLE_LOGIN_IP', default='20/min'),
+        'login_email': os.environ.get('THROTTLE_LOGIN_EMAIL', default='5/min'),
+        'register_ip': os.environ.get('THROTTLE_REGISTER_IP', default='10/hour'),
+        'register_email': os.environ.get('THROTTLE_REGISTER_EMAIL', default='3/hour'),
+        'password_reset_ip': os.environ.get('THROTTLE_PASSWORD_RESET_IP', default='10/hour'),
+        'password_reset_email': os.environ.get('THROTTLE_PASSWORD_RESET_EMAIL', default='3/hour'),
+    },
+    # number of reverse proxies in front of Django, so the client IP is taken from X-Forwarded-For
+    'NUM_PROXIES': int(os.environ['NUM_PROXIES']) if os.environ.get('NUM_PROXIES') else None,
 }
 
+# video list: default and maximum page size of the cursor pagination
+VIDEO_LIST_PAGE_SIZE = int(os.environ.get("VIDEO_LIST_PAGE_SIZE", default=24))
+VIDEO_LIST_MAX_PAGE_SIZE = int(
+    os.environ.get("VIDEO_LIST_MAX_PAGE_SIZE", default=100))
+# thumbnail variants: widths (px) rendered as WebP and JPEG, and the RQ queue of the thumbnail jobs
+THUMBNAIL_WIDTHS = tuple(int(width) for width in os.environ.get(
+    "THUMBNAIL_WIDTHS", default="320,640,1280").split(","))
+THUMBNAIL_QUEUE = os.environ.get("THUMBNAIL_QUEUE", default="default")
+# videos per materialized category row (home screen)
+CATALOG_ROW_SIZE = int(os.environ.get("CATALOG_ROW_SIZE", default=20))
+# lifetime (seconds) of cached video list pages; changes replace the catalog version anyway
+CATALOG_CACHE_TIMEOUT = int(
+    os.environ.get("CATALOG_CACHE_TIMEOUT", default=60 * 60))
+# resumable uploads: partial files (same filesystem as MEDIA_ROOT, so completed files are moved, not copied),
+# suggested and maximum chunk size and maximum file size in bytes
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", default=str(MEDIA_ROOT / 'uploads'))
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", default=8 * 1024 * 1024))
+UPLOAD_MAX_CHUNK_SIZE = int(
+    os.environ.get("UPLOAD_MAX_CHUNK_SIZE", default=64 * 1024 * 1024))
+UPLOAD_MAX_SIZE = int(os.environ.get("UPLOAD_MAX_SIZE", default=50 * 1024 ** 3))
+# RQ queue of the jobs that verify and store completed uploads
+UPLOAD_QUEUE = os.environ.get("UPLOAD_QUEUE", default="default")
+RQ_QUEUES.setdefault(UPLOAD_QUEUE, RQ_QUEUES['default'])
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
     "ROTATE_REFRESH_TOKENS": True,
 }
+# refresh tokens are blacklisted in Redis; the rqcron job purges expired rows of the token_blacklist tables
+TOKEN_CLEANUP_CRON = os.environ.get("TOKEN_CLEANUP_CRON", default="17 3 * * *")
+TOKEN_CLEANUP_BATCH_SIZE = int(
+    os.environ.get("TOKEN_CLEANUP_BATCH_SIZE", default=1000))
+
+# authenticated users: entries/lifetime (seconds) of the in-process LRU and lifetime in Redis
+AUTH_USER_CACHE_SIZE = int(
+    os.environ.get("AUTH_USER_CACHE_SIZE", default=4096))
+AUTH_USER_LOCAL_TTL = float(
+    os.environ.get("AUTH_USER_LOCAL_TTL", default=5))
+AUTH_USER_CACHE_TIMEOUT = int(
+    os.environ.get("AUTH_USER_CACHE_TIMEOUT", default=300))
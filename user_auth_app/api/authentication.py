@@ -1,14 +1,23 @@
+from django.utils.translation import gettext_lazy as _
 from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .caching import aget_cached_user, get_cached_user
 
 
 class CookieJWTAuthentication(JWTAuthentication):
     """
     Custom JWT authentication class that retrieves the token from an HTTP-only cookie.
     If there is no token or it's invalid/expired, the request is treated as anonymous instead of raising an error. 
+    The user is resolved through the user cache, so authenticated requests normally don't query the database.
     """
 
-    def authenticate(self, request):
+    def get_cookie_or_header_token(self, request):
+        """
+        Returns the validated token from the Authorization header or the access_token cookie, or None.
+        """
         header = self.get_header(request)
         if header is not None:
             raw_token = self.get_raw_token(header)
@@ -18,12 +27,66 @@ class CookieJWTAuthentication(JWTAuthentication):
         if not raw_token:
             return None
         try:
-            validated_token = self.get_validated_token(raw_token)
+            return self.get_validated_token(raw_token)
         except (InvalidToken, TokenError) as e:
             return None
 
+    def authenticate(self, request):
+        validated_token = self.get_cookie_or_header_token(request)
+        if validated_token is None:
+            return None
+
         try:
             user = self.get_user(validated_token)
         except Exception as e:
             return None
         return (user, validated_token)
+
+    async def aauthenticate(self, request):
+        """
+        Async variant of authenticate for the ASGI views (plain Django requests).
+        """
+        validated_token = self.get_cookie_or_header_token(request)
+        if validated_token is None:
+            return None
+
+        try:
+            user = await self.aget_user(validated_token)
+        except Exception as e:
+            return None
+        return (user, validated_token)
+
+    def _get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                _("Token contained no recognizable user identification"))
+
+    def get_user(self, validated_token):
+        """
+        Same checks as JWTAuthentication.get_user, but the user is loaded via get_cached_user.
+        """
+        user = get_cached_user(self._get_user_id(validated_token))
+        return self._check_user(user, validated_token)
+
+    async def aget_user(self, validated_token):
+        user = await aget_cached_user(self._get_user_id(validated_token))
+        return self._check_user(user, validated_token)
+
+    def _check_user(self, user, validated_token):
+        if user is None:
+            raise AuthenticationFailed(
+                _("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(
+                _("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            revoke_token_hash = getattr(user, 'revoke_token_hash', None) or get_md5_hash_password(user.password)
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != revoke_token_hash:
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed")
+
+        return user
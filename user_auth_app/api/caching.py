@@ -0,0 +1,120 @@
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from core.caching import LocalLRUCache
+
+
+# the user fields authentication and the permission checks read; every other field is loaded on first access
+CACHED_USER_FIELDS = ('id', 'is_active', 'is_staff', 'is_superuser')
+
+user_cache = LocalLRUCache(
+    maxsize=settings.AUTH_USER_CACHE_SIZE, ttl=settings.AUTH_USER_LOCAL_TTL)
+
+
+def _version_key(user_id) -> str:
+    return f"auth-user-version:{user_id}"
+
+
+def _user_key(user_id, version: str) -> str:
+    return f"auth-user-fields:{user_id}:{version}"
+
+
+def _get_user_version(user_id) -> str:
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(_version_key(user_id), version, timeout=None):
+            version = cache.get(_version_key(user_id)) or version
+    return version
+
+
+def _user_entry(user) -> dict:
+    """
+    The cached part of a user: CACHED_USER_FIELDS and, only if tokens are revoked on password changes,
+    the digest the token claim is compared with. The password hash itself is never cached.
+    """
+    entry = {name: getattr(user, name) for name in CACHED_USER_FIELDS}
+    entry['revoke_token_hash'] = get_md5_hash_password(
+        user.password) if api_settings.CHECK_REVOKE_TOKEN else None
+    return entry
+
+
+def _user_from_entry(entry: dict):
+    """
+    Builds a user instance from a cache entry. The other fields are deferred, like in a query with only().
+    """
+    User = get_user_model()
+    field_names = [field.attname for field in User._meta.concrete_fields if field.attname in CACHED_USER_FIELDS]
+    user = User.from_db(User.objects.db, field_names, [entry[name] for name in field_names])
+    user.revoke_token_hash = entry['revoke_token_hash']
+    return user
+
+
+def get_cached_user(user_id):
+    """
+    Returns the user from a short-lived process-local LRU, then Redis; the database is only queried on a miss in both.
+    Redis entries are keyed by a per-user version, which is replaced whenever the user is saved or deleted.
+    The token claim is a string and instance.pk an int, so keys always use str(user_id).
+    Returns None if the user does not exist. Every call builds a new instance, so request-level changes
+    don't leak into the cache.
+    """
+    user_id = str(user_id)
+    entry = user_cache.get(user_id)
+    if entry is None:
+        version = _get_user_version(user_id)
+        key = _user_key(user_id, version)
+        entry = cache.get(key)
+        if entry is None:
+            User = get_user_model()
+            user = User.objects.filter(pk=user_id).first()
+            if user is None:
+                return None
+            entry = _user_entry(user)
+            cache.set(key, entry, timeout=settings.AUTH_USER_CACHE_TIMEOUT)
+        user_cache.set(user_id, entry)
+    return _user_from_entry(entry)
+
+
+async def _aget_user_version(user_id: str) -> str:
+    version = await cache.aget(_version_key(user_id))
+    if version is None:
+        version = uuid.uuid4().hex
+        if not await cache.aadd(_version_key(user_id), version, timeout=None):
+            version = await cache.aget(_version_key(user_id)) or version
+    return version
+
+
+async def aget_cached_user(user_id):
+    """
+    Async variant of get_cached_user for the ASGI views (async cache and ORM calls).
+    """
+    user_id = str(user_id)
+    entry = user_cache.get(user_id)
+    if entry is None:
+        version = await _aget_user_version(user_id)
+        key = _user_key(user_id, version)
+        entry = await cache.aget(key)
+        if entry is None:
+            User = get_user_model()
+            user = await User.objects.filter(pk=user_id).afirst()
+            if user is None:
+                return None
+            entry = _user_entry(user)
+            await cache.aset(key, entry, timeout=settings.AUTH_USER_CACHE_TIMEOUT)
+        user_cache.set(user_id, entry)
+    return _user_from_entry(entry)
+
+
+def invalidate_cached_user(user_id):
+    """
+    Gives the user a new version, so the old Redis entry is never read again.
+    Other processes drop their local copy after at most AUTH_USER_LOCAL_TTL seconds.
+    """
+    user_id = str(user_id)
+    cache.set(_version_key(user_id), uuid.uuid4().hex, timeout=None)
+    user_cache.delete(user_id)
@@ -0,0 +1,145 @@
+import functools
+import json
+import smtplib
+import time
+from email.mime.image import MIMEImage
+from pathlib import Path
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template.loader import render_to_string
+from django_rq import get_queue
+from rq import Retry
+
+
+LOGO_CID = 'videoflix-logo'
+OUTBOX_KEY = 'email:outbox'
+FLUSH_SCHEDULED_KEY = 'email:flush-scheduled'
+
+# SMTP connection of the email worker process (see get_smtp_connection)
+_connection = None
+_connection_used_at = 0.0
+
+
+@functools.cache
+def get_logo() -> bytes:
+    """
+    Returns the logo image, read once per process. Empty if the file is missing.
+    """
+    logo_path = Path(settings.BASE_DIR) / 'static' / 'videoflix_icon.png'
+    try:
+        return logo_path.read_bytes()
+    except FileNotFoundError:
+        return b''
+
+
+def queue_email(recipient: str, subject: str, message: str, template: str, context: dict):
+    """
+    Puts an email into the outbox (a Redis list) and enqueues a flush job on EMAIL_QUEUE unless one is
+    already pending, so a burst of emails is sent by a single job. Rendering and SMTP run in the worker.
+    """
+    queue = get_queue(settings.EMAIL_QUEUE)
+    redis = queue.connection
+    redis.rpush(OUTBOX_KEY, json.dumps({
+        'to': recipient,
+        'subject': subject,
+        'message': message,
+        'template': template,
+        'context': context,
+    }))
+    if redis.set(FLUSH_SCHEDULED_KEY, 1, nx=True, ex=settings.EMAIL_FLUSH_TIMEOUT):
+        queue.enqueue(flush_email_outbox, retry=Retry(max=3, interval=[10, 60, 300]))
+
+
+def build_email(payload: dict) -> EmailMultiAlternatives:
+    """
+    Renders an outbox entry. The logo is attached once as an inline image and referenced by its Content-ID
+    (cid:videoflix-logo) instead of being inlined as base64 into the HTML.
+    """
+    html_message = render_to_string(payload['template'], {**payload['context'], 'logo_cid': LOGO_CID})
+    email = EmailMultiAlternatives(
+        subject=payload['subject'],
+        body=payload['message'],
+        from_email=getattr(settings, 'EMAIL_HOST_USER', "no-reply@example.com"),
+        to=[payload['to']],
+    )
+    email.attach_alternative(html_message, 'text/html')
+
+    logo = get_logo()
+    if logo:
+        image = MIMEImage(logo, 'png')
+        image.add_header('Content-ID', f'<{LOGO_CID}>')
+        image.add_header('Content-Disposition', 'inline', filename='videoflix_icon.png')
+        email.mixed_subtype = 'related'
+        email.attach(image)
+    return email
+
+
+def close_smtp_connection():
+    global _connection
+    if _connection is not None:
+        _connection.close()
+        _connection = None
+
+
+def get_smtp_connection():
+    """
+    Returns the SMTP connection of the worker process. It stays open across jobs (the email worker runs as
+    SimpleWorker, so jobs don't fork) and is reopened after EMAIL_CONNECTION_MAX_IDLE seconds without use,
+    before the server drops it.
+    """
+    global _connection, _connection_used_at
+    if _connection is not None and time.monotonic() - _connection_used_at > settings.EMAIL_CONNECTION_MAX_IDLE:
+        close_smtp_connection()
+    if _connection is None:
+        _connection = get_connection(fail_silently=False)
+        _connection.open()
+    _connection_used_at = time.monotonic()
+    return _connection
+
+
+def send_email(email: EmailMultiAlternatives):
+    try:
+        get_smtp_connection().send_messages([email])
+    except (smtplib.SMTPServerDisconnected, ConnectionError):
+        # the server closed the connection in the meantime, reconnect once
+        close_smtp_connection()
+        get_smtp_connection().send_messages([email])
+
+
+def flush_email_outbox():
+    """
+    RQ job (EMAIL_QUEUE, also run periodically by rqcron): takes the outbox in batches of EMAIL_BATCH_SIZE and
+    sends them one by one over one SMTP connection. If sending fails, the emails not sent yet are put back
+    into the outbox and the job is retried; the ones already sent are not sent twice.
+    """
+    redis = get_queue(settings.EMAIL_QUEUE).connection
+    # emails queued from now on schedule a new job, so none of them is left behind
+    redis.delete(FLUSH_SCHEDULED_KEY)
+
+    sent = 0
+    while True:
+        batch = redis.lpop(OUTBOX_KEY, settings.EMAIL_BATCH_SIZE)
+        if not batch:
+            break
+
+        for position, item in enumerate(batch):
+            payload = json.loads(item)
+            try:
+                email = build_email(payload)
+            except Exception as e:
+                print(f"[EMAIL] Could not render email to {payload['to']}, dropped: {e}")
+                continue
+
+            try:
+                send_email(email)
+            except Exception as e:
+                unsent = batch[position:]
+                redis.lpush(OUTBOX_KEY, *reversed(unsent))
+                print(f"[EMAIL] Sent {sent} emails, failed to send {len(unsent)}, back in the outbox: {e}")
+                raise
+            sent += 1
+
+    if sent:
+        print(f"[EMAIL] Sent {sent} emails")
+    return sent
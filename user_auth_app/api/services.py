@@ -1,33 +1,13 @@
-import base64
-from pathlib import Path
-from django.conf import settings
-from django.template.loader import render_to_string
-from django.templatetags.static import static
-from django.core.mail import send_mail
-from django.conf import settings
-from django.urls import reverse
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 from django.contrib.auth.tokens import default_token_generator
 
-
-def get_logo_base64() -> str:
-    """
-    Returns the base64 encoded string of the logo image.
-    """
-
-    logo_path = Path(settings.BASE_DIR) / 'static'/'videoflix_icon.png'
-
-    try:
-        with open(logo_path, 'rb') as f:
-            return base64.b64encode(f.read()).decode('ascii')
-    except FileNotFoundError:
-        return ''
+from .emails import queue_email
 
 
 def send_activation_email(user, request):
     """
-    Creates an activation link and a token for the user and sends an activation email to the user's email address.
+    Creates an activation link and a token for the user and queues an activation email to the user's email address.
     It also returns the Token, uidb64 and Link.
     """
     frontend_url = 'http://127.0.0.1:5500'
@@ -37,33 +17,22 @@ def send_activation_email(user, request):
     activation_link = (
         f"{frontend_url}/pages/auth/activate.html"f"?uid={uidb64}&token={token}")
 
-    logo_base64 = get_logo_base64()
-    # logo_url = request.build_absolute_uri("user_auth_app/videoflix_icon.png")
     subject = 'Confirm your Email'
-    html_message = render_to_string(
-        'activation_email.html', {'activation_link': activation_link, "logo_base64": logo_base64, 'user': user})
-
     plain_message = (
         f"Bitte aktiviere deinen Account über folgenden Link:\n{activation_link}")
 
     try:
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=getattr(settings, 'EMAIL_HOST_USER',
-                               "no-reply@example.com"),
-            recipient_list=[user.email],
-            html_message=html_message,
-        )
+        queue_email(user.email, subject, plain_message,
+                    'activation_email.html', {'activation_link': activation_link})
     except Exception as e:
-        print(f"[EMAIL] failed to send activation email to {user.email}: {e}")
+        print(f"[EMAIL] failed to queue activation email to {user.email}: {e}")
 
     return token, uidb64, activation_link
 
 
 def send_password_reset_email(user, request):
     """
-    Creates a password reset link and a token for the user and sends a mail to the user's email address.
+    Creates a password reset link and a token for the user and queues a mail to the user's email address.
     The Link points to the frontend and includes uid & token as query parameters. 
     """
     frontend_url = 'http://127.0.0.1:5500'
@@ -74,8 +43,6 @@ def send_password_reset_email(user, request):
     reset_link = (f"{frontend_url}/pages/auth/confirm_password.html"
                   f"?uid={uidb64}&token={token}")
 
-    logo_base64 = get_logo_base64()
-
     subject = 'Password Reset Request'
     plain_message = (
         f"Hello {user.username},\n\n"
@@ -87,25 +54,10 @@ def send_password_reset_email(user, request):
         "Best regards, \n"
         "Your Videoflix team!")
 
-    html_message = render_to_string(
-        "password_reset_email.html",
-        {
-            "reset_link": reset_link,
-            "logo_base64": logo_base64,
-            "user": user,
-        },
-    )
-
     try:
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=getattr(settings, "EMAIL_HOST_USER",
-                               "no-reply@example.com"),
-            recipient_list=[user.email],
-            html_message=html_message,
-        )
+        queue_email(user.email, subject, plain_message,
+                    "password_reset_email.html", {"reset_link": reset_link})
     except Exception as e:
         print(
-            f"[EMAIL] Failed to send password reset mail to {user.email}: {e}")
+            f"[EMAIL] Failed to queue password reset mail to {user.email}: {e}")
     return uidb64, token, reset_link
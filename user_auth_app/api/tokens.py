@@ -0,0 +1,81 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import BlacklistMixin, RefreshToken
+
+
+def _blacklist_key(jti: str) -> str:
+    return f"token-blacklist:{jti}"
+
+
+def blacklist_jti(jti: str, exp: int):
+    """
+    Blacklists a token id until the token expires anyway, then the key disappears on its own.
+    """
+    timeout = int(exp - time.time())
+    if timeout > 0:
+        cache.set(_blacklist_key(jti), 1, timeout=timeout)
+
+
+class RedisRefreshToken(RefreshToken):
+    """
+    Refresh token with the blacklist in Redis instead of the token_blacklist tables: blacklist() stores
+    the jti until the token's exp and the check is a single key lookup. No OutstandingToken or
+    BlacklistedToken rows are written.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        # skips BlacklistMixin.for_user, which inserts an OutstandingToken row
+        return super(BlacklistMixin, cls).for_user(user)
+
+    def check_blacklist(self):
+        if cache.has_key(_blacklist_key(self.payload[api_settings.JTI_CLAIM])):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        blacklist_jti(self.payload[api_settings.JTI_CLAIM], self.payload['exp'])
+
+    def outstand(self):
+        return None
+
+
+def copy_blacklist_to_redis() -> int:
+    """
+    Copies the unexpired blacklisted tokens of the token_blacklist tables (written before the Redis blacklist)
+    into Redis, so they stay blacklisted until they expire. A one-off migration step, run by the
+    purge_expired_tokens command on startup, not by the scheduled cleanup.
+    """
+    rows = BlacklistedToken.objects.filter(
+        token__expires_at__gt=timezone.now()).values_list('token__jti', 'token__expires_at')
+    copied = 0
+    for jti, expires_at in rows.iterator():
+        blacklist_jti(jti, expires_at.timestamp())
+        copied += 1
+    return copied
+
+
+def purge_expired_tokens(batch_size: int = None) -> int:
+    """
+    Scheduled job (rqcron, TOKEN_CLEANUP_CRON): deletes expired OutstandingToken rows and their BlacklistedToken
+    rows in batches of TOKEN_CLEANUP_BATCH_SIZE, so no single delete locks the tables for long.
+    """
+    batch_size = batch_size or settings.TOKEN_CLEANUP_BATCH_SIZE
+    deleted = 0
+    while True:
+        ids = list(OutstandingToken.objects.filter(
+            expires_at__lte=timezone.now()).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        BlacklistedToken.objects.filter(token_id__in=ids).delete()
+        OutstandingToken.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+
+    print(f"[TOKENS] Deleted {deleted} expired tokens")
+    return deleted
@@ -8,11 +8,12 @@ from rest_framework import status
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
 
 from .serializers import RegisterSerializer, LoginSerializer, PasswordResetRequestSerializer, PasswordResetConfirmSerializer
 from .services import send_activation_email, send_password_reset_email
+from .throttling import AuthEmailThrottle, AuthIPThrottle
+from .tokens import RedisRefreshToken
 
 User = get_user_model()
 
@@ -24,7 +25,10 @@ class RegisterView(APIView):
     -creates an inactive user account and triggers the email activation process
     -returns basic user information after successful registration.
     """
+    authentication_classes = []
     permission_classes = [AllowAny]
+    throttle_classes = [AuthIPThrottle, AuthEmailThrottle]
+    throttle_scope = 'register'
 
     def post(self, request, *args, **kwargs):
         serializer = RegisterSerializer(data=request.data)
@@ -77,7 +81,10 @@ class LoginView(APIView):
     This view generates access- and refresh JWT tokens if a user tries to log-in with valid credentials. 
     The tokens will be stored in httponly cookies
     """
+    authentication_classes = []
     permission_classes = [AllowAny]
+    throttle_classes = [AuthIPThrottle, AuthEmailThrottle]
+    throttle_scope = 'login'
 
     def post(self, request, *args, **kwargs):
         serializer = LoginSerializer(data=request.data)
@@ -85,7 +92,7 @@ class LoginView(APIView):
 
         user = serializer.validated_data['user']
 
-        refresh = RefreshToken.for_user(user)
+        refresh = RedisRefreshToken.for_user(user)
         access_token = str(refresh.access_token)
 
         response = Response(
@@ -119,7 +126,7 @@ class LoginView(APIView):
 class LogoutView(APIView):
     """
     POST /api/lgout/
-    Blacklists the refresh-token and deletes the access and refresh tokens from cookies
+    Blacklists the refresh-token (in Redis, until it expires) and deletes the access and refresh tokens from cookies
     """
 
     permission_classes = [AllowAny]
@@ -130,7 +137,7 @@ class LogoutView(APIView):
         if refresh_token is None:
             return Response({'detail': 'Refresh token not provided.'}, status=status.HTTP_400_BAD_REQUEST,)
         try:
-            token = RefreshToken(refresh_token)
+            token = RedisRefreshToken(refresh_token)
             token.blacklist()
         except (TokenError, InvalidToken):
             return Response({"detail": "Invalid or already expired token"}, status=status.HTTP_400_BAD_REQUEST,)
@@ -148,6 +155,7 @@ class TokenRefreshView(APIView):
     Returns a new Access-Token an sets a new access_token cookie.
     """
 
+    authentication_classes = []
     permission_classes = [AllowAny]
 
     def post(self, request, *args, **kwargs):
@@ -156,7 +164,7 @@ class TokenRefreshView(APIView):
         if refresh_token is None:
             return Response({"detail": "Refresh token not provided"}, status=status.HTTP_400_BAD_REQUEST,)
         try:
-            refresh = RefreshToken(refresh_token)
+            refresh = RedisRefreshToken(refresh_token)
         except (TokenError, InvalidToken):
             return Response({"detail": "Invalid or expired refresh token"}, status=status.HTTP_401_UNAUTHORIZED,)
         new_access = str(refresh.access_token)
@@ -184,6 +192,8 @@ class PasswordResetRequestView(APIView):
     Sends a password reset email if the user with the provided email exists.
     """
     permission_classes = [AllowAny]
+    throttle_classes = [AuthIPThrottle, AuthEmailThrottle]
+    throttle_scope = 'password_reset'
 
     def post(self, request, *args, **kwargs):
         serializer = PasswordResetRequestSerializer(data=request.data)
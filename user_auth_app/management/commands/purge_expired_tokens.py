@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from user_auth_app.api.tokens import copy_blacklist_to_redis, purge_expired_tokens
+
+
+class Command(BaseCommand):
+    """
+    Copies the remaining blacklisted tokens into the Redis blacklist (the entrypoint runs it once on startup),
+    then runs the token cleanup once (the rqcron command schedules it): deletes expired rows of the
+    token_blacklist tables in batches.
+    """
+
+    help = 'Deletes expired outstanding and blacklisted refresh tokens.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.TOKEN_CLEANUP_BATCH_SIZE,
+                            help='Number of tokens deleted per batch.')
+
+    def handle(self, *args, **options):
+        copied = copy_blacklist_to_redis()
+        self.stdout.write(f"Copied {copied} blacklisted tokens into Redis.")
+        deleted = purge_expired_tokens(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired tokens."))
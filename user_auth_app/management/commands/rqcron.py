@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django_rq import get_connection
+from rq.cron import CronScheduler
+
+from user_auth_app.api.emails import flush_email_outbox
+from user_auth_app.api.tokens import purge_expired_tokens
+
+
+class Command(BaseCommand):
+    """
+    Runs the RQ cron scheduler, which enqueues the periodic jobs on their queue at their croniter schedule;
+    the rqworker of the queue executes them. Only one scheduler should run per Redis.
+    """
+
+    help = 'Enqueues the periodic RQ jobs (token cleanup, email outbox) according to their schedule.'
+
+    def handle(self, *args, **options):
+        cron = CronScheduler(connection=get_connection('default'))
+        cron.register(purge_expired_tokens, queue_name='default', cron=settings.TOKEN_CLEANUP_CRON)
+        self.stdout.write(f"Token cleanup scheduled: {settings.TOKEN_CLEANUP_CRON}")
+        cron.register(flush_email_outbox, queue_name=settings.EMAIL_QUEUE,
+                      interval=settings.EMAIL_FLUSH_INTERVAL)
+        self.stdout.write(f"Email outbox flush scheduled: every {settings.EMAIL_FLUSH_INTERVAL}s")
+        cron.start()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Video
+from .models import Video, TranscodeJob, RenditionJob, VideoUpload
 from .api.services import generate_hls_for_video
 
 # Register your models here.
@@ -8,3 +8,26 @@ from .api.services import generate_hls_for_video
 @admin.register(Video)
 class VideoAdmin(admin.ModelAdmin):
     list_display = ('title', 'category', 'created_at')
+    readonly_fields = ('duration', 'width', 'height',
+                       'frame_rate', 'video_codec', 'file_size', 'thumbnail_variants')
+
+
+class RenditionJobInline(admin.TabularInline):
+    model = RenditionJob
+    extra = 0
+    readonly_fields = ('name', 'status', 'progress', 'error', 'updated_at')
+
+
+@admin.register(TranscodeJob)
+class TranscodeJobAdmin(admin.ModelAdmin):
+    list_display = ('video', 'status', 'progress', 'updated_at')
+    list_filter = ('status',)
+    readonly_fields = ('rq_job_id', 'started_at', 'finished_at', 'updated_at')
+    inlines = [RenditionJobInline]
+
+
+@admin.register(VideoUpload)
+class VideoUploadAdmin(admin.ModelAdmin):
+    list_display = ('filename', 'user', 'status', 'bytes_received', 'size', 'updated_at')
+    list_filter = ('status',)
+    readonly_fields = ('received', 'bytes_received', 'error', 'video', 'created_at', 'updated_at')
@@ -0,0 +1,143 @@
+import asyncio
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.views import View
+
+from user_auth_app.api.authentication import CookieJWTAuthentication
+from ..models import Video
+from .caching import aget_ready_renditions, aget_rewritten_manifest, manifest_etag
+from .delivery import aserve_hls_file
+from .services import HLS_MASTER_PLAYLIST, is_valid_rendition
+from .signing import verify_segment_signature
+from .storage import read_hls_text, stat_hls_file
+from .views import (manifest_signature, playlist_response, rewrite_media_playlist,
+                    sign_media_playlist, stream_not_ready_payload)
+
+
+async def astream_not_ready_response(movie_id):
+    video = await Video.objects.filter(pk=movie_id).select_related(
+        'transcode_job').afirst()
+    data, status, headers = stream_not_ready_payload(video)
+    return JsonResponse(data, status=status, headers=headers)
+
+
+def not_authenticated_response():
+    return JsonResponse(
+        {"detail": "Authentication credentials were not provided."},
+        status=401,
+        headers={'WWW-Authenticate': 'Bearer realm="api"'},
+    )
+
+
+async def aplaylist_response(request, build, etag: str, mtime: float):
+    """
+    Like playlist_response, but the body is only built (awaited) if the client has no current copy.
+    """
+    content = None
+    if get_conditional_response(request, etag=etag, last_modified=int(mtime)) is None:
+        content = await build()
+    return playlist_response(request, content, etag, mtime)
+
+
+class AsyncStreamingView(View):
+    """
+    Base class of the async streaming views (ASGI, HLS_ASYNC_STREAMING).
+    Plain Django views instead of DRF: authentication uses the async cookie/header JWT check,
+    the user comes from the user cache and all file reads run in worker threads.
+    """
+
+    async def authenticate(self, request):
+        result = await CookieJWTAuthentication().aauthenticate(request)
+        if result is None:
+            return None
+        request.user = result[0]
+        return result[0]
+
+
+class AsyncVideoMasterManifestView(AsyncStreamingView):
+    """
+    GET /api/video/<int:movie_id>/master.m3u8 (async)
+    """
+
+    async def get(self, request, movie_id):
+        if await self.authenticate(request) is None:
+            return not_authenticated_response()
+
+        if not await aget_ready_renditions(movie_id):
+            return await astream_not_ready_response(movie_id)
+
+        try:
+            stat = await asyncio.to_thread(stat_hls_file, movie_id, HLS_MASTER_PLAYLIST)
+        except FileNotFoundError:
+            return await astream_not_ready_response(movie_id)
+
+        etag = manifest_etag(movie_id, HLS_MASTER_PLAYLIST, '', stat.mtime_ns)
+        return await aplaylist_response(
+            request, lambda: asyncio.to_thread(read_hls_text, movie_id, HLS_MASTER_PLAYLIST), etag, stat.mtime)
+
+
+class AsyncVideoStreamManifestView(AsyncStreamingView):
+    """
+    GET /api/video/<int:movie_id>/<str:resolution>/index.m3u8 (async)
+    Same caching, signing and revalidation as VideoStreamManifestAPIView.
+    """
+
+    async def get(self, request, movie_id, resolution):
+        user = await self.authenticate(request)
+        if user is None:
+            return not_authenticated_response()
+
+        if not is_valid_rendition(resolution):
+            return JsonResponse({'detail': 'Resolution not found'}, status=404)
+
+        if resolution not in await aget_ready_renditions(movie_id):
+            return await astream_not_ready_response(movie_id)
+
+        try:
+            stat = await asyncio.to_thread(stat_hls_file, movie_id, resolution, 'index.m3u8')
+        except FileNotFoundError:
+            return await astream_not_ready_response(movie_id)
+
+        host = request.build_absolute_uri('/')
+        base_url = request.build_absolute_uri(
+            f"/api/video/{movie_id}/{resolution}/")
+
+        def rewrite():
+            return rewrite_media_playlist(
+                read_hls_text(movie_id, resolution, 'index.m3u8'), base_url, stat.mtime_ns)
+
+        async def build():
+            return sign_media_playlist(
+                await aget_rewritten_manifest(
+                    movie_id, resolution, host, stat.mtime_ns, rewrite),
+                stat.mtime_ns, signature)
+
+        signature = manifest_signature(user, movie_id, resolution)
+        etag = manifest_etag(movie_id, resolution,
+                             host + signature, stat.mtime_ns)
+        return await aplaylist_response(request, build, etag, stat.mtime)
+
+
+class AsyncVideoSegmentView(AsyncStreamingView):
+    """
+    GET /api/video/<int:movie_id>/<str:resolution>/<str:segment>/ (async)
+    A valid URL signature skips authentication; the bytes are sent by aserve_hls_file.
+    """
+
+    async def get(self, request, movie_id, resolution, segment):
+        signed = settings.HLS_SIGNED_SEGMENT_URLS and verify_segment_signature(
+            request.GET, movie_id, resolution)
+        if not signed and await self.authenticate(request) is None:
+            return not_authenticated_response()
+
+        if not is_valid_rendition(resolution):
+            return JsonResponse({"detail": "Resolution not found."}, status=404)
+
+        if "/" in segment or ".." in segment:
+            return JsonResponse({"detail": "Invalid segment name"}, status=404)
+        if resolution not in await aget_ready_renditions(movie_id):
+            return JsonResponse({"detail": "Segment not found."}, status=404)
+
+        return await aserve_hls_file(request, movie_id, resolution, segment)
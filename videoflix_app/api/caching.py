@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core.caching import LocalLRUCache
+
+
+manifest_cache = LocalLRUCache(maxsize=settings.HLS_MANIFEST_CACHE_SIZE)
+readiness_cache = LocalLRUCache(
+    maxsize=settings.HLS_READINESS_CACHE_SIZE, ttl=settings.HLS_READINESS_LOCAL_TTL)
+
+
+def _manifest_key(video_id: int, resolution: str, host: str, mtime_ns: int) -> str:
+    return f"hls-manifest:{video_id}:{resolution}:{host}:{mtime_ns}"
+
+
+def manifest_etag(video_id: int, resolution: str, host: str, mtime_ns: int) -> str:
+    key = _manifest_key(video_id, resolution, host, mtime_ns)
+    return '"%s"' % hashlib.md5(key.encode()).hexdigest()
+
+
+def get_rewritten_manifest(video_id: int, resolution: str, host: str, mtime_ns: int, rewrite) -> str:
+    """
+    Returns the rewritten manifest from the local LRU, then Redis; only on a miss in both
+    rewrite() is called and its result cached. The playlist mtime is part of the key,
+    so a re-transcoded playlist never hits an old entry.
+    """
+    key = _manifest_key(video_id, resolution, host, mtime_ns)
+    content = manifest_cache.get(key)
+    if content is not None:
+        return content
+
+    content = cache.get(key)
+    if content is None:
+        content = rewrite()
+        cache.set(key, content, timeout=settings.HLS_MANIFEST_CACHE_TIMEOUT)
+    manifest_cache.set(key, content)
+    return content
+
+
+async def aget_rewritten_manifest(video_id: int, resolution: str, host: str, mtime_ns: int, rewrite) -> str:
+    """
+    Async variant of get_rewritten_manifest for the ASGI views; rewrite() (file read) runs in a thread.
+    """
+    key = _manifest_key(video_id, resolution, host, mtime_ns)
+    content = manifest_cache.get(key)
+    if content is not None:
+        return content
+
+    content = await cache.aget(key)
+    if content is None:
+        content = await asyncio.to_thread(rewrite)
+        await cache.aset(key, content, timeout=settings.HLS_MANIFEST_CACHE_TIMEOUT)
+    manifest_cache.set(key, content)
+    return content
+
+
+def invalidate_manifest_cache(video_id: int):
+    """
+    Drops all cached manifests of a video (called when it is re-transcoded or deleted).
+    """
+    manifest_cache.delete_prefix(f"hls-manifest:{video_id}:")
+    if hasattr(cache, 'delete_pattern'):
+        cache.delete_pattern(f"hls-manifest:{video_id}:*")
+
+
+def _readiness_key(video_id: int) -> str:
+    return f"hls-ready:{video_id}"
+
+
+def _load_ready_renditions(video_id: int) -> frozenset:
+    RenditionJob = apps.get_model('videoflix_app', 'RenditionJob')
+    TranscodeJob = apps.get_model('videoflix_app', 'TranscodeJob')
+    return frozenset(RenditionJob.objects.filter(
+        job__video_id=video_id, status=TranscodeJob.Status.READY).values_list('name', flat=True))
+
+
+def _readiness_timeout(ready: frozenset):
+    """
+    An index entry with renditions lives until the next refresh. Empty entries (also of ids that don't exist)
+    expire, so requests for arbitrary ids can't fill Redis with keys that are never removed.
+    """
+    return None if ready else settings.HLS_READINESS_EMPTY_TIMEOUT
+
+
+def get_ready_renditions(video_id: int) -> frozenset:
+    """
+    Returns the playable renditions of a video from the readiness index: a short-lived process-local
+    cache in front of Redis. The database is only queried if Redis has no entry for the video yet.
+    """
+    key = _readiness_key(video_id)
+    ready = readiness_cache.get(key)
+    if ready is not None:
+        return ready
+
+    ready = cache.get(key)
+    if ready is None:
+        ready = _load_ready_renditions(video_id)
+        cache.set(key, ready, timeout=_readiness_timeout(ready))
+    readiness_cache.set(key, ready)
+    return ready
+
+
+async def aget_ready_renditions(video_id: int) -> frozenset:
+    """
+    Async variant of get_ready_renditions for the ASGI views.
+    """
+    key = _readiness_key(video_id)
+    ready = readiness_cache.get(key)
+    if ready is not None:
+        return ready
+
+    ready = await cache.aget(key)
+    if ready is None:
+        ready = await sync_to_async(_load_ready_renditions)(video_id)
+        await cache.aset(key, ready, timeout=_readiness_timeout(ready))
+    readiness_cache.set(key, ready)
+    return ready
+
+
+def refresh_ready_renditions(video_id: int):
+    """
+    Writes the current rendition state of the video from the database into the readiness index.
+    Other processes pick up the change after at most HLS_READINESS_LOCAL_TTL seconds.
+    """
+    key = _readiness_key(video_id)
+    ready = _load_ready_renditions(video_id)
+    cache.set(key, ready, timeout=_readiness_timeout(ready))
+    readiness_cache.delete(key)
+
+
+def clear_ready_renditions(video_id: int):
+    key = _readiness_key(video_id)
+    cache.set(key, frozenset(), timeout=_readiness_timeout(frozenset()))
+    readiness_cache.delete(key)
+
+
+CATALOG_VERSION_KEY = 'catalog-version'
+
+
+def get_catalog_version() -> str:
+    """
+    Returns the current catalog version. Every change of the catalog replaces it,
+    so cached list responses of older versions are never served again.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(CATALOG_VERSION_KEY, version, timeout=None):
+            version = cache.get(CATALOG_VERSION_KEY) or version
+    return version
+
+
+def bump_catalog_version():
+    """
+    Replaces the catalog version after the current transaction is committed,
+    so no request can cache the old rows under the new version.
+    """
+    transaction.on_commit(
+        lambda: cache.set(CATALOG_VERSION_KEY, uuid.uuid4().hex, timeout=None))
+
+
+def catalog_cache_key(scope: str, version: str, host: str, query_params) -> str:
+    query = '&'.join(f"{key}={value}" for key, value in sorted(query_params.items()))
+    digest = hashlib.md5(f"{host}?{query}".encode()).hexdigest()
+    return f"catalog:{scope}:{version}:{digest}"
+
+
+def catalog_etag(key: str) -> str:
+    return '"%s"' % hashlib.md5(key.encode()).hexdigest()
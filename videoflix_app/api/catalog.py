@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from ..models import Video
+from .serializers import VideoGridSerializer
+
+
+CATEGORY_ROWS_KEY = 'catalog-rows'
+
+
+def _row_queryset():
+    return Video.objects.select_related('transcode_job').only(
+        *VideoGridSerializer.COLUMNS)
+
+
+def _serialize(videos) -> list:
+    # no request in the context: thumbnail URLs stay relative and are completed by the view
+    return [dict(item) for item in VideoGridSerializer(videos, many=True).data]
+
+
+def _build_row(category: str) -> list:
+    videos = _row_queryset().filter(category=category).order_by(
+        '-created_at', '-id')[:settings.CATALOG_ROW_SIZE]
+    return _serialize(videos)
+
+
+def rebuild_category_rows() -> dict:
+    """
+    Builds all rows in one query: the newest CATALOG_ROW_SIZE videos of every category
+    (ROW_NUMBER() partitioned by category). Only used if Redis has no rows yet.
+    """
+    videos = _row_queryset().annotate(
+        row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('category')],
+            order_by=[F('created_at').desc(), F('id').desc()],
+        )
+    ).filter(row_number__lte=settings.CATALOG_ROW_SIZE).order_by('category', '-created_at', '-id')
+
+    rows = {}
+    for item in _serialize(videos):
+        rows.setdefault(item['category'], []).append(item)
+    return rows
+
+
+def get_category_rows() -> dict:
+    """
+    Returns the materialized rows {category: [videos, newest first]} from Redis, building them on a cold cache.
+    """
+    rows = cache.get(CATEGORY_ROWS_KEY)
+    if rows is None:
+        with cache.lock(f"{CATEGORY_ROWS_KEY}-lock", timeout=30):
+            rows = cache.get(CATEGORY_ROWS_KEY)
+            if rows is None:
+                rows = rebuild_category_rows()
+                cache.set(CATEGORY_ROWS_KEY, rows, timeout=None)
+    return rows
+
+
+def _refresh_rows(categories):
+    with cache.lock(f"{CATEGORY_ROWS_KEY}-lock", timeout=30):
+        rows = cache.get(CATEGORY_ROWS_KEY)
+        if rows is None:
+            # nothing materialized yet, the next read builds all rows
+            return
+        for category in categories:
+            row = _build_row(category)
+            if row:
+                rows[category] = row
+            else:
+                rows.pop(category, None)
+        cache.set(CATEGORY_ROWS_KEY, rows, timeout=None)
+
+
+def refresh_category_rows(*categories):
+    """
+    Rebuilds only the rows of the given categories after the current transaction is committed.
+    """
+    categories = {category for category in categories if category}
+    if categories:
+        transaction.on_commit(lambda: _refresh_rows(categories))
@@ -0,0 +1,473 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework.response import Response
+
+from .services import get_hls_dir
+from .signing import bucketed_expiry, expiry_bucket
+from .storage import get_hls_storage, hls_name, segment_content_type
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+RANGE_BLOCK_SIZE = 64 * 1024
+ASYNC_BLOCK_SIZE = 256 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class SharedFile:
+    """
+    An open file descriptor of the OpenFileCache, shared by concurrent requests. Reads use os.pread, so the
+    requests don't share a file position; an evicted file is closed when its last reader released it.
+    """
+
+    def __init__(self, path: str):
+        self.fd = os.open(path, os.O_RDONLY)
+        self.stat = os.fstat(self.fd)
+        self.checked_at = time.monotonic()
+        self.readers = 0
+        self.evicted = False
+        self.lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        with self.lock:
+            if self.evicted:
+                return False
+            self.readers += 1
+            return True
+
+    def release(self):
+        with self.lock:
+            self.readers -= 1
+            close = self.evicted and self.readers == 0
+        if close:
+            os.close(self.fd)
+
+    def evict(self):
+        with self.lock:
+            self.evicted = True
+            close = self.readers == 0
+        if close:
+            os.close(self.fd)
+
+    def read(self, offset: int, length: int) -> bytes:
+        return os.pread(self.fd, length, offset)
+
+
+class OpenFileCache:
+    """
+    Process-local LRU of open media files for the single-file mode (HLS_SINGLE_FILE): a segment request reads
+    its byte range from an already open descriptor instead of checking and opening a file. The file is only
+    stat'ed again every ttl seconds; a replaced file (re-transcode) is opened again.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.files = OrderedDict()
+        self.lock = threading.Lock()
+
+    def acquire(self, path: str) -> SharedFile:
+        """
+        Returns the acquired shared file of the path (release() it when done). Raises FileNotFoundError.
+        """
+        with self.lock:
+            shared = self.files.get(path)
+            if shared is not None:
+                self.files.move_to_end(path)
+
+        if shared is not None and time.monotonic() - shared.checked_at >= self.ttl:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                self.discard(path)
+                raise
+            if (stat.st_ino, stat.st_size, stat.st_mtime_ns) == (
+                    shared.stat.st_ino, shared.stat.st_size, shared.stat.st_mtime_ns):
+                shared.checked_at = time.monotonic()
+            else:
+                shared = None
+        if shared is not None and shared.acquire():
+            return shared
+
+        shared = SharedFile(path)
+        shared.acquire()
+        with self.lock:
+            evicted = [self.files.pop(path, None)]
+            self.files[path] = shared
+            while len(self.files) > self.maxsize:
+                evicted.append(self.files.popitem(last=False)[1])
+        for old in evicted:
+            if old is not None:
+                old.evict()
+        return shared
+
+    def discard(self, path: str):
+        with self.lock:
+            shared = self.files.pop(path, None)
+        if shared is not None:
+            shared.evict()
+
+
+open_files = OpenFileCache(maxsize=settings.HLS_OPEN_FILES, ttl=settings.HLS_OPEN_FILE_TTL)
+
+
+class SharedFileRange:
+    """
+    Response body that reads a byte range of a shared file. The file is released in close(), which Django
+    calls when the response is finished (also if the body was never iterated).
+    """
+
+    def __init__(self, shared: SharedFile, start: int, length: int):
+        self.shared = shared
+        self.start = start
+        self.length = length
+        self.closed = False
+
+    def __iter__(self):
+        position = self.start
+        end = self.start + self.length
+        while position < end:
+            chunk = self.shared.read(position, min(RANGE_BLOCK_SIZE, end - position))
+            if not chunk:
+                break
+            position += len(chunk)
+            yield chunk
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.shared.release()
+
+
+class AsyncSharedFileRange(SharedFileRange):
+    """
+    Async body of a shared file range for the ASGI views, the reads run in worker threads.
+    """
+
+    async def __aiter__(self):
+        position = self.start
+        end = self.start + self.length
+        while position < end:
+            chunk = await asyncio.to_thread(
+                self.shared.read, position, min(ASYNC_BLOCK_SIZE, end - position))
+            if not chunk:
+                break
+            position += len(chunk)
+            yield chunk
+
+
+def file_etag(stat) -> str:
+    """
+    Strong ETag derived from inode, size and mtime of the file.
+    """
+    return f'"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range_header(header: str, size: int):
+    """
+    Returns the (start, end) byte positions (inclusive) of a single 'bytes=' range, or None if the header
+    should be ignored (missing, malformed or several ranges). Raises RangeNotSatisfiable if the range
+    lies outside of the file.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        suffix_length = int(last)
+        if suffix_length == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - suffix_length), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if end < start:
+        return None
+    return start, end
+
+
+def _if_range_matches(request, etag: str, last_modified: int) -> bool:
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _file_range_iterator(file, start: int, length: int):
+    try:
+        file.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = file.read(min(RANGE_BLOCK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def _set_validators(response, etag: str, last_modified: int):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = settings.HLS_SEGMENT_CACHE_CONTROL
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _presign_bucket(name: str, now=None) -> tuple:
+    """
+    Returns (now, expires, cache key) of the expiry bucket an HLS object is presigned for.
+    """
+    now = int(now if now is not None else time.time())
+    expires = bucketed_expiry(settings.S3_URL_EXPIRE, now)
+    return now, expires, f"hls-presigned:{name}:{expires}"
+
+
+def presigned_hls_url(storage, name: str, now=None) -> str:
+    """
+    Presigned URL of an HLS object. Like the signed segment URLs its expiry is bucketed (see signing.py), and the
+    URL is signed once per bucket and shared through the cache: every request of the bucket gets the same URL,
+    so CDNs and browsers can cache the segment under it. It stays valid for at least S3_URL_EXPIRE seconds.
+    """
+    now, expires, key = _presign_bucket(name, now)
+    url = cache.get(key)
+    if url is None:
+        url = storage.url(name, expire=expires - now)
+        # a parallel request may have signed the same object, the first URL wins
+        if not cache.add(key, url, timeout=expiry_bucket(settings.S3_URL_EXPIRE)):
+            url = cache.get(key) or url
+    return url
+
+
+async def apresigned_hls_url(storage, name: str, now=None) -> str:
+    """
+    Async variant of presigned_hls_url for the ASGI views. Signing is local (no request to the bucket),
+    only the cache round trips are awaited.
+    """
+    now, expires, key = _presign_bucket(name, now)
+    url = await cache.aget(key)
+    if url is None:
+        url = storage.url(name, expire=expires - now)
+        if not await cache.aadd(key, url, timeout=expiry_bucket(settings.S3_URL_EXPIRE)):
+            url = await cache.aget(key) or url
+    return url
+
+
+def _object_storage_response(video_id: int, resolution: str, filename: str):
+    """
+    Redirect to a presigned URL when the HLS output lives in an object store, None for local storage.
+    The bucket sends the bytes, Range requests and the Cache-Control stored on the object.
+    """
+    storage = get_hls_storage()
+    if storage.is_local:
+        return None
+    return HttpResponseRedirect(presigned_hls_url(storage, hls_name(video_id, resolution, filename)))
+
+
+async def _aobject_storage_response(video_id: int, resolution: str, filename: str):
+    """
+    Async variant of _object_storage_response.
+    """
+    storage = get_hls_storage()
+    if storage.is_local:
+        return None
+    return HttpResponseRedirect(await apresigned_hls_url(storage, hls_name(video_id, resolution, filename)))
+
+
+def _offload_response(video_id: int, resolution: str, filename: str, content_type: str):
+    """
+    Header-only response for the 'x-accel-redirect' and 'x-sendfile' modes, None in 'django' mode.
+    """
+    delivery = settings.HLS_SEGMENT_DELIVERY
+    if delivery == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = (
+            f"{settings.HLS_X_ACCEL_PREFIX.rstrip('/')}/{video_id}/{resolution}/{filename}")
+    elif delivery == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = get_hls_dir(video_id, resolution, filename)
+    else:
+        return None
+    response['Cache-Control'] = settings.HLS_SEGMENT_CACHE_CONTROL
+    return response
+
+
+def _evaluate_request(request, stat, content_type: str):
+    """
+    Applies revalidation and Range handling to an opened file.
+    Returns (response, byte_range): response is a finished 304/416 response or None;
+    byte_range is (start, end) for a 206 or None for the full file.
+    """
+    etag = file_etag(stat)
+    last_modified = int(stat.st_mtime)
+
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return _set_validators(not_modified, etag, last_modified), None
+
+    if not _if_range_matches(request, etag, last_modified):
+        return None, None
+    try:
+        return None, parse_range_header(request.META.get('HTTP_RANGE'), stat.st_size)
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416, content_type=content_type)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return _set_validators(response, etag, last_modified), None
+
+
+def _partial_response(streaming_content, stat, byte_range, content_type: str):
+    start, end = byte_range
+    response = StreamingHttpResponse(
+        streaming_content, status=206, content_type=content_type)
+    response['Content-Length'] = str(end - start + 1)
+    response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    return _set_validators(response, file_etag(stat), int(stat.st_mtime))
+
+
+def _shared_file_response(request, shared: SharedFile, content_type: str, body_class):
+    """
+    Answers a request from a file of the open-file cache: 304/416, the requested byte range (206) or the whole file.
+    """
+    stat = shared.stat
+    response, byte_range = _evaluate_request(request, stat, content_type)
+    if response is not None:
+        shared.release()
+        return response
+
+    if byte_range is None:
+        response = StreamingHttpResponse(
+            body_class(shared, 0, stat.st_size), content_type=content_type)
+        response['Content-Length'] = str(stat.st_size)
+        return _set_validators(response, file_etag(stat), int(stat.st_mtime))
+
+    start, end = byte_range
+    return _partial_response(
+        body_class(shared, start, end - start + 1), stat, byte_range, content_type)
+
+
+def serve_hls_file(request, video_id: int, resolution: str, filename: str):
+    """
+    Delivers a file of the HLS output according to HLS_SEGMENT_DELIVERY:
+    'x-accel-redirect' (nginx) and 'x-sendfile' (Apache/lighttpd) only return a header and let the
+    front web server send the bytes (including Range handling). 'django' sends the file from the worker
+    with ETag/Last-Modified revalidation (304) and single-range requests (206). Full responses use
+    FileResponse, which gunicorn sends with os.sendfile (zero-copy) via wsgi.file_wrapper.
+    Segment URLs carry the playlist version, so finished segments are cached as immutable.
+    With HLS_SINGLE_FILE the byte ranges are read from descriptors kept open in the OpenFileCache.
+    With STORAGE_BACKEND=s3 the request is redirected to the object store.
+    """
+    response = _object_storage_response(video_id, resolution, filename)
+    if response is not None:
+        return response
+
+    content_type = segment_content_type(filename)
+    response = _offload_response(video_id, resolution, filename, content_type)
+    if response is not None:
+        return response
+
+    if settings.HLS_SINGLE_FILE:
+        try:
+            shared = open_files.acquire(get_hls_dir(video_id, resolution, filename))
+        except FileNotFoundError:
+            return Response({"detail": "Segment not found."}, status=404)
+        return _shared_file_response(request, shared, content_type, SharedFileRange)
+
+    try:
+        file = open(get_hls_dir(video_id, resolution, filename), 'rb')
+    except FileNotFoundError:
+        return Response({"detail": "Segment not found."}, status=404)
+
+    stat = os.fstat(file.fileno())
+    response, byte_range = _evaluate_request(request, stat, content_type)
+    if response is not None:
+        file.close()
+        return response
+
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type,)
+        return _set_validators(response, file_etag(stat), int(stat.st_mtime))
+
+    start, end = byte_range
+    return _partial_response(
+        _file_range_iterator(file, start, end - start + 1), stat, byte_range, content_type)
+
+
+async def _async_file_iterator(file, start: int, length: int):
+    """
+    Reads the file in blocks in a worker thread, so the event loop never blocks on disk I/O.
+    """
+    try:
+        await asyncio.to_thread(file.seek, start)
+        remaining = length
+        while remaining > 0:
+            chunk = await asyncio.to_thread(file.read, min(ASYNC_BLOCK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+async def aserve_hls_file(request, video_id: int, resolution: str, filename: str):
+    """
+    Async variant of serve_hls_file for the ASGI views. The header modes are identical; in 'django' mode
+    the body is an async iterator, so a slow client only holds a coroutine instead of a worker.
+    """
+    response = await _aobject_storage_response(video_id, resolution, filename)
+    if response is not None:
+        return response
+
+    content_type = segment_content_type(filename)
+    response = _offload_response(video_id, resolution, filename, content_type)
+    if response is not None:
+        return response
+
+    if settings.HLS_SINGLE_FILE:
+        try:
+            shared = await asyncio.to_thread(
+                open_files.acquire, get_hls_dir(video_id, resolution, filename))
+        except FileNotFoundError:
+            return JsonResponse({"detail": "Segment not found."}, status=404)
+        return _shared_file_response(request, shared, content_type, AsyncSharedFileRange)
+
+    try:
+        file = await asyncio.to_thread(open, get_hls_dir(video_id, resolution, filename), 'rb')
+    except FileNotFoundError:
+        return JsonResponse({"detail": "Segment not found."}, status=404)
+
+    stat = os.fstat(file.fileno())
+    response, byte_range = _evaluate_request(request, stat, content_type)
+    if response is not None:
+        file.close()
+        return response
+
+    if byte_range is None:
+        response = StreamingHttpResponse(
+            _async_file_iterator(file, 0, stat.st_size), content_type=content_type)
+        response['Content-Length'] = str(stat.st_size)
+        return _set_validators(response, file_etag(stat), int(stat.st_mtime))
+
+    start, end = byte_range
+    return _partial_response(
+        _async_file_iterator(file, start, end - start + 1), stat, byte_range, content_type)
@@ -0,0 +1,14 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class VideoCursorPagination(CursorPagination):
+    """
+    Keyset pagination of the video list on (created_at, id), newest first.
+    Every page is an index range scan, so its cost does not grow with the catalog size.
+    """
+
+    ordering = ('-created_at', '-id')
+    page_size = settings.VIDEO_LIST_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.VIDEO_LIST_MAX_PAGE_SIZE
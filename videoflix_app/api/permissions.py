@@ -0,0 +1,18 @@
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+from .signing import verify_segment_signature
+
+
+class HasValidSegmentSignature(BasePermission):
+    """
+    Grants access to a segment if the URL carries a valid, unexpired signature from the manifest.
+    Only active if HLS_SIGNED_SEGMENT_URLS is enabled.
+    """
+
+    def has_permission(self, request, view):
+        if not settings.HLS_SIGNED_SEGMENT_URLS:
+            return False
+        kwargs = view.kwargs
+        return verify_segment_signature(
+            request.query_params, kwargs.get('movie_id'), kwargs.get('resolution'))
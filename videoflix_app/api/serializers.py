@@ -1,5 +1,50 @@
+import os
+import re
+
+from django.conf import settings
 from rest_framework import serializers
-from ..models import Video
+from ..models import Video, TranscodeJob, RenditionJob, VideoUpload
+
+
+class RenditionJobSerializer(serializers.ModelSerializer):
+    """
+    Status and progress of a single rendition.
+    """
+
+    class Meta:
+        model = RenditionJob
+        fields = ["name", "status", "progress"]
+
+
+class TranscodeStatusSerializer(serializers.ModelSerializer):
+    """
+    Short transcoding state of a video, embedded in the video list.
+    """
+
+    class Meta:
+        model = TranscodeJob
+        fields = ["status", "progress", "updated_at"]
+
+
+class TranscodeJobSerializer(serializers.ModelSerializer):
+    """
+    Full transcoding state of a video including every rendition.
+    """
+
+    video_id = serializers.IntegerField(read_only=True)
+    renditions = RenditionJobSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = TranscodeJob
+        fields = [
+            "video_id",
+            "status",
+            "progress",
+            "started_at",
+            "finished_at",
+            "updated_at",
+            "renditions",
+        ]
 
 
 class VideoSerializer(serializers.ModelSerializer):
@@ -8,6 +53,9 @@ class VideoSerializer(serializers.ModelSerializer):
     """
 
     thumbnail_url = serializers.SerializerMethodField()
+    thumbnail_variants = serializers.SerializerMethodField()
+    transcode = TranscodeStatusSerializer(
+        source='transcode_job', read_only=True)
 
     class Meta:
         model = Video
@@ -17,8 +65,15 @@ class VideoSerializer(serializers.ModelSerializer):
             "title",
             "description",
             "thumbnail_url",
+            "thumbnail_variants",
             "category",
-
+            "duration",
+            "width",
+            "height",
+            "frame_rate",
+            "video_codec",
+            "file_size",
+            "transcode",
         ]
 
     def get_thumbnail_url(self, obj):
@@ -30,3 +85,95 @@ class VideoSerializer(serializers.ModelSerializer):
                 return request.build_absolute_uri(url)
             return url
         return None
+
+    def get_thumbnail_variants(self, obj):
+        """
+        Resized WebP/JPEG copies of the thumbnail as {format: {'<width>w': url}}, for srcset/<picture>.
+        Empty until the thumbnail job has run.
+        """
+        request = self.context.get('request')
+        variants = {}
+        for name, sizes in (obj.thumbnail_variants or {}).items():
+            variants[name] = {}
+            for descriptor, filename in sizes.items():
+                url = obj.thumbnail.storage.url(filename)
+                variants[name][descriptor] = request.build_absolute_uri(
+                    url) if request is not None else url
+        return variants
+
+
+class VideoGridSerializer(VideoSerializer):
+    """
+    Compact video data for grid views (?view=grid): no description and no media metadata.
+    """
+
+    # columns loaded for this serializer (.only())
+    COLUMNS = (
+        'id', 'created_at', 'title', 'thumbnail', 'thumbnail_variants', 'category', 'duration',
+        'transcode_job__status', 'transcode_job__progress', 'transcode_job__updated_at',
+    )
+
+    class Meta(VideoSerializer.Meta):
+        fields = [
+            "id",
+            "created_at",
+            "title",
+            "thumbnail_url",
+            "thumbnail_variants",
+            "category",
+            "duration",
+            "transcode",
+        ]
+
+
+class VideoUploadSerializer(serializers.ModelSerializer):
+    """
+    A resumable upload: the metadata of the video to create, the expected size and SHA-256 of the file and
+    the received byte ranges ([start, end)), from which a client resumes an interrupted upload.
+    """
+
+    video_id = serializers.IntegerField(read_only=True)
+    chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = VideoUpload
+        fields = [
+            "id",
+            "filename",
+            "size",
+            "sha256",
+            "title",
+            "description",
+            "category",
+            "thumbnail",
+            "status",
+            "error",
+            "received",
+            "bytes_received",
+            "chunk_size",
+            "video_id",
+            "created_at",
+        ]
+        read_only_fields = ["status", "error", "received", "bytes_received"]
+        extra_kwargs = {"thumbnail": {"write_only": True}}
+
+    def get_chunk_size(self, obj):
+        return settings.UPLOAD_CHUNK_SIZE
+
+    def validate_filename(self, value):
+        filename = os.path.basename(value.replace('\\', '/'))
+        if not filename:
+            raise serializers.ValidationError('A file name is required.')
+        return filename
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'The size must be between 1 and {settings.UPLOAD_MAX_SIZE} bytes.')
+        return value
+
+    def validate_sha256(self, value):
+        value = value.lower()
+        if not re.fullmatch(r'[0-9a-f]{64}', value):
+            raise serializers.ValidationError('Expected the hex SHA-256 of the file.')
+        return value
@@ -1,10 +1,35 @@
+import hashlib
+import json
+import math
 import os
+import re
 import shutil
 import subprocess
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
 
 from django.conf import settings
+from django.core.cache import cache
 from django.db import connections
+from django.db.models import F, FloatField
+from django.db.models.functions import Least
 from django.apps import apps
+from django.utils import timezone
+from django_rq import get_queue
+from rq import get_current_job
+from rq.job import Dependency, JobStatus
+
+from .caching import bump_catalog_version, invalidate_manifest_cache, refresh_ready_renditions
+from .catalog import refresh_category_rows
+from .storage import (MUTABLE_EXTENSIONS, SegmentUploader, delete_hls_files, delete_hls_tree,
+                      discard_shared_source, discard_work_dir, discard_work_files, fetch_hls_file, get_work_dir,
+                      hls_file_exists, list_hls_files, list_work_files, publish_hls_files, read_hls_bytes,
+                      shared_source, source_stat, stat_hls_file, staged_source, write_hls_bytes)
 
 
 HLS_RESOLUTIONS = {
@@ -19,58 +44,1496 @@ HLS_BITRATES = {
     '1080p': '5000k',
 }
 
+HLS_AUDIO_BITRATE = '128k'
+HLS_AUDIO_RENDITION = 'audio'
+HLS_AUDIO_GROUP = 'aud'
+HLS_MASTER_PLAYLIST = 'master.m3u8'
+HLS_SEGMENT_SECONDS = 6
+HLS_FINGERPRINT_FILE = 'source.fingerprint'
+HLS_TRICKPLAY_DIR = 'trickplay'
+HLS_TRICKPLAY_TRACK = 'thumbnails.vtt'
+HLS_INIT_SEGMENT = 'init.mp4'
+HLS_DASH_MANIFEST = 'manifest.mpd'
+# how long the finished chunks of a chunked transcode are remembered (seconds)
+HLS_CHUNK_DONE_TIMEOUT = 24 * 3600
+
+ACTIVE_JOB_STATUSES = (
+    JobStatus.QUEUED,
+    JobStatus.STARTED,
+    JobStatus.DEFERRED,
+    JobStatus.SCHEDULED,
+)
+
+
+def get_hls_dir(video_id: int, *parts) -> str:
+    """
+    Returns the local path of the HLS-directory of a video (or of a file inside it) that ffmpeg writes to:
+    the storage itself with local storage, the staging directory of the job with an object store.
+    """
+    return get_work_dir(video_id, *parts)
+
+
+def is_valid_rendition(rendition: str) -> bool:
+    """
+    Checks if the rendition is one of the video resolutions or the shared audio rendition.
+    """
+    return rendition in HLS_RESOLUTIONS or rendition == HLS_AUDIO_RENDITION
+
+
+def use_fmp4() -> bool:
+    return settings.HLS_SEGMENT_FORMAT == 'fmp4'
+
+
+def use_single_file() -> bool:
+    return settings.HLS_SINGLE_FILE
+
+
+def output_layout() -> dict:
+    """
+    The configured output layout; stored with the source fingerprint, so a changed layout re-encodes the video.
+    """
+    return {'segment_format': settings.HLS_SEGMENT_FORMAT, 'single_file': use_single_file()}
+
+
+def _same_layout(stored: dict) -> bool:
+    return (stored.get('segment_format', 'mpegts') == settings.HLS_SEGMENT_FORMAT
+            and stored.get('single_file', False) == use_single_file())
+
+
+def segment_filename(prefix: str = '') -> str:
+    """
+    ffmpeg pattern of the segment files in the configured HLS_SEGMENT_FORMAT.
+    With HLS_SINGLE_FILE all segments of a rendition go into one media file (no pattern).
+    """
+    extension = '.m4s' if use_fmp4() else '.ts'
+    if use_single_file():
+        return f"{prefix}media{extension}"
+    return f"{prefix}segment_%03d{extension}"
+
+
+def segment_format_args(init_filename: str = HLS_INIT_SEGMENT) -> list:
+    """
+    hls muxer options of the output layout. fMP4/CMAF segments: the codec headers go once into the init segment
+    instead of into every segment. Single file: the playlist addresses the segments with EXT-X-BYTERANGE
+    (the fMP4 init segment is the first byte range of the media file).
+    """
+    args = []
+    if use_fmp4():
+        args += ['-hls_segment_type', 'fmp4', '-hls_fmp4_init_filename', init_filename]
+    if use_single_file():
+        args += ['-hls_flags', 'single_file']
+    return args
+
+
+def _playlist_version() -> int:
+    # EXT-X-BYTERANGE needs version 4, EXT-X-MAP (init segment) 6+, 7 for fMP4 in master playlists
+    if use_fmp4():
+        return 7
+    return 4 if use_single_file() else 3
+
+
+def compute_source_fingerprint(video_file, input_path: str = None) -> dict:
+    """
+    Fingerprints the source file by name, size and mtime in its storage and, if the staged local copy
+    is given, a streamed SHA-256 of its content.
+    """
+    stat = source_stat(video_file)
+    fingerprint = {
+        'name': video_file.name,
+        'size': stat.size,
+        'mtime_ns': stat.mtime_ns,
+    }
+    if input_path is not None:
+        with open(input_path, 'rb') as f:
+            fingerprint['sha256'] = hashlib.file_digest(
+                f, 'sha256').hexdigest()
+    return fingerprint
+
+
+def read_stored_fingerprint(video_id: int):
+    """
+    Returns the fingerprint of the source the current HLS output was created from, or None.
+    """
+    try:
+        return json.loads(read_hls_bytes(video_id, HLS_FINGERPRINT_FILE))
+    except (OSError, ValueError):
+        return None
+
+
+def write_stored_fingerprint(video_id: int, fingerprint: dict):
+    write_hls_bytes(video_id, HLS_FINGERPRINT_FILE, json.dumps(fingerprint).encode())
+
+
+def _same_stat(stored: dict, current: dict) -> bool:
+    return (stored.get('name') == current.get('name')
+            and stored.get('size') == current.get('size')
+            and stored.get('mtime_ns') == current.get('mtime_ns'))
+
+
+def _current_stat(video):
+    try:
+        return compute_source_fingerprint(video.video_file)
+    except (OSError, ValueError):
+        return None
+
+
+def source_is_unchanged(video) -> bool:
+    """
+    Cheap check (no hashing) if the HLS output already belongs to the current source file.
+    Used before enqueueing, so saving only the metadata of a video does not re-encode it.
+    """
+    stored = read_stored_fingerprint(video.id)
+    if not stored or not hls_file_exists(video.id, HLS_MASTER_PLAYLIST):
+        return False
+    if not _same_layout(stored):
+        return False
+    current = _current_stat(video)
+    return current is not None and _same_stat(stored, current)
+
+
+def _mark_job_queued(video_id: int, rq_job_id: str):
+    """
+    Resets the transcode job of the video to queued. Renditions that are ready stay ready (and in the readiness
+    index), so the current output is served until the new job replaces it.
+    """
+    TranscodeJob = apps.get_model('videoflix_app', 'TranscodeJob')
+    RenditionJob = apps.get_model('videoflix_app', 'RenditionJob')
+
+    job, _ = TranscodeJob.objects.update_or_create(
+        video_id=video_id,
+        defaults={
+            'status': TranscodeJob.Status.QUEUED,
+            'progress': 0,
+            'error': '',
+            'rq_job_id': rq_job_id,
+            'started_at': None,
+            'finished_at': None,
+        },
+    )
+    RenditionJob.objects.filter(job=job).exclude(status=TranscodeJob.Status.READY).update(
+        status=TranscodeJob.Status.QUEUED, progress=0, error='', updated_at=timezone.now())
+    bump_catalog_version()
+
+
+def enqueue_hls_job(video_id: int):
+    """
+    Enqueues the HLS job of a video. If there is already a queued or running job for the video,
+    no second job is created and the existing job is returned instead.
+    """
+    queue = get_queue("default")
+    job_key = f"hls-job:{video_id}"
+
+    with cache.lock(f"hls-enqueue-lock:{video_id}", timeout=10):
+        job_id = cache.get(job_key)
+        job = queue.fetch_job(job_id) if job_id else None
+        current_job = get_current_job()
+
+        if (job is not None
+                and (current_job is None or job.id != current_job.id)
+                and job.get_status() in ACTIVE_JOB_STATUSES):
+            print(
+                f"[HLS] Job {job.id} for video {video_id} is already {job.get_status()}, not enqueued again")
+            return job
+
+        job = queue.enqueue(generate_hls_for_video, video_id)
+        cache.set(job_key, job.id, timeout=None)
+        _mark_job_queued(video_id, job.id)
+        print(f"[HLS] Enqueued job {job.id} for video {video_id}")
+        return job
+
+
+def _bitrate_to_bps(bitrate: str) -> int:
+    if bitrate.endswith('k'):
+        return int(bitrate[:-1]) * 1000
+    if bitrate.endswith('M'):
+        return int(bitrate[:-1]) * 1000 * 1000
+    return int(bitrate)
+
+
+def probe_source(input_path: str) -> dict:
+    """
+    Reads the media metadata of the source (dimensions, duration, frame rate, codec, size)
+    and whether it contains an audio stream via ffprobe.
+    """
+    cmd = [
+        'ffprobe',
+        '-v', 'error',
+        '-print_format', 'json',
+        '-show_streams',
+        '-show_format',
+        input_path,
+    ]
+    try:
+        result = subprocess.run(
+            cmd, check=True, capture_output=True, text=True)
+        probe = json.loads(result.stdout)
+    except (subprocess.CalledProcessError, ValueError, OSError) as e:
+        print(f"[HLS] ffprobe failed for {input_path}: {e}")
+        probe = {}
+
+    streams = probe.get('streams', [])
+    video_stream = next(
+        (s for s in streams if s.get('codec_type') == 'video'), {})
+    media_format = probe.get('format', {})
+    try:
+        file_size = int(media_format['size'])
+    except (KeyError, TypeError, ValueError):
+        file_size = os.path.getsize(input_path) if os.path.exists(
+            input_path) else None
+    return {
+        'width': video_stream.get('width'),
+        'height': video_stream.get('height'),
+        'duration': _parse_float(media_format.get('duration')),
+        'frame_rate': _parse_frame_rate(
+            video_stream.get('avg_frame_rate') or video_stream.get('r_frame_rate')),
+        'video_codec': video_stream.get('codec_name', ''),
+        'file_size': file_size,
+        'has_audio': any(s.get('codec_type') == 'audio' for s in streams),
+    }
+
+
+def _parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_frame_rate(value):
+    """
+    ffprobe reports frame rates as fractions like '30000/1001'.
+    """
+    if not value:
+        return None
+    numerator, _, denominator = value.partition('/')
+    numerator, denominator = _parse_float(
+        numerator), _parse_float(denominator or 1)
+    if not numerator or not denominator:
+        return None
+    return round(numerator / denominator, 3)
+
+
+def video_metadata_from_probe(source: dict) -> dict:
+    """
+    Maps the result of probe_source to the media metadata fields of the Video model.
+    """
+    return {
+        'duration': source['duration'],
+        'width': source['width'],
+        'height': source['height'],
+        'frame_rate': source['frame_rate'],
+        'video_codec': source['video_codec'] or '',
+        'file_size': source['file_size'],
+    }
+
+
+def build_rendition_ladder(source: dict) -> dict:
+    """
+    Returns the renditions (name -> height) to encode for the source. Renditions above the
+    source height are left out, so nothing gets upscaled. A source below the lowest
+    rendition is encoded once at its own height under the name of the lowest rendition.
+    """
+    source_height = source.get('height')
+    if not source_height:
+        return dict(HLS_RESOLUTIONS)
+
+    ladder = {name: height for name, height in HLS_RESOLUTIONS.items()
+              if height <= source_height}
+    if not ladder:
+        lowest = min(HLS_RESOLUTIONS, key=HLS_RESOLUTIONS.get)
+        ladder[lowest] = source_height - source_height % 2
+    return ladder
+
+
+def _scaled_width(source: dict, height: int) -> int:
+    """
+    Width of a rendition scaled with 'scale=-2:<height>' (keeps the aspect ratio, rounded to even).
+    """
+    if source.get('width') and source.get('height'):
+        width = source['width'] * height / source['height']
+    else:
+        width = height * 16 / 9
+    return int(round(width / 2)) * 2
+
+
+def _keyframe_args() -> list:
+    """
+    Forces a keyframe at every segment boundary, so all renditions switch at the same positions.
+    """
+    return ['-force_key_frames', f'expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})']
+
+
+def reset_rendition_jobs(job, renditions: list, keep_ready: bool = False):
+    """
+    Makes the rendition rows of the job match the renditions that are about to be encoded and sets them to running.
+    With keep_ready, renditions that are ready stay playable (their output is only replaced once the new one is complete).
+    """
+    RenditionJob = apps.get_model('videoflix_app', 'RenditionJob')
+
+    RenditionJob.objects.filter(job=job).exclude(
+        name__in=renditions).delete()
+    ready = set()
+    if keep_ready:
+        ready = set(RenditionJob.objects.filter(
+            job=job, status=job.Status.READY).values_list('name', flat=True))
+    for name in renditions:
+        if name in ready:
+            continue
+        RenditionJob.objects.update_or_create(
+            job=job, name=name,
+            defaults={'status': job.Status.RUNNING, 'progress': 0, 'error': ''})
+    refresh_ready_renditions(job.video_id)
+
+
+class TranscodeProgress:
+    """
+    Collects the progress of the renditions of a transcode job and writes it back to the DB in batches,
+    at most every HLS_PROGRESS_UPDATE_INTERVAL seconds. Renditions may be updated from several threads.
+    Renditions that are ready stay playable during the encode; they switch to the new output with publish().
+    """
+
+    def __init__(self, job, renditions: list, duration):
+        RenditionJob = apps.get_model('videoflix_app', 'RenditionJob')
+        reset_rendition_jobs(job, renditions, keep_ready=True)
+
+        self.job = job
+        self.duration = duration
+        self.rows = {row.name: row for row in RenditionJob.objects.filter(job=job)}
+        self.progress = dict.fromkeys(self.rows, 0.0)
+        self.lock = threading.Lock()
+        self.last_flush = 0.0
+
+    def update(self, renditions: list, out_seconds: float):
+        """
+        Called for every progress block of ffmpeg with the already encoded media time.
+        """
+        if not self.duration:
+            return
+        percent = min(100.0, out_seconds * 100 / self.duration)
+        with self.lock:
+            for name in renditions:
+                self._set_progress(name, percent)
+        self.flush()
+
+    def finish(self, renditions: list, error=None):
+        """
+        Called when the encode of the renditions ended. Failed renditions are marked right away,
+        encoded ones keep their status until their output is published.
+        """
+        Status = self.job.Status
+        with self.lock:
+            for name in renditions:
+                if error:
+                    row = self.rows[name]
+                    row.status = Status.FAILED
+                    row.error = error
+                else:
+                    self._set_progress(name, 100.0)
+        self.flush(force=True)
+        if error:
+            refresh_ready_renditions(self.job.video_id)
+
+    def publish(self, renditions: list):
+        """
+        Called once publish_hls_output put the new output of the renditions into the storage.
+        """
+        Status = self.job.Status
+        with self.lock:
+            for name in renditions:
+                row = self.rows[name]
+                row.status = Status.READY
+                row.progress = 100.0
+                row.error = ''
+        self.flush(force=True)
+        refresh_ready_renditions(self.job.video_id)
+
+    def _set_progress(self, name: str, percent: float):
+        self.progress[name] = percent
+        row = self.rows[name]
+        if row.status != self.job.Status.READY:
+            row.progress = percent
+
+    def flush(self, force: bool = False):
+        RenditionJob = apps.get_model('videoflix_app', 'RenditionJob')
+        TranscodeJob = apps.get_model('videoflix_app', 'TranscodeJob')
+
+        with self.lock:
+            now = time.monotonic()
+            if not force and now - self.last_flush < settings.HLS_PROGRESS_UPDATE_INTERVAL:
+                return
+            self.last_flush = now
+            rows = list(self.rows.values())
+            for row in rows:
+                row.updated_at = timezone.now()
+            progress = sum(self.progress.values()) / max(1, len(self.progress))
+
+            RenditionJob.objects.bulk_update(
+                rows, ['status', 'progress', 'error', 'updated_at'])
+            TranscodeJob.objects.filter(pk=self.job.pk).update(
+                progress=progress, updated_at=timezone.now())
+
+
+def _run_ffmpeg(cmd: list, label: str, on_progress=None):
+    """
+    Runs ffmpeg and reports the encoded media time (in seconds) parsed from '-progress' to on_progress.
+    Returns None if ffmpeg succeeded, otherwise the last lines of its error output.
+    """
+    cmd = [cmd[0], '-progress', 'pipe:1', '-nostats', *cmd[1:]]
+    print(f"[HLS] Running ffmpeg for {label}: {' '.join(cmd)}")
+
+    stderr_tail = deque(maxlen=20)
+    try:
+        process = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    except OSError as e:
+        print(f"[HLS] FFmpeg failed for {label}: {e}")
+        return str(e)
+
+    stderr_reader = threading.Thread(
+        target=lambda: stderr_tail.extend(process.stderr), daemon=True)
+    stderr_reader.start()
+
+    for line in process.stdout:
+        key, _, value = line.strip().partition('=')
+        if key == 'out_time_us' and on_progress is not None:
+            try:
+                on_progress(int(value) / 1_000_000)
+            except ValueError:
+                pass
+
+    returncode = process.wait()
+    stderr_reader.join()
+    if returncode != 0:
+        error = ''.join(stderr_tail).strip() or f"exit code {returncode}"
+        print(f"[HLS] FFmpeg failed for {label}: {error}")
+        return error
+    return None
+
+
+def get_parallel_renditions(renditions: int) -> int:
+    """
+    Number of the renditions of a ladder that are encoded at the same time.
+    """
+    return max(1, min(settings.HLS_MAX_PARALLEL_RENDITIONS, renditions))
+
+
+def get_threads_per_rendition(renditions: int) -> int:
+    """
+    Thread budget of a single rendition encode for a ladder of the given size. If HLS_THREADS_PER_RENDITION
+    is not set, the CPU cores are shared between the renditions that run at the same time.
+    """
+    if settings.HLS_THREADS_PER_RENDITION > 0:
+        return settings.HLS_THREADS_PER_RENDITION
+    return max(1, (os.cpu_count() or 1) // get_parallel_renditions(renditions))
+
+
+def _encode_rendition(video_id: int, input_path: str, resolution: str, height: int, threads: int,
+                      progress: TranscodeProgress, extra_outputs=()) -> bool:
+    """
+    Encodes a single rendition (audio muxed into the rendition) with its own ffmpeg process.
+    extra_outputs are appended as further outputs of the same command (they share its decode).
+    """
+    output_dir = get_hls_dir(video_id, resolution)
+    os.makedirs(output_dir, exist_ok=True)
+    output_playlist = os.path.join(output_dir, 'index.m3u8')
+    segment_pattern = os.path.join(output_dir, segment_filename())
+
+    video_bitrate = HLS_BITRATES.get(resolution, '2500k')
+
+    cmd = [
+        'ffmpeg',
+        '-y',
+        '-threads', str(threads),
+        '-i', input_path,
+        '-filter_threads', str(threads),
+        '-vf', f'scale=-2:{height}',
+        '-c:v', 'h264',
+        '-b:v', video_bitrate,
+        '-threads', str(threads),
+        *_keyframe_args(),
+        '-c:a', 'aac',
+        '-b:a', HLS_AUDIO_BITRATE,
+        '-hls_time', str(HLS_SEGMENT_SECONDS),
+        '-hls_playlist_type', 'vod',
+        *segment_format_args(),
+        '-hls_segment_filename', segment_pattern,
+        output_playlist,
+        *extra_outputs,
+    ]
+    try:
+        error = _run_ffmpeg(
+            cmd, f"{video_id} {resolution}",
+            on_progress=lambda seconds: progress.update([resolution], seconds))
+        progress.finish([resolution], error)
+    finally:
+        connections.close_all()
+
+    if error is None:
+        print(f"[HLS] OK: {output_playlist}")
+        return True
+    return False
+
+
+def _transcode_per_rendition(video_id: int, input_path: str, ladder: dict, progress: TranscodeProgress) -> list:
+    """
+    Encodes the renditions concurrently, each with its own ffmpeg process.
+    At most HLS_MAX_PARALLEL_RENDITIONS encodes run at the same time.
+    Returns the renditions that were created successfully.
+    """
+    threads = get_threads_per_rendition(len(ladder))
+    max_workers = get_parallel_renditions(len(ladder))
+    print(
+        f"[HLS] Encoding {len(ladder)} renditions for {video_id}, "
+        f"{max_workers} at once with {threads} threads each")
+
+    # the trick-play frames are taken from the decode of the smallest rendition
+    smallest = min(ladder, key=ladder.get)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            resolution: executor.submit(
+                _encode_rendition, video_id, input_path, resolution, height, threads, progress,
+                trickplay_output_args(video_id) if resolution == smallest else ())
+            for resolution, height in ladder.items()
+        }
+    return [resolution for resolution, future in futures.items() if future.result()]
+
+
+def _transcode_single_decode(video_id: int, input_path: str, source: dict, ladder: dict,
+                             progress: TranscodeProgress) -> list:
+    """
+    Decodes the source once, splits the decoded video into all renditions and encodes
+    the audio a single time as a shared audio group. Returns the created renditions.
+    """
+    resolutions = list(ladder.items())
+    for resolution, _ in resolutions:
+        os.makedirs(get_hls_dir(video_id, resolution), exist_ok=True)
+
+    split_outputs = ''.join(f'[v{i}]' for i in range(len(resolutions)))
+    filters = [f'[0:v]split={len(resolutions)}{split_outputs}']
+    filters += [f'[v{i}]scale=-2:{height}[v{i}out]'
+                for i, (_, height) in enumerate(resolutions)]
+
+    threads_per_rendition = get_threads_per_rendition(len(resolutions))
+    threads = threads_per_rendition * get_parallel_renditions(len(resolutions))
+    cmd = [
+        'ffmpeg',
+        '-y',
+        '-threads', str(threads),
+        '-i', input_path,
+        '-filter_complex_threads', str(threads),
+        '-filter_complex', ';'.join(filters),
+    ]
+    audio_group = f',agroup:{HLS_AUDIO_GROUP}' if source['has_audio'] else ''
+    stream_map = []
+    for i, (resolution, _) in enumerate(resolutions):
+        cmd += [
+            '-map', f'[v{i}out]',
+            f'-c:v:{i}', 'h264',
+            f'-b:v:{i}', HLS_BITRATES.get(resolution, '2500k'),
+            f'-threads:v:{i}', str(threads_per_rendition),
+        ]
+        stream_map.append(f'v:{i}{audio_group},name:{resolution}')
+    cmd += _keyframe_args()
+
+    if source['has_audio']:
+        os.makedirs(get_hls_dir(video_id, HLS_AUDIO_RENDITION), exist_ok=True)
+        cmd += ['-map', '0:a:0', '-c:a', 'aac', '-b:a', HLS_AUDIO_BITRATE]
+        stream_map.append(
+            f'a:0{audio_group},name:{HLS_AUDIO_RENDITION}')
+
+    cmd += [
+        '-f', 'hls',
+        '-hls_time', str(HLS_SEGMENT_SECONDS),
+        '-hls_playlist_type', 'vod',
+        *segment_format_args(),
+        '-hls_segment_filename', get_hls_dir(video_id,
+                                             '%v', segment_filename()),
+        '-var_stream_map', ' '.join(stream_map),
+        get_hls_dir(video_id, '%v', 'index.m3u8'),
+        *trickplay_output_args(video_id),
+    ]
+    created = [resolution for resolution, _ in resolutions]
+    if source['has_audio']:
+        created.append(HLS_AUDIO_RENDITION)
+
+    error = _run_ffmpeg(
+        cmd, f"{video_id} (single decode)",
+        on_progress=lambda seconds: progress.update(created, seconds))
+    progress.finish(created, error)
+    return [] if error else created
+
+
+def _trickplay_frames_dir(video_id: int, *parts) -> str:
+    return get_hls_dir(video_id, HLS_TRICKPLAY_DIR, 'frames', *parts)
+
+
+def prepare_trickplay_output(video_id: int):
+    """
+    Removes the trick-play track of an earlier encode and creates the frames directory. Called by the job
+    before it runs the ffmpeg command with the trickplay_output_args.
+    """
+    if not settings.HLS_TRICKPLAY:
+        return
+    delete_hls_tree(video_id, HLS_TRICKPLAY_DIR)
+    os.makedirs(_trickplay_frames_dir(video_id), exist_ok=True)
+
+
+def trickplay_output_args(video_id: int) -> list:
+    """
+    ffmpeg output that writes one small JPEG every HLS_TRICKPLAY_INTERVAL seconds. It is appended to an
+    encode command, so the frames come from the decode that runs anyway. Empty if trick-play is disabled.
+    """
+    if not settings.HLS_TRICKPLAY:
+        return []
+    return [
+        '-map', '0:v:0',
+        '-vf', f'fps=1/{settings.HLS_TRICKPLAY_INTERVAL},scale={settings.HLS_TRICKPLAY_WIDTH}:-2',
+        '-q:v', '5',
+        '-f', 'image2',
+        _trickplay_frames_dir(video_id, 'frame_%05d.jpg'),
+    ]
+
+
+def extract_trickplay_frames(video_id: int, input_path: str) -> bool:
+    """
+    Separate frame pass for sources that were not encoded by a single job (chunked transcoding).
+    Only keyframes are decoded, which is enough for scrubbing previews.
+    """
+    args = trickplay_output_args(video_id)
+    if not args:
+        return False
+    prepare_trickplay_output(video_id)
+    cmd = ['ffmpeg', '-y', '-skip_frame', 'nokey', '-i', input_path, *args]
+    return _run_ffmpeg(cmd, f"{video_id} trick-play") is None
+
+
+def _vtt_timestamp(seconds: float) -> str:
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{seconds:06.3f}"
+
+
+def build_trickplay(video_id: int, duration) -> bool:
+    """
+    Tiles the extracted frames into JPEG sprite sheets (HLS_TRICKPLAY_COLUMNS x HLS_TRICKPLAY_ROWS)
+    and writes a WebVTT track that maps every interval to its tile (sprite_000.jpg#xywh=x,y,w,h).
+    The single frames are removed afterwards. Returns False if there are no frames.
+    """
+    frames_dir = _trickplay_frames_dir(video_id)
+    frames = sorted(os.listdir(frames_dir)) if os.path.isdir(frames_dir) else []
+    if not frames:
+        return False
+
+    interval = settings.HLS_TRICKPLAY_INTERVAL
+    columns, rows = settings.HLS_TRICKPLAY_COLUMNS, settings.HLS_TRICKPLAY_ROWS
+    per_sprite = columns * rows
+    with Image.open(os.path.join(frames_dir, frames[0])) as first:
+        tile_width, tile_height = first.size
+
+    cues = ['WEBVTT', '']
+    for sprite_index in range(0, len(frames), per_sprite):
+        tiles = frames[sprite_index:sprite_index + per_sprite]
+        sprite_name = f"sprite_{sprite_index // per_sprite:03d}.jpg"
+        sprite = Image.new('RGB', (tile_width * min(columns, len(tiles)),
+                                   tile_height * math.ceil(len(tiles) / columns)))
+        for position, frame in enumerate(tiles):
+            x, y = (position % columns) * tile_width, (position // columns) * tile_height
+            with Image.open(os.path.join(frames_dir, frame)) as tile:
+                sprite.paste(tile.convert('RGB').resize((tile_width, tile_height)), (x, y))
+
+            start = (sprite_index + position) * interval
+            end = start + interval
+            if duration:
+                end = min(end, duration)
+            if end <= start:
+                continue
+            cues.append(f"{_vtt_timestamp(start)} --> {_vtt_timestamp(end)}")
+            cues.append(f"{sprite_name}#xywh={x},{y},{tile_width},{tile_height}")
+            cues.append('')
+        sprite.save(get_hls_dir(video_id, HLS_TRICKPLAY_DIR, sprite_name),
+                    'JPEG', quality=75, optimize=True)
+
+    with open(get_hls_dir(video_id, HLS_TRICKPLAY_DIR, HLS_TRICKPLAY_TRACK), 'w') as f:
+        f.write('\n'.join(cues))
+    shutil.rmtree(frames_dir)
+    print(f"[HLS] Trick-play track with {len(frames)} thumbnails written for video {video_id}")
+    return True
+
+
+def _finish_trickplay(video_id: int, duration):
+    """
+    Builds the trick-play track after an encode. A failure never fails the transcode job.
+    """
+    if not settings.HLS_TRICKPLAY:
+        return
+    try:
+        build_trickplay(video_id, duration)
+    except Exception as e:
+        print(f"[HLS] Trick-play for video {video_id} failed: {e}")
+
+
+def planned_renditions(source: dict, ladder: dict) -> list:
+    """
+    The renditions a transcode of the source creates in the configured HLS_TRANSCODE_MODE.
+    A chunked transcode always encodes the audio once into the shared audio rendition.
+    """
+    renditions = list(ladder)
+    shared_audio = settings.HLS_TRANSCODE_MODE == 'single_decode' or use_chunked_transcoding(source)
+    if shared_audio and source['has_audio']:
+        renditions.append(HLS_AUDIO_RENDITION)
+    return renditions
+
+
+def write_master_playlist(video_id: int, renditions: list, source: dict, ladder: dict):
+    """
+    Writes master.m3u8 which lists all renditions with BANDWIDTH/RESOLUTION,
+    so players can switch the bitrate adaptively.
+    """
+    audio_group = HLS_AUDIO_RENDITION in renditions
+    audio_bps = _bitrate_to_bps(HLS_AUDIO_BITRATE)
+
+    lines = ['#EXTM3U', f'#EXT-X-VERSION:{_playlist_version()}']
+    if audio_group:
+        lines.append(
+            f'#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="{HLS_AUDIO_GROUP}",NAME="{HLS_AUDIO_RENDITION}",'
+            f'DEFAULT=YES,AUTOSELECT=YES,URI="{HLS_AUDIO_RENDITION}/index.m3u8"')
+
+    for resolution, height in ladder.items():
+        if resolution not in renditions:
+            continue
+        bandwidth = _bitrate_to_bps(
+            HLS_BITRATES.get(resolution, '2500k')) + audio_bps
+        attributes = f'BANDWIDTH={bandwidth},RESOLUTION={_scaled_width(source, height)}x{height}'
+        if audio_group:
+            attributes += f',AUDIO="{HLS_AUDIO_GROUP}"'
+        lines.append(f'#EXT-X-STREAM-INF:{attributes}')
+        lines.append(f'{resolution}/index.m3u8')
+
+    master_path = get_hls_dir(video_id, HLS_MASTER_PLAYLIST)
+    with open(master_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    print(f"[HLS] Master playlist written: {master_path}")
+
+
+def _avc_codec(data: bytes) -> str:
+    """
+    RFC 6381 codec string of the H.264 stream, read from the avcC box (profile, compatibility, level)
+    of the init segment.
+    """
+    index = data.find(b'avcC')
+    if index < 0 or len(data) < index + 8:
+        return 'avc1.640028'
+    return f"avc1.{data[index + 5]:02x}{data[index + 6]:02x}{data[index + 7]:02x}"
+
+
+def _dash_segment_timeline(entries: list) -> list:
+    """
+    <S> elements of the segment durations in milliseconds, equal neighbours are folded into one element (r).
+    """
+    timeline = []
+    start = 0
+    for duration, _, _ in entries:
+        length = round(duration * 1000)
+        if timeline and timeline[-1][1] == length:
+            timeline[-1][2] += 1
+        else:
+            timeline.append([start, length, 0])
+        start += length
+    return [f'<S t="{t}" d="{d}" r="{r}"/>' if r else f'<S t="{t}" d="{d}"/>'
+            for t, d, r in timeline]
+
+
+def _dash_range(attribute: str, byterange) -> str:
+    # single-file output: DASH byte ranges are 'first-last', inclusive
+    if byterange is None:
+        return ''
+    length, offset = byterange
+    return f' {attribute}="{offset}-{offset + length - 1}"'
+
+
+def _dash_representation(video_id: int, rendition: str, attributes: str, codecs: list) -> list:
+    """
+    <Representation> of a rendition, built from its media playlist. The segment URLs are the same as in the
+    rewritten HLS playlist (including the ?v=<playlist mtime> version of the published playlist), so both
+    protocols share cached segments.
+    """
+    playlist_path = get_hls_dir(video_id, rendition, 'index.m3u8')
+    version = stat_hls_file(video_id, rendition, 'index.m3u8').mtime_ns
+    init_segment = read_playlist_init_segment(playlist_path)
+    entries = _read_playlist_entries(playlist_path)
+    if rendition != HLS_AUDIO_RENDITION:
+        codecs = [_avc_codec(read_init_segment(video_id, rendition, init_segment)), *codecs]
+
+    return [
+        f'      <Representation id="{rendition}" codecs="{",".join(codecs)}" {attributes}>',
+        '        <SegmentList timescale="1000">',
+        f'          <Initialization sourceURL="{rendition}/{init_segment[0]}/?v={version}"'
+        f'{_dash_range("range", init_segment[1])}/>',
+        '          <SegmentTimeline>',
+        *(f'            {element}' for element in _dash_segment_timeline(entries)),
+        '          </SegmentTimeline>',
+        *(f'          <SegmentURL media="{rendition}/{uri}/?v={version}"{_dash_range("mediaRange", byterange)}/>'
+          for _, uri, byterange in entries),
+        '        </SegmentList>',
+        '      </Representation>',
+    ]
+
+
+def write_dash_manifest(video_id: int, renditions: list, source: dict, ladder: dict):
+    """
+    Writes manifest.mpd for fMP4 output: a static DASH manifest that references the same init segments and
+    segments as the HLS playlists. With MPEG-TS output an old manifest is removed.
+    The media playlists must already be published (see publish_hls_output).
+    """
+    manifest_path = get_hls_dir(video_id, HLS_DASH_MANIFEST)
+    if not use_fmp4():
+        delete_hls_files(video_id, [HLS_DASH_MANIFEST])
+        return
+
+    audio_bps = _bitrate_to_bps(HLS_AUDIO_BITRATE)
+    shared_audio = HLS_AUDIO_RENDITION in renditions
+    muxed_audio = source['has_audio'] and not shared_audio
+    duration = source.get('duration') or sum(
+        duration for duration, _, _ in _read_playlist_entries(
+            get_hls_dir(video_id, renditions[0], 'index.m3u8')))
+
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" profiles="urn:mpeg:dash:profile:isoff-main:2011" '
+        f'type="static" mediaPresentationDuration="PT{duration:.3f}S" minBufferTime="PT{HLS_SEGMENT_SECONDS}S">',
+        '  <Period id="0" start="PT0S">',
+        '    <AdaptationSet id="0" contentType="video" mimeType="video/mp4" '
+        'segmentAlignment="true" startWithSAP="1">',
+    ]
+    for resolution, height in ladder.items():
+        if resolution not in renditions:
+            continue
+        bandwidth = _bitrate_to_bps(HLS_BITRATES.get(resolution, '2500k'))
+        if muxed_audio:
+            bandwidth += audio_bps
+        lines += _dash_representation(
+            video_id, resolution,
+            f'bandwidth="{bandwidth}" width="{_scaled_width(source, height)}" height="{height}"',
+            ['mp4a.40.2'] if muxed_audio else [])
+    lines.append('    </AdaptationSet>')
+
+    if shared_audio:
+        lines.append('    <AdaptationSet id="1" contentType="audio" mimeType="audio/mp4" '
+                     'segmentAlignment="true" startWithSAP="1">')
+        lines += _dash_representation(
+            video_id, HLS_AUDIO_RENDITION, f'bandwidth="{audio_bps}"', ['mp4a.40.2'])
+        lines.append('    </AdaptationSet>')
+    lines += ['  </Period>', '</MPD>']
+
+    with open(manifest_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    print(f"[HLS] DASH manifest written: {manifest_path}")
+
 
 def generate_hls_for_video(video_id: int):
     """
     Runs in the background-worker(RQ). Fetches Videos from the DB and creates HLS-files.
+    Depending on HLS_TRANSCODE_MODE every rendition is encoded by its own ffmpeg process
+    ('per_rendition') or all renditions are created from a single decode ('single_decode').
+    The state and progress of the job are tracked in TranscodeJob/RenditionJob.
     """
     Video = apps.get_model('videoflix_app', 'Video')
+    TranscodeJob = apps.get_model('videoflix_app', 'TranscodeJob')
     video = Video.objects.get(pk=video_id)
 
     if not video.video_file:
         print(f"[HLS] Video {video.id} has no video_file")
         return
 
-    input_path = video.video_file.path
+    job, _ = TranscodeJob.objects.get_or_create(video=video)
+    job.status = TranscodeJob.Status.RUNNING
+    job.progress = 0
+    job.error = ''
+    job.started_at = timezone.now()
+    job.finished_at = None
+    job.save()
+    bump_catalog_version()
+
+    try:
+        fingerprint, renditions = _generate_hls(video, job)
+    except Exception as e:
+        _finish_job(job, TranscodeJob.Status.FAILED, str(e))
+        raise
+
+    if renditions is not None:
+        failed = job.renditions.filter(status=TranscodeJob.Status.FAILED)
+        if failed.exists():
+            _finish_job(job, TranscodeJob.Status.FAILED,
+                        f"Failed renditions: {', '.join(failed.values_list('name', flat=True))}")
+        else:
+            _finish_job(job, TranscodeJob.Status.READY)
+
+    latest = Video.objects.filter(pk=video.id).first()
+    current = _current_stat(latest) if latest and latest.video_file else None
+    if current is not None and renditions is not None and not _same_stat(fingerprint, current):
+        print(
+            f"[HLS] Source of video {video.id} changed during encoding, enqueue again")
+        enqueue_hls_job(video.id)
+
+
+def _finish_job(job, status: str, error: str = ''):
+    Video = apps.get_model('videoflix_app', 'Video')
+    TranscodeJob = apps.get_model('videoflix_app', 'TranscodeJob')
+    fields = {
+        'status': status,
+        'error': error,
+        'finished_at': timezone.now(),
+        'updated_at': timezone.now(),
+    }
+    if status == TranscodeJob.Status.READY:
+        fields['progress'] = 100
+    TranscodeJob.objects.filter(pk=job.pk).update(**fields)
+    invalidate_manifest_cache(job.video_id)
+    refresh_ready_renditions(job.video_id)
+    refresh_category_rows(Video.objects.filter(
+        pk=job.video_id).values_list('category', flat=True).first())
+    bump_catalog_version()
+    print(f"[HLS] Job for video {job.video_id} finished: {status} {error}")
+
+
+def _generate_hls(video, job):
+    """
+    Creates the HLS output of the video. Returns the fingerprint of the encoded source and the created renditions.
+    The renditions are None if the job is finished elsewhere: the output of the current source already exists,
+    or the source was split into chunks and the final stitch job completes the job.
+    """
+    with staged_source(video.video_file) as input_path:
+        return _generate_hls_from(video, job, input_path)
+
+
+def _generate_hls_from(video, job, input_path: str):
+    Video = apps.get_model('videoflix_app', 'Video')
+    TranscodeJob = apps.get_model('videoflix_app', 'TranscodeJob')
+    RenditionJob = apps.get_model('videoflix_app', 'RenditionJob')
+
+    fingerprint = compute_source_fingerprint(video.video_file, input_path)
+    fingerprint.update(output_layout())
+
+    stored = read_stored_fingerprint(video.id)
+    if (stored and stored.get('sha256') == fingerprint['sha256']
+            and _same_layout(stored)
+            and hls_file_exists(video.id, HLS_MASTER_PLAYLIST)):
+        print(f"[HLS] Source of video {video.id} is unchanged, skipping")
+        write_stored_fingerprint(video.id, fingerprint)
+        RenditionJob.objects.filter(job=job).update(
+            status=TranscodeJob.Status.READY, progress=100, error='', updated_at=timezone.now())
+        _finish_job(job, TranscodeJob.Status.READY)
+        return fingerprint, None
+
     print(f"[HLS] Generating HLS for video {video.id}, Input: {input_path}")
 
-    for resolution, height in HLS_RESOLUTIONS.items():
-        output_dir = os.path.join(
-            settings.MEDIA_ROOT, 'hls', str(video.id), resolution)
-        os.makedirs(output_dir, exist_ok=True)
-        output_playlist = os.path.join(output_dir, 'index.m3u8')
-        segment_pattern = os.path.join(output_dir, 'segment_%03d.ts')
+    source = probe_source(input_path)
+    Video.objects.filter(pk=video.id).update(
+        **video_metadata_from_probe(source))
+    bump_catalog_version()
+
+    ladder = build_rendition_ladder(source)
+    print(f"[HLS] Rendition ladder for video {video.id}: {ladder}")
+    _remove_stale_renditions(video.id, ladder)
+
+    os.makedirs(get_hls_dir(video.id), exist_ok=True)
+
+    if use_chunked_transcoding(source):
+        reset_rendition_jobs(job, planned_renditions(source, ladder), keep_ready=True)
+        enqueue_hls_chunks(video.id, input_path, source, ladder, fingerprint)
+        return fingerprint, None
+
+    progress = TranscodeProgress(
+        job, planned_renditions(source, ladder), source['duration'])
+
+    playlists = [f'{rendition}/index.m3u8' for rendition in planned_renditions(source, ladder)]
+    prepare_trickplay_output(video.id)
+    with SegmentUploader(video.id, playlists):
+        if settings.HLS_TRANSCODE_MODE == 'single_decode':
+            renditions = _transcode_single_decode(
+                video.id, input_path, source, ladder, progress)
+        else:
+            renditions = _transcode_per_rendition(
+                video.id, input_path, ladder, progress)
+
+    if renditions:
+        write_master_playlist(video.id, renditions, source, ladder)
+        _finish_trickplay(video.id, source['duration'])
+    publish_hls_output(video.id, renditions, source, ladder)
+    progress.publish(renditions)
+
+    if len(renditions) >= len(ladder):
+        write_stored_fingerprint(video.id, fingerprint)
+    return fingerprint, renditions
+
+
+def use_chunked_transcoding(source: dict) -> bool:
+    """
+    Long sources are split into chunks that are encoded by separate RQ jobs, if HLS_CHUNKED_TRANSCODING is enabled.
+    """
+    return (settings.HLS_CHUNKED_TRANSCODING
+            and bool(source.get('duration'))
+            and source['duration'] > 2 * settings.HLS_CHUNK_SECONDS)
+
+
+def probe_keyframes(input_path: str) -> list:
+    """
+    Returns the timestamps (seconds) of all keyframes of the first video stream.
+    Only packets are read (no decoding), so this is fast even for long sources.
+    """
+    cmd = [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+        input_path,
+    ]
+    result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags:
+            timestamp = _parse_float(pts_time)
+            if timestamp is not None:
+                keyframes.append(timestamp)
+    return sorted(keyframes)
+
+
+def split_into_chunks(keyframes: list, duration: float, chunk_seconds: float) -> list:
+    """
+    Splits the source into (start, end) chunks of about chunk_seconds that start at keyframes.
+    The end of the last chunk is None (until the end of the source).
+    """
+    starts = [0.0]
+    for keyframe in keyframes:
+        if keyframe >= starts[-1] + chunk_seconds and keyframe < duration - chunk_seconds / 2:
+            starts.append(keyframe)
+    ends = starts[1:] + [None]
+    return list(zip(starts, ends))
+
+
+def enqueue_hls_chunks(video_id: int, input_path: str, source: dict, ladder: dict, fingerprint: dict):
+    """
+    Fans the video renditions out into one RQ job per chunk (on HLS_CHUNK_QUEUE, so any worker node can run them)
+    and a final job that stitches the chunk playlists together once all chunks are done. The audio is encoded
+    by a single job for the whole source, so there is no encoder delay at the chunk boundaries.
+    The files of the run are named after a run id, so the output of an earlier encode stays playable until
+    the stitch job replaces its playlists and deletes it.
+    """
+    chunks = split_into_chunks(
+        probe_keyframes(input_path), source['duration'], settings.HLS_CHUNK_SECONDS)
+    run = uuid.uuid4().hex[:8]
+    print(f"[HLS] Splitting video {video_id} into {len(chunks)} chunks (run {run})")
+
+    queue = get_queue(settings.HLS_CHUNK_QUEUE)
+    jobs = [
+        queue.enqueue(transcode_hls_chunk, video_id, run, index, start, end,
+                      source, ladder)
+        for index, (start, end) in enumerate(chunks)
+    ]
+    if source['has_audio']:
+        jobs.append(queue.enqueue(transcode_hls_audio, video_id, run))
+    stitch_job = queue.enqueue(
+        stitch_hls_chunks, video_id, run, len(chunks), source, ladder, fingerprint,
+        depends_on=Dependency(
+            jobs=[job.id for job in jobs], allow_failure=True),
+    )
+    # the stitch job stands for the whole transcode, enqueue_hls_job collapses into it
+    cache.set(f"hls-job:{video_id}", stitch_job.id, timeout=None)
+
+
+def _chunk_prefix(run: str, index: int) -> str:
+    return f'{run}_c{index:03d}_'
+
+
+def _chunk_playlist_name(run: str, index: int) -> str:
+    return f'{run}_chunk_{index:03d}.m3u8'
+
 
-        video_bitrate = HLS_BITRATES.get(resolution, '2500k')
+def _audio_prefix(run: str) -> str:
+    return f'{run}_a_'
 
-        cmd = [
-            'ffmpeg',
-            '-y',
-            '-i', input_path,
-            '-vf', f'scale=-2:{height}',
+
+def _audio_playlist_name(run: str) -> str:
+    return f'{run}_audio.m3u8'
+
+
+def _run_playlist_names(run: str, rendition: str, chunk_count: int) -> list:
+    """
+    The playlists a run writes for a rendition: one per chunk, or the single playlist of the audio job.
+    """
+    if rendition == HLS_AUDIO_RENDITION:
+        return [_audio_playlist_name(run)]
+    return [_chunk_playlist_name(run, index) for index in range(chunk_count)]
+
+
+def _run_hls_output(video_id: int, rendition: str, prefix: str, playlist_name: str) -> list:
+    """
+    hls muxer output of a chunked run into the rendition directory, its files are named with the prefix.
+    """
+    output_dir = get_hls_dir(video_id, rendition)
+    os.makedirs(output_dir, exist_ok=True)
+    return [
+        '-f', 'hls',
+        '-hls_time', str(HLS_SEGMENT_SECONDS),
+        '-hls_playlist_type', 'vod',
+        *segment_format_args(prefix + HLS_INIT_SEGMENT),
+        '-hls_segment_filename', os.path.join(output_dir, segment_filename(prefix)),
+        os.path.join(output_dir, playlist_name),
+    ]
+
+
+def _publish_run_files(video_id: int, prefix: str, playlist_name: str):
+    # other jobs of the video may write into the same work dir, only the files of this job are uploaded
+    files = [name for name in list_work_files(video_id)
+             if name.rsplit('/', 1)[-1].startswith((prefix, playlist_name))]
+    publish_hls_files(video_id, files)
+    discard_work_files(video_id, files)
+
+
+def transcode_hls_chunk(video_id: int, run: str, index: int, start: float, end, source: dict, ladder: dict):
+    """
+    Runs in the background-worker(RQ). Encodes one chunk of the source into all video renditions from a single
+    decode (the audio is encoded by transcode_hls_audio).
+    Segments are named <run>_c<chunk>_segment_<n>, so the chunks of a rendition never collide with each other
+    or with the output of an earlier encode and need no renaming.
+    Timestamps are shifted by the chunk start, so the stitched playlist plays without discontinuities.
+    """
+    Video = apps.get_model('videoflix_app', 'Video')
+    TranscodeJob = apps.get_model('videoflix_app', 'TranscodeJob')
+    RenditionJob = apps.get_model('videoflix_app', 'RenditionJob')
+    video = Video.objects.get(pk=video_id)
+
+    resolutions = list(ladder.items())
+    split_outputs = ''.join(f'[v{i}]' for i in range(len(resolutions)))
+    filters = [f'[0:v]split={len(resolutions)}{split_outputs}']
+    filters += [f'[v{i}]scale=-2:{height}[v{i}out]'
+                for i, (_, height) in enumerate(resolutions)]
+
+    threads = get_threads_per_rendition(len(resolutions))
+    input_args = ['ffmpeg', '-y', '-threads', str(threads), '-ss', str(start)]
+    if end is not None:
+        input_args += ['-to', str(end)]
+    cmd = ['-filter_complex', ';'.join(filters)]
+
+    prefix, playlist_name = _chunk_prefix(run, index), _chunk_playlist_name(run, index)
+    for i, (resolution, _) in enumerate(resolutions):
+        cmd += [
+            '-map', f'[v{i}out]',
             '-c:v', 'h264',
-            '-b:v', video_bitrate,
-            '-c:a', 'aac',
-            '-b:a', '128k',
-            '-hls_time', '6',
-            '-hls_playlist_type', 'vod',
-            '-hls_segment_filename', segment_pattern,
-            output_playlist,
+            '-b:v', HLS_BITRATES.get(resolution, '2500k'),
+            '-threads', str(threads),
+            *_keyframe_args(),
+            '-output_ts_offset', str(start),
+            *_run_hls_output(video_id, resolution, prefix, playlist_name),
         ]
+
+    playlists = [f'{resolution}/{playlist_name}' for resolution, _ in resolutions]
+    # all chunk jobs of a node read the same local copy of the source
+    input_path = shared_source(video.video_file)
+    with SegmentUploader(video_id, playlists):
+        error = _run_ffmpeg([*input_args, '-i', input_path, *cmd], f"{video_id} chunk {index}")
+    if error is not None:
+        raise RuntimeError(f"Chunk {index} of video {video_id} failed: {error}")
+    _publish_run_files(video_id, prefix, playlist_name)
+
+    # a retried or duplicate run of the chunk counts only once
+    if not cache.add(f"hls-chunk-done:{video_id}:{run}:{index}", 1, timeout=HLS_CHUNK_DONE_TIMEOUT):
+        return
+    chunk_end = end if end is not None else source['duration']
+    share = (chunk_end - start) * 100 / source['duration']
+    progress = Least(F('progress') + share, 100.0, output_field=FloatField())
+    TranscodeJob.objects.filter(video_id=video_id).update(
+        progress=progress, updated_at=timezone.now())
+    RenditionJob.objects.filter(job__video_id=video_id, status=TranscodeJob.Status.RUNNING).exclude(
+        name=HLS_AUDIO_RENDITION).update(progress=progress, updated_at=timezone.now())
+
+
+def transcode_hls_audio(video_id: int, run: str):
+    """
+    Runs in the background-worker(RQ) next to the chunk jobs. Encodes the audio of the whole source once into
+    the shared audio rendition, so it has a single encoder delay at the start instead of a gap at every chunk.
+    """
+    Video = apps.get_model('videoflix_app', 'Video')
+    TranscodeJob = apps.get_model('videoflix_app', 'TranscodeJob')
+    RenditionJob = apps.get_model('videoflix_app', 'RenditionJob')
+    video = Video.objects.get(pk=video_id)
+
+    prefix, playlist_name = _audio_prefix(run), _audio_playlist_name(run)
+    cmd = [
+        'ffmpeg', '-y',
+        '-i', shared_source(video.video_file),
+        '-map', '0:a:0', '-vn',
+        '-c:a', 'aac', '-b:a', HLS_AUDIO_BITRATE,
+        *_run_hls_output(video_id, HLS_AUDIO_RENDITION, prefix, playlist_name),
+    ]
+    with SegmentUploader(video_id, [f'{HLS_AUDIO_RENDITION}/{playlist_name}']):
+        error = _run_ffmpeg(cmd, f"{video_id} audio")
+    if error is not None:
+        raise RuntimeError(f"Audio of video {video_id} failed: {error}")
+    _publish_run_files(video_id, prefix, playlist_name)
+
+    RenditionJob.objects.filter(
+        job__video_id=video_id, name=HLS_AUDIO_RENDITION, status=TranscodeJob.Status.RUNNING).update(
+        progress=100, updated_at=timezone.now())
+
+
+def _parse_byterange(value: str, previous_end: int) -> tuple:
+    """
+    Parses an HLS byte range 'length[@offset]' into (length, offset); without offset the range
+    starts where the previous one ended.
+    """
+    length, _, offset = value.partition('@')
+    return int(length), int(offset) if offset else previous_end
+
+
+def _read_playlist_entries(playlist_path: str) -> list:
+    """
+    Returns the (duration, uri, byterange) entries of a media playlist.
+    byterange is (length, offset) in single-file playlists, None otherwise.
+    """
+    entries = []
+    duration = None
+    byterange = None
+    previous_end = 0
+    with open(playlist_path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('#EXTINF:'):
+                duration = float(line[len('#EXTINF:'):].split(',')[0])
+            elif line.startswith('#EXT-X-BYTERANGE:'):
+                byterange = _parse_byterange(line[len('#EXT-X-BYTERANGE:'):], previous_end)
+                previous_end = sum(byterange)
+            elif line and not line.startswith('#'):
+                entries.append((duration, line, byterange))
+                byterange = None
+    return entries
+
+
+def read_playlist_init_segment(playlist_path: str):
+    """
+    Returns the init segment (uri, byterange) of an fMP4 media playlist (EXT-X-MAP), None for MPEG-TS playlists.
+    """
+    with open(playlist_path, 'r') as f:
+        for line in f:
+            if line.startswith('#EXT-X-MAP:'):
+                uri = re.search(r'URI="([^"]+)"', line)
+                byterange = re.search(r'BYTERANGE="([^"]+)"', line)
+                if uri is None:
+                    return None
+                return uri.group(1), _parse_byterange(byterange.group(1), 0) if byterange else None
+    return None
+
+
+def read_init_segment(video_id: int, rendition: str, init_segment: tuple) -> bytes:
+    """
+    Reads the bytes of an init segment: a whole file or, in single-file mode, its byte range of the media file.
+    """
+    uri, byterange = init_segment
+    return read_hls_bytes(video_id, f'{rendition}/{uri}', byterange)
+
+
+def _byterange_tag(byterange: tuple) -> str:
+    length, offset = byterange
+    return f'{length}@{offset}'
+
+
+def write_media_playlist(playlist_path: str, entries: list, init_segment: tuple = None):
+    target_duration = math.ceil(max(duration for duration, _, _ in entries))
+    lines = [
+        '#EXTM3U',
+        f'#EXT-X-VERSION:{_playlist_version()}',
+        f'#EXT-X-TARGETDURATION:{target_duration}',
+        '#EXT-X-MEDIA-SEQUENCE:0',
+        '#EXT-X-PLAYLIST-TYPE:VOD',
+    ]
+    if init_segment:
+        uri, byterange = init_segment
+        tag = f'#EXT-X-MAP:URI="{uri}"'
+        if byterange:
+            tag += f',BYTERANGE="{_byterange_tag(byterange)}"'
+        lines.append(tag)
+    for duration, uri, byterange in entries:
+        lines.append(f'#EXTINF:{duration:.6f},')
+        if byterange:
+            lines.append(f'#EXT-X-BYTERANGE:{_byterange_tag(byterange)}')
+        lines.append(uri)
+    lines.append('#EXT-X-ENDLIST')
+    with open(playlist_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def _merge_chunk_init_segments(video_id: int, run: str, rendition: str, chunk_playlists: list):
+    """
+    All chunks of a rendition are encoded with the same settings, so their init segments are identical:
+    the first one becomes the init segment of the rendition, the copies are deleted. In single-file mode
+    the init segment is part of the chunk media files, so the first chunk's byte range is referenced instead.
+    Returns None if an init segment differs (the chunks can't share one EXT-X-MAP).
+    """
+    chunk_inits = [read_playlist_init_segment(path) for path in chunk_playlists]
+    if not all(chunk_inits):
+        return None
+    try:
+        contents = [read_init_segment(video_id, rendition, init) for init in chunk_inits]
+    except FileNotFoundError:
+        return None
+    if any(content != contents[0] for content in contents[1:]):
+        return None
+    if use_single_file():
+        return chunk_inits[0]
+
+    # the init segment of the earlier encode is still referenced by the live playlist
+    init_name = f'{run}_{HLS_INIT_SEGMENT}'
+    with open(get_hls_dir(video_id, rendition, init_name), 'wb') as f:
+        f.write(contents[0])
+    delete_hls_files(video_id, [f'{rendition}/{uri}' for uri, _ in chunk_inits])
+    return init_name, None
+
+
+def remove_unreferenced_files(video_id: int, renditions: list):
+    """
+    Deletes the files of earlier encodes (another output layout, a longer source) that the
+    media playlists of the renditions don't reference any more.
+    """
+    for rendition in renditions:
+        playlist_path = get_hls_dir(video_id, rendition, 'index.m3u8')
+        referenced = {'index.m3u8'}
+        referenced.update(uri for _, uri, _ in _read_playlist_entries(playlist_path))
+        init_segment = read_playlist_init_segment(playlist_path)
+        if init_segment:
+            referenced.add(init_segment[0])
+        delete_hls_files(video_id, [f'{rendition}/{name}' for name in list_hls_files(video_id, rendition)
+                                    if name not in referenced])
+
+
+def publish_hls_output(video_id: int, renditions: list, source: dict, ladder: dict):
+    """
+    Uploads the output of a finished job from the work dir into the storage (segments that the SegmentUploader
+    streamed during the encode are already there), deletes files of earlier encodes and removes the work dir.
+    Segments go before the playlists that reference them. The DASH manifest is written last, so its segment
+    versions are the mtimes of the published media playlists, like in the HLS playlists the views rewrite.
+    """
+    names = list_work_files(video_id)
+    publish_hls_files(video_id, [name for name in names if not name.endswith(MUTABLE_EXTENSIONS)])
+    publish_hls_files(video_id, [name for name in names if name.endswith(MUTABLE_EXTENSIONS)])
+    if renditions:
+        write_dash_manifest(video_id, renditions, source, ladder)
+        if use_fmp4():
+            publish_hls_files(video_id, [HLS_DASH_MANIFEST])
+    remove_unreferenced_files(video_id, renditions)
+    discard_work_dir(video_id)
+
+
+def _discard_chunk_run(video_id: int, run: str, rendition: str):
+    """
+    Deletes the chunk files of a run whose rendition could not be stitched, the earlier output stays.
+    """
+    delete_hls_files(video_id, [f'{rendition}/{name}' for name in list_hls_files(video_id, rendition)
+                                if name.startswith(f'{run}_')])
+
+
+def _stitch_rendition(video_id: int, run: str, rendition: str, chunk_count: int):
+    """
+    Joins the run playlists of a rendition into its index.m3u8. Returns an error message if the rendition
+    can't be stitched; its run files are deleted then and the earlier output stays.
+    """
+    playlist_names = _run_playlist_names(run, rendition, chunk_count)
+    # the jobs of the run may have run on other worker nodes, their playlists are fetched from the storage
+    playlists = [fetch_hls_file(video_id, f'{rendition}/{name}') for name in playlist_names]
+    missing = [path for path in playlists if path is None]
+    if missing:
+        _discard_chunk_run(video_id, run, rendition)
+        if rendition == HLS_AUDIO_RENDITION:
+            return "The audio could not be transcoded"
+        return f"{len(missing)} of {chunk_count} chunks failed"
+
+    init_segment = None
+    if use_fmp4():
+        init_segment = _merge_chunk_init_segments(video_id, run, rendition, playlists)
+        if init_segment is None:
+            _discard_chunk_run(video_id, run, rendition)
+            return "The init segments of the chunks differ"
+
+    entries = []
+    for path in playlists:
+        entries += _read_playlist_entries(path)
+    write_media_playlist(get_hls_dir(
+        video_id, rendition, 'index.m3u8'), entries, init_segment)
+    delete_hls_files(video_id, [f'{rendition}/{name}' for name in playlist_names])
+    print(f"[HLS] Stitched {len(playlist_names)} playlists of video {video_id} {rendition}")
+    return None
+
+
+def stitch_hls_chunks(video_id: int, run: str, chunk_count: int, source: dict, ladder: dict, fingerprint: dict):
+    """
+    Runs in the background-worker(RQ) after all chunk jobs and the audio job. Joins the chunk playlists of every
+    rendition into media/hls/<id>/<resolution>/index.m3u8, writes the master playlist and finishes the transcode
+    job. The audio is stitched first: without it the video renditions (which carry no audio) are not published.
+    The segments of the earlier encode are deleted only once the new playlists are published.
+    """
+    Video = apps.get_model('videoflix_app', 'Video')
+    TranscodeJob = apps.get_model('videoflix_app', 'TranscodeJob')
+    RenditionJob = apps.get_model('videoflix_app', 'RenditionJob')
+    job = TranscodeJob.objects.get(video_id=video_id)
+
+    renditions = planned_renditions(source, ladder)
+    renditions.sort(key=lambda rendition: rendition != HLS_AUDIO_RENDITION)
+    created = []
+    audio_error = None
+    for rendition in renditions:
+        if audio_error:
+            _discard_chunk_run(video_id, run, rendition)
+            error = audio_error
+        else:
+            error = _stitch_rendition(video_id, run, rendition, chunk_count)
+        if error:
+            if rendition == HLS_AUDIO_RENDITION:
+                audio_error = error
+            RenditionJob.objects.filter(job=job, name=rendition).update(
+                status=TranscodeJob.Status.FAILED, error=error, updated_at=timezone.now())
+            continue
+        RenditionJob.objects.filter(job=job, name=rendition).update(
+            status=TranscodeJob.Status.READY, progress=100, error='', updated_at=timezone.now())
+        created.append(rendition)
+
+    latest = Video.objects.filter(pk=video_id).first()
+    if created:
+        write_master_playlist(video_id, created, source, ladder)
+        if settings.HLS_TRICKPLAY and latest and latest.video_file:
+            extract_trickplay_frames(video_id, shared_source(latest.video_file))
+            _finish_trickplay(video_id, source['duration'])
+    publish_hls_output(video_id, created, source, ladder)
+    if latest and latest.video_file:
+        discard_shared_source(latest.video_file)
+
+    if len(created) >= len(renditions):
+        write_stored_fingerprint(video_id, fingerprint)
+        _finish_job(job, TranscodeJob.Status.READY)
+    else:
+        _finish_job(job, TranscodeJob.Status.FAILED,
+                    "Not all chunks could be transcoded")
+
+    latest = Video.objects.filter(pk=video_id).first()
+    current = _current_stat(latest) if latest and latest.video_file else None
+    if current is not None and not _same_stat(fingerprint, current):
         print(
-            f"[HLS] Running ffmpeg for {video.id} {resolution}: {' '.join(cmd)}")
+            f"[HLS] Source of video {video_id} changed during encoding, enqueue again")
+        enqueue_hls_job(video_id)
 
-        try:
-            subprocess.run(cmd, check=True)
-            print(f"[HLS] OK: {output_playlist}")
-        except subprocess.CalledProcessError as e:
-            print(
-                f"[HLS] FFmpeg failed for video {video.id} {resolution}: {e}")
+
+def _remove_stale_renditions(video_id: int, ladder: dict):
+    """
+    Deletes renditions of an earlier source that are not part of the ladder of the current source.
+    """
+    for resolution in HLS_RESOLUTIONS:
+        if resolution not in ladder:
+            delete_hls_tree(video_id, resolution)
 
 
 def delete_hls_for_video(video_id: int):
 
-    hls_root = os.path.join(settings.MEDIA_ROOT, 'hls', str(video_id))
-    if os.path.isdir(hls_root):
-        shutil.rmtree(hls_root)
-        print(f"[HLS] HLS-Directory for video {video_id} deleted: {hls_root}")
+    invalidate_manifest_cache(video_id)
+    delete_hls_tree(video_id)
+    print(f"[HLS] HLS output of video {video_id} deleted")
@@ -0,0 +1,464 @@
+import functools
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, suppress
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+
+
+SEGMENT_CONTENT_TYPES = {
+    '.ts': 'video/MP2T',
+    '.m4s': 'video/iso.segment',
+    '.mp4': 'video/mp4',
+    '.jpg': 'image/jpeg',
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.mpd': 'application/dash+xml',
+    '.vtt': 'text/vtt',
+}
+
+# written again by every transcode, so they must not be cached like the segments
+MUTABLE_EXTENSIONS = ('.m3u8', '.mpd', '.vtt', '.fingerprint')
+
+
+def segment_content_type(filename: str) -> str:
+    return SEGMENT_CONTENT_TYPES.get(os.path.splitext(filename)[1], 'application/octet-stream')
+
+
+class FileInfo(NamedTuple):
+    size: int
+    mtime_ns: int
+
+    @property
+    def mtime(self) -> float:
+        return self.mtime_ns / 1e9
+
+
+class LocalHLSStorage(FileSystemStorage):
+    """
+    HLS output on the local (or shared) filesystem under MEDIA_ROOT/hls. ffmpeg writes directly into it,
+    so nothing has to be uploaded.
+    """
+
+    is_local = True
+
+    def __init__(self):
+        super().__init__(location=os.path.join(settings.MEDIA_ROOT, 'hls'), allow_overwrite=True)
+
+    def stat(self, name: str) -> FileInfo:
+        stat = os.stat(self.path(name))
+        return FileInfo(stat.st_size, stat.st_mtime_ns)
+
+    def read_range(self, name: str, offset: int, length: int) -> bytes:
+        with open(self.path(name), 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def delete_tree(self, name: str):
+        shutil.rmtree(self.path(name), ignore_errors=True)
+
+
+def _s3_storage_class():
+    """
+    Builds the object store backend. django-storages and boto3 (requirements.txt) are only imported when
+    it is configured, so local setups without them keep working.
+    """
+    try:
+        from botocore.exceptions import ClientError
+        from storages.backends.s3 import S3Storage
+        from storages.utils import clean_name
+    except ImportError as e:
+        raise ImproperlyConfigured(
+            'STORAGE_BACKEND=s3 needs django-storages and boto3: pip install "django-storages[s3]"') from e
+
+    class S3HLSStorage(S3Storage):
+        """
+        S3 compatible object store (AWS S3, MinIO). Objects get the content type of the HLS file and the
+        segment Cache-Control, the web nodes redirect segment requests to presigned URLs.
+        """
+
+        is_local = False
+
+        def _key(self, name: str) -> str:
+            return self._normalize_name(clean_name(name))
+
+        def get_object_parameters(self, name):
+            params = super().get_object_parameters(name)
+            params.setdefault('ContentType', segment_content_type(name))
+            if not name.endswith(MUTABLE_EXTENSIONS):
+                params.setdefault('CacheControl', settings.HLS_SEGMENT_CACHE_CONTROL)
+            return params
+
+        def stat(self, name: str) -> FileInfo:
+            obj = self.bucket.Object(self._key(name))
+            try:
+                obj.load()
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey'):
+                    raise FileNotFoundError(name) from e
+                raise
+            return FileInfo(obj.content_length, int(obj.last_modified.timestamp() * 1e9))
+
+        def read_range(self, name: str, offset: int, length: int) -> bytes:
+            response = self.bucket.Object(self._key(name)).get(
+                Range=f'bytes={offset}-{offset + length - 1}')
+            return response['Body'].read()
+
+        def delete_tree(self, name: str):
+            self.bucket.objects.filter(Prefix=self._key(name).rstrip('/') + '/').delete()
+
+    return S3HLSStorage
+
+
+def _s3_options(location: str) -> dict:
+    return {
+        'bucket_name': settings.S3_BUCKET,
+        'endpoint_url': settings.S3_ENDPOINT_URL or None,
+        'region_name': settings.S3_REGION or None,
+        'access_key': settings.S3_ACCESS_KEY_ID or None,
+        'secret_key': settings.S3_SECRET_ACCESS_KEY or None,
+        'location': location,
+        'file_overwrite': True,
+        'querystring_expire': settings.S3_URL_EXPIRE,
+    }
+
+
+@functools.cache
+def get_hls_storage():
+    """
+    The storage of the HLS output (STORAGE_BACKEND): 'local' (MEDIA_ROOT/hls) or 's3' (S3_BUCKET, prefix hls/).
+    """
+    if settings.STORAGE_BACKEND == 's3':
+        return _s3_storage_class()(**_s3_options('hls'))
+    return LocalHLSStorage()
+
+
+def get_source_storage():
+    """
+    Storage of the uploaded source videos and thumbnails: the default media storage or, with
+    STORAGE_BACKEND=s3, the bucket (prefix media/), so web and worker nodes share no filesystem.
+    """
+    if settings.STORAGE_BACKEND == 's3':
+        return _s3_storage_class()(**_s3_options('media'))
+    return default_storage
+
+
+def get_public_storage():
+    """
+    Storage of the thumbnails and their resized variants: the source storage, but with STORAGE_BACKEND=s3
+    its URLs are not presigned. Every catalog response lists them, and signing each one would cost an
+    HMAC per URL and make them uncacheable; the bucket has to allow public reads of media/thumbnails/.
+    """
+    if settings.STORAGE_BACKEND == 's3':
+        return _s3_storage_class()(**_s3_options('media'), querystring_auth=False)
+    return default_storage
+
+
+def hls_name(video_id: int, *parts) -> str:
+    """
+    Storage name of the HLS output of a video (or of a file inside it).
+    """
+    return '/'.join([str(video_id), *parts])
+
+
+def get_work_dir(video_id: int, *parts) -> str:
+    """
+    Local directory a transcode job writes the HLS output of a video to. With local storage this is the
+    storage itself; otherwise a staging directory in HLS_WORK_DIR that is uploaded and removed by the job.
+    """
+    storage = get_hls_storage()
+    if storage.is_local:
+        return os.path.join(storage.location, str(video_id), *parts)
+    return os.path.join(settings.HLS_WORK_DIR, str(video_id), *parts)
+
+
+def stat_hls_file(video_id: int, *parts) -> FileInfo:
+    """
+    Size and mtime of a file of the HLS output. Raises FileNotFoundError.
+    """
+    return get_hls_storage().stat(hls_name(video_id, *parts))
+
+
+def hls_file_exists(video_id: int, *parts) -> bool:
+    return get_hls_storage().exists(hls_name(video_id, *parts))
+
+
+def read_hls_text(video_id: int, *parts) -> str:
+    with get_hls_storage().open(hls_name(video_id, *parts), 'rb') as f:
+        return f.read().decode()
+
+
+def read_hls_bytes(video_id: int, name: str, byterange: tuple = None) -> bytes:
+    """
+    Reads a file of the HLS output (or its (length, offset) byte range): from the work dir if the running
+    job has the file locally, from the storage otherwise (e.g. the chunk files of other worker nodes).
+    """
+    local_path = get_work_dir(video_id, *name.split('/'))
+    if os.path.isfile(local_path):
+        with open(local_path, 'rb') as f:
+            if byterange is None:
+                return f.read()
+            length, offset = byterange
+            f.seek(offset)
+            return f.read(length)
+
+    storage = get_hls_storage()
+    if byterange is None:
+        with storage.open(hls_name(video_id, name), 'rb') as f:
+            return f.read()
+    length, offset = byterange
+    return storage.read_range(hls_name(video_id, name), offset, length)
+
+
+def write_hls_bytes(video_id: int, name: str, content: bytes):
+    """
+    Writes a small file (e.g. the source fingerprint) directly into the storage.
+    """
+    get_hls_storage().save(hls_name(video_id, name), ContentFile(content))
+
+
+def fetch_hls_file(video_id: int, name: str):
+    """
+    Returns the local path of a file of the HLS output, downloaded into the work dir if it is only in the
+    storage. None if the file doesn't exist.
+    """
+    local_path = get_work_dir(video_id, *name.split('/'))
+    if os.path.isfile(local_path):
+        return local_path
+    storage = get_hls_storage()
+    if storage.is_local or not storage.exists(hls_name(video_id, name)):
+        return None
+    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+    with storage.open(hls_name(video_id, name), 'rb') as source, open(local_path, 'wb') as target:
+        shutil.copyfileobj(source, target)
+    return local_path
+
+
+def publish_hls_files(video_id: int, names):
+    """
+    Uploads files of the work dir (names relative to the video directory) into the storage.
+    Nothing to do with local storage, where the work dir is the storage.
+    """
+    storage = get_hls_storage()
+    if storage.is_local:
+        return
+    for name in names:
+        with open(get_work_dir(video_id, *name.split('/')), 'rb') as f:
+            storage.save(hls_name(video_id, name), File(f))
+
+
+def list_work_files(video_id: int) -> list:
+    """
+    All files in the work dir of a video, as names relative to the video directory.
+    """
+    root = get_work_dir(video_id)
+    names = []
+    for directory, _, files in os.walk(root):
+        relative = os.path.relpath(directory, root)
+        names += [name if relative == '.' else f"{relative.replace(os.sep, '/')}/{name}" for name in files]
+    return names
+
+
+def list_hls_files(video_id: int, *parts) -> list:
+    """
+    File names in a directory of the HLS output in the storage.
+    """
+    storage = get_hls_storage()
+    try:
+        return storage.listdir(hls_name(video_id, *parts))[1]
+    except FileNotFoundError:
+        return []
+
+
+def delete_hls_files(video_id: int, names):
+    """
+    Deletes files (names relative to the video directory) from the work dir and the storage.
+    """
+    storage = get_hls_storage()
+    for name in names:
+        local_path = get_work_dir(video_id, *name.split('/'))
+        if os.path.isfile(local_path):
+            os.remove(local_path)
+        if not storage.is_local:
+            storage.delete(hls_name(video_id, name))
+
+
+def delete_hls_tree(video_id: int, *parts):
+    """
+    Deletes a directory of the HLS output (or all of it) from the storage and the work dir.
+    """
+    storage = get_hls_storage()
+    storage.delete_tree(hls_name(video_id, *parts))
+    if not storage.is_local:
+        shutil.rmtree(get_work_dir(video_id, *parts), ignore_errors=True)
+
+
+def discard_work_files(video_id: int, names):
+    """
+    Removes uploaded files from the work dir (object storage only).
+    """
+    if get_hls_storage().is_local:
+        return
+    for name in names:
+        os.remove(get_work_dir(video_id, *name.split('/')))
+
+
+def discard_work_dir(video_id: int):
+    """
+    Removes the staging directory of a video once its files are uploaded (object storage only).
+    """
+    if not get_hls_storage().is_local:
+        shutil.rmtree(get_work_dir(video_id), ignore_errors=True)
+
+
+def _playlist_uris(playlist_path: str) -> list:
+    try:
+        with open(playlist_path, 'r') as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    except FileNotFoundError:
+        return []
+
+
+class SegmentUploader:
+    """
+    Uploads the segments of a running ffmpeg process into the storage while it encodes: every
+    HLS_UPLOAD_INTERVAL seconds the media playlists in the work dir are read, and the segments they list
+    (ffmpeg adds a segment once it is complete) are uploaded and removed locally, so the work dir only ever
+    holds a few segments. Does nothing with local storage or in single-file mode, where the media file
+    grows until the end and is uploaded with the rest of the output.
+    """
+
+    def __init__(self, video_id: int, playlists: list):
+        self.video_id = video_id
+        self.playlists = playlists
+        self.uploaded = set()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.enabled = not get_hls_storage().is_local and not settings.HLS_SINGLE_FILE
+
+    def __enter__(self):
+        if self.enabled:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.thread is not None:
+            self.stopped.set()
+            self.thread.join()
+            self.upload_finished()
+        return False
+
+    def run(self):
+        while not self.stopped.wait(settings.HLS_UPLOAD_INTERVAL):
+            try:
+                self.upload_finished()
+            except Exception as e:
+                print(f"[HLS] Segment upload of video {self.video_id} failed, retrying: {e}")
+
+    def upload_finished(self):
+        for playlist in self.playlists:
+            directory = playlist.rsplit('/', 1)[0]
+            for uri in _playlist_uris(get_work_dir(self.video_id, *playlist.split('/'))):
+                name = f"{directory}/{uri}"
+                local_path = get_work_dir(self.video_id, *name.split('/'))
+                if name in self.uploaded or not os.path.isfile(local_path):
+                    continue
+                publish_hls_files(self.video_id, [name])
+                os.remove(local_path)
+                self.uploaded.add(name)
+
+
+def source_stat(field_file) -> FileInfo:
+    """
+    Size and mtime of a source video in its storage (without downloading it).
+    """
+    try:
+        stat = os.stat(field_file.path)
+        return FileInfo(stat.st_size, stat.st_mtime_ns)
+    except NotImplementedError:
+        storage, name = field_file.storage, field_file.name
+        if not storage.exists(name):
+            raise FileNotFoundError(name)
+        return FileInfo(storage.size(name), int(storage.get_modified_time(name).timestamp() * 1e9))
+
+
+@contextmanager
+def staged_source(field_file):
+    """
+    Local path of a source video for ffmpeg/ffprobe. A source on the local filesystem is used in place,
+    a source in an object store is downloaded into HLS_WORK_DIR for the duration of the job.
+    """
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        path = None
+    if path is not None:
+        yield path
+        return
+
+    os.makedirs(settings.HLS_WORK_DIR, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=settings.HLS_WORK_DIR, suffix=os.path.splitext(field_file.name)[1],
+                                     delete=False) as staged:
+        with field_file.storage.open(field_file.name, 'rb') as source:
+            shutil.copyfileobj(source, staged, 1024 * 1024)
+    try:
+        yield staged.name
+    finally:
+        os.remove(staged.name)
+
+
+# shared sources of transcodes whose stitch job ran on another node are removed after this many seconds
+SHARED_SOURCE_MAX_AGE = 24 * 3600
+
+
+def _shared_source_path(field_file) -> str:
+    stat = source_stat(field_file)
+    key = hashlib.sha256(f'{field_file.name}:{stat.size}:{stat.mtime_ns}'.encode()).hexdigest()[:32]
+    return os.path.join(settings.HLS_WORK_DIR, 'sources', key + os.path.splitext(field_file.name)[1])
+
+
+def shared_source(field_file) -> str:
+    """
+    Local path of a source video that several jobs on this node read (the chunk jobs of a transcode).
+    A source in an object store is downloaded once per node and version and reused until
+    discard_shared_source(); a local source is used in place.
+    """
+    try:
+        return field_file.path
+    except NotImplementedError:
+        pass
+
+    path = _shared_source_path(field_file)
+    if os.path.exists(path):
+        return path
+    source_dir = os.path.dirname(path)
+    os.makedirs(source_dir, exist_ok=True)
+    for entry in os.scandir(source_dir):
+        if entry.stat().st_mtime < time.time() - SHARED_SOURCE_MAX_AGE:
+            with suppress(FileNotFoundError):
+                os.remove(entry.path)
+    with tempfile.NamedTemporaryFile(dir=source_dir, delete=False) as staged:
+        with field_file.storage.open(field_file.name, 'rb') as source:
+            shutil.copyfileobj(source, staged, 1024 * 1024)
+    # parallel workers of the node may download it at the same time, the last rename wins
+    os.replace(staged.name, path)
+    return path
+
+
+def discard_shared_source(field_file):
+    try:
+        field_file.path
+        return
+    except NotImplementedError:
+        pass
+    with suppress(FileNotFoundError):
+        os.remove(_shared_source_path(field_file))
@@ -0,0 +1,143 @@
+import hashlib
+import io
+import os
+from contextlib import suppress
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django_rq import get_queue
+from PIL import Image, ImageOps
+
+from .caching import bump_catalog_version
+from .catalog import refresh_category_rows
+
+
+# Pillow format and encoder options per variant format
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def get_thumbnail_variants_dir(video_id: int, *parts) -> str:
+    """
+    Returns the storage name of the variants directory of a video (or of a file inside it).
+    """
+    return '/'.join(['thumbnails', 'variants', str(video_id), *parts])
+
+
+def get_thumbnail_storage():
+    """
+    The storage of Video.thumbnail (the public storage, so the variants live next to the thumbnails
+    on the local filesystem or in the bucket and get unsigned URLs as well).
+    """
+    Video = apps.get_model('videoflix_app', 'Video')
+    return Video._meta.get_field('thumbnail').storage
+
+
+def _variant_token(storage, thumbnail_name: str) -> str:
+    """
+    Short token of the source thumbnail. It is part of every variant name, so a new thumbnail gets new
+    URLs and the variants can be cached as immutable.
+    """
+    modified = storage.get_modified_time(thumbnail_name).timestamp()
+    key = f"{thumbnail_name}:{storage.size(thumbnail_name)}:{modified}"
+    return hashlib.md5(key.encode()).hexdigest()[:10]
+
+
+def _target_widths(source_width: int) -> list:
+    """
+    The configured widths that don't upscale the source, largest first.
+    A source smaller than every width is only re-encoded at its own width.
+    """
+    widths = sorted((w for w in settings.THUMBNAIL_WIDTHS if w <= source_width), reverse=True)
+    return widths or [source_width]
+
+
+def render_thumbnail_variants(video_id: int, thumbnail_name: str) -> dict:
+    """
+    Writes the resized WebP/JPEG copies of a thumbnail and returns {format: {'<width>w': file name}}.
+    The image is scaled down step by step from the largest width, so every step starts from a smaller image.
+    Does not touch the database (used by the RQ job and the backfill command).
+    """
+    storage = get_thumbnail_storage()
+    token = _variant_token(storage, thumbnail_name)
+    variants = {name: {} for name in THUMBNAIL_FORMATS}
+
+    with storage.open(thumbnail_name, 'rb') as f, Image.open(f) as source:
+        # JPEG sources are decoded at a reduced size directly (both sides stay >= the largest width,
+        # which also holds after an EXIF rotation)
+        largest = max(settings.THUMBNAIL_WIDTHS)
+        source.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(source).convert('RGB')
+
+    for width in _target_widths(image.width):
+        height = max(1, round(image.height * width / image.width))
+        if (width, height) != image.size:
+            image = image.resize((width, height), Image.Resampling.LANCZOS)
+
+        for name, (image_format, options) in THUMBNAIL_FORMATS.items():
+            encoded = io.BytesIO()
+            image.save(encoded, image_format, **options)
+            # the storage may pick another name if the file exists, the returned name is the stored one
+            variants[name][f"{width}w"] = storage.save(
+                get_thumbnail_variants_dir(video_id, f"{token}_{width}.{name}"),
+                ContentFile(encoded.getvalue()))
+    return variants
+
+
+def remove_stale_thumbnail_variants(video_id: int, variants: dict):
+    """
+    Deletes the variant files of older thumbnails, once the current variants are stored on the video.
+    """
+    current = {filename.rsplit('/', 1)[-1]
+               for sizes in variants.values() for filename in sizes.values()}
+    storage = get_thumbnail_storage()
+    for filename in _list_thumbnail_variants(video_id):
+        if filename not in current:
+            storage.delete(get_thumbnail_variants_dir(video_id, filename))
+
+
+def _list_thumbnail_variants(video_id: int) -> list:
+    try:
+        return get_thumbnail_storage().listdir(get_thumbnail_variants_dir(video_id))[1]
+    except FileNotFoundError:
+        return []
+
+
+def generate_thumbnail_variants(video_id: int):
+    """
+    RQ job: creates the thumbnail variants of a video and stores them on the video.
+    The result is only written if the thumbnail was not replaced in the meantime.
+    """
+    Video = apps.get_model('videoflix_app', 'Video')
+    video = Video.objects.filter(pk=video_id).only('id', 'thumbnail', 'category').first()
+    if video is None or not video.thumbnail:
+        return
+
+    variants = render_thumbnail_variants(video.id, video.thumbnail.name)
+    updated = Video.objects.filter(pk=video.id, thumbnail=video.thumbnail.name).update(
+        thumbnail_variants=variants)
+    if updated:
+        remove_stale_thumbnail_variants(video.id, variants)
+        refresh_category_rows(video.category)
+        bump_catalog_version()
+    print(f"[THUMBNAIL] Variants for video {video.id} created: {sorted(variants['webp'])}")
+
+
+def enqueue_thumbnail_job(video_id: int):
+    queue = get_queue(settings.THUMBNAIL_QUEUE)
+    job = queue.enqueue(generate_thumbnail_variants, video_id)
+    print(f"[THUMBNAIL] Enqueued job {job.id} for video {video_id}")
+    return job
+
+
+def delete_thumbnail_variants(video_id: int):
+    storage = get_thumbnail_storage()
+    for filename in _list_thumbnail_variants(video_id):
+        storage.delete(get_thumbnail_variants_dir(video_id, filename))
+    # object stores have no directories, the local one is removed once it is empty
+    with suppress(NotImplementedError, OSError):
+        os.rmdir(storage.path(get_thumbnail_variants_dir(video_id)))
+
@@ -0,0 +1,267 @@
+import hashlib
+import os
+import re
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.db import transaction
+from django_rq import get_queue
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .services import ACTIVE_JOB_STATUSES
+
+
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+# how long the completion job (hashing and moving the file) may run
+UPLOAD_COMPLETE_TIMEOUT = 60 * 60
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The upload does not accept this request in its current state.'
+    default_code = 'upload_conflict'
+
+
+class StagedUploadFile(File):
+    """
+    A completed upload file. FileSystemStorage moves files with a temporary_file_path instead of copying them,
+    other storages (e.g. S3) upload it like any file.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def upload_path(upload) -> str:
+    return os.path.join(settings.UPLOAD_DIR, f"{upload.id}.part")
+
+
+def create_upload_file(upload):
+    """
+    Creates the partial file with its final size (sparse), so every chunk can be written at its offset.
+    """
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    fd = os.open(upload_path(upload), os.O_WRONLY | os.O_CREAT, 0o640)
+    try:
+        os.ftruncate(fd, upload.size)
+    finally:
+        os.close(fd)
+
+
+def discard_upload_file(upload):
+    try:
+        os.remove(upload_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+def parse_content_range(header: str, size: int):
+    """
+    Returns the inclusive (start, end) of a 'Content-Range: bytes <start>-<end>/<size>' header.
+    """
+    match = CONTENT_RANGE_RE.match(header or '')
+    if match is None:
+        raise ValidationError({'detail': 'Content-Range: bytes <start>-<end>/<size> is required.'})
+    start, end, total = (int(value) for value in match.groups())
+    if total != size or start > end or end >= size:
+        raise ValidationError({'detail': f'Content-Range does not fit the upload size of {size} bytes.'})
+    if end - start + 1 > settings.UPLOAD_MAX_CHUNK_SIZE:
+        raise ValidationError(
+            {'detail': f'Chunks must not be larger than {settings.UPLOAD_MAX_CHUNK_SIZE} bytes.'})
+    return start, end
+
+
+def write_chunk(upload, stream, start: int, end: int) -> int:
+    """
+    Streams the request body to its offset in the partial file in blocks of UPLOAD_BLOCK_SIZE, so a chunk
+    is never held in memory. Returns the number of bytes written, which is less than the chunk if the client
+    disconnected. Raises UploadConflict if the partial file is gone (the upload was completed or aborted meanwhile).
+    """
+    try:
+        fd = os.open(upload_path(upload), os.O_WRONLY)
+    except FileNotFoundError:
+        raise UploadConflict('The upload no longer accepts chunks.')
+    offset = start
+    remaining = end - start + 1
+    try:
+        while remaining > 0:
+            block = stream.read(min(UPLOAD_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            view = memoryview(block)
+            while view:
+                written = os.pwrite(fd, view, offset)
+                offset += written
+                remaining -= written
+                view = view[written:]
+    finally:
+        os.close(fd)
+    return offset - start
+
+
+def merge_ranges(ranges: list, start: int, end: int) -> list:
+    """
+    Adds the [start, end) byte range to sorted, non-overlapping ranges and merges adjacent ones.
+    """
+    merged = []
+    for range_start, range_end in sorted([*ranges, [start, end]]):
+        if merged and range_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], range_end)
+        else:
+            merged.append([range_start, range_end])
+    return merged
+
+
+def record_chunk(upload_id, start: int, end: int):
+    """
+    Marks the [start, end) byte range as received. The row is locked, so parallel chunk requests
+    don't overwrite each other's ranges.
+    """
+    VideoUpload = apps.get_model('videoflix_app', 'VideoUpload')
+
+    with transaction.atomic():
+        upload = VideoUpload.objects.select_for_update().get(pk=upload_id)
+        if upload.status != VideoUpload.Status.UPLOADING:
+            raise UploadConflict(f'The upload is {upload.status}.')
+        upload.received = merge_ranges(upload.received, start, end)
+        upload.bytes_received = sum(range_end - range_start for range_start, range_end in upload.received)
+        upload.save(update_fields=['received', 'bytes_received', 'updated_at'])
+    return upload
+
+
+def file_sha256(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+def _store_source(upload):
+    """
+    Builds the video of a completed upload (not saved yet) and moves the partial file into the source storage.
+    """
+    Video = apps.get_model('videoflix_app', 'Video')
+
+    video = Video(title=upload.title, description=upload.description,
+                  category=upload.category, thumbnail=upload.thumbnail.name)
+    with open(upload_path(upload), 'rb') as f:
+        video.video_file.save(upload.filename, StagedUploadFile(f), save=False)
+    discard_upload_file(upload)
+    return video
+
+
+def _check_complete(upload):
+    """
+    Raises UploadConflict unless the upload is still uploading (or being completed) and has every byte.
+    """
+    VideoUpload = apps.get_model('videoflix_app', 'VideoUpload')
+
+    if upload.status not in (VideoUpload.Status.UPLOADING, VideoUpload.Status.COMPLETING):
+        raise UploadConflict(f'The upload is {upload.status}.')
+    if upload.received != [[0, upload.size]]:
+        raise UploadConflict(
+            f'{upload.size - upload.bytes_received} bytes are missing, see received.')
+
+
+def _set_upload_status(upload_id, status: str, error: str = '', expected=None):
+    """
+    Sets the status of the upload if it is still in one of the expected states. Returns the upload, or None if
+    it was deleted or changed by another request.
+    """
+    VideoUpload = apps.get_model('videoflix_app', 'VideoUpload')
+
+    with transaction.atomic():
+        upload = VideoUpload.objects.select_for_update().filter(pk=upload_id).first()
+        if upload is None or (expected is not None and upload.status not in expected):
+            return None
+        upload.status = status
+        upload.error = error
+        upload.save(update_fields=['status', 'error', 'updated_at'])
+    return upload
+
+
+def complete_upload(upload_id):
+    """
+    Verifies that every byte was received and enqueues the job that checks the SHA-256 and creates the video
+    (finish_upload). The upload is 'completing' until the job is done, clients poll it through the upload detail.
+    Completing a completed upload again returns it unchanged; while its job is queued or running, no second job
+    is enqueued. A job that was lost (e.g. a killed worker) is replaced by the next request.
+    """
+    VideoUpload = apps.get_model('videoflix_app', 'VideoUpload')
+
+    upload = VideoUpload.objects.get(pk=upload_id)
+    if upload.status == VideoUpload.Status.COMPLETE:
+        return upload
+    _check_complete(upload)
+
+    queue = get_queue(settings.UPLOAD_QUEUE)
+    job_key = f"upload-complete:{upload_id}"
+    with cache.lock(f"upload-complete-lock:{upload_id}", timeout=10):
+        job_id = cache.get(job_key)
+        job = queue.fetch_job(job_id) if job_id else None
+        if job is not None and job.get_status() in ACTIVE_JOB_STATUSES:
+            return upload
+
+        upload = _set_upload_status(
+            upload_id, VideoUpload.Status.COMPLETING,
+            expected=(VideoUpload.Status.UPLOADING, VideoUpload.Status.COMPLETING))
+        if upload is None:
+            raise UploadConflict('The upload was changed while it was completed.')
+        job = queue.enqueue(finish_upload, upload_id, job_timeout=UPLOAD_COMPLETE_TIMEOUT)
+        cache.set(job_key, job.id, timeout=UPLOAD_COMPLETE_TIMEOUT)
+    print(f"[UPLOAD] Enqueued job {job.id} to complete upload {upload_id}")
+    return upload
+
+
+def finish_upload(upload_id):
+    """
+    Runs in the background-worker(RQ). Hashes the completed file and moves it into the source storage without
+    a row lock; the row is only locked to re-check its state and create the video, whose HLS job is enqueued
+    once that transaction is committed. A checksum mismatch fails the upload and removes the file, any other
+    error before the move sets it back to uploading, so the client can complete it again. If the video can't be
+    saved, the moved source is deleted and the upload fails.
+    """
+    VideoUpload = apps.get_model('videoflix_app', 'VideoUpload')
+
+    upload = VideoUpload.objects.filter(pk=upload_id).first()
+    if upload is None or upload.status != VideoUpload.Status.COMPLETING:
+        return
+    try:
+        digest = file_sha256(upload_path(upload))
+        if digest != upload.sha256:
+            print(f"[UPLOAD] Upload {upload.id} failed: SHA-256 {digest} does not match")
+            if _set_upload_status(
+                    upload_id, VideoUpload.Status.FAILED,
+                    'The SHA-256 of the uploaded file does not match, upload it again.',
+                    expected=(VideoUpload.Status.COMPLETING,)):
+                discard_upload_file(upload)
+            return
+
+        video = _store_source(upload)
+    except Exception as e:
+        _set_upload_status(upload_id, VideoUpload.Status.UPLOADING, str(e),
+                           expected=(VideoUpload.Status.COMPLETING,))
+        raise
+
+    try:
+        with transaction.atomic():
+            upload = VideoUpload.objects.select_for_update().filter(pk=upload_id).first()
+            if upload is None or upload.status != VideoUpload.Status.COMPLETING:
+                # deleted or changed while the file was verified
+                video.video_file.delete(save=False)
+                print(f"[UPLOAD] Upload {upload_id} was changed while it was completed")
+                return
+            video.save()
+            upload.video = video
+            upload.status = VideoUpload.Status.COMPLETE
+            upload.error = ''
+            upload.save(update_fields=['video', 'status', 'error', 'updated_at'])
+    except Exception as e:
+        # the partial file is gone, so the moved source would be left without a video
+        video.video_file.delete(save=False)
+        _set_upload_status(upload_id, VideoUpload.Status.FAILED, f'The video could not be created: {e}',
+                           expected=(VideoUpload.Status.COMPLETING,))
+        raise
+    print(f"[UPLOAD] Upload {upload.id} complete, created video {video.id}")
@@ -1,11 +1,43 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
-from .views import VideoListAPIView, VideoStreamManifestAPIView, VideoSegmentAPIView
+from .views import VideoListAPIView, VideoCategoryRowsAPIView, VideoTrickplayTrackAPIView, VideoTrickplaySpriteAPIView, VideoTranscodeStatusAPIView, VideoMasterManifestAPIView, VideoDashManifestAPIView, VideoStreamManifestAPIView, VideoSegmentAPIView, VideoUploadCreateAPIView, VideoUploadDetailAPIView, VideoUploadCompleteAPIView
+from .async_views import AsyncVideoMasterManifestView, AsyncVideoStreamManifestView, AsyncVideoSegmentView
+
+# HLS_ASYNC_STREAMING routes the streaming endpoints to the async views (served via core.asgi),
+# everything else keeps using the DRF views
+if settings.HLS_ASYNC_STREAMING:
+    master_manifest_view = AsyncVideoMasterManifestView.as_view()
+    stream_manifest_view = AsyncVideoStreamManifestView.as_view()
+    segment_view = AsyncVideoSegmentView.as_view()
+else:
+    master_manifest_view = VideoMasterManifestAPIView.as_view()
+    stream_manifest_view = VideoStreamManifestAPIView.as_view()
+    segment_view = VideoSegmentAPIView.as_view()
 
 urlpatterns = [
     path('video/', VideoListAPIView.as_view(), name='video-list'),
+    path('video/rows/', VideoCategoryRowsAPIView.as_view(),
+         name='video-category-rows'),
+    path('video/uploads/', VideoUploadCreateAPIView.as_view(),
+         name='video-upload-create'),
+    path('video/uploads/<uuid:upload_id>/', VideoUploadDetailAPIView.as_view(),
+         name='video-upload-detail'),
+    path('video/uploads/<uuid:upload_id>/complete/', VideoUploadCompleteAPIView.as_view(),
+         name='video-upload-complete'),
+    path('video/<int:movie_id>/status/',
+         VideoTranscodeStatusAPIView.as_view(), name='video-transcode-status',),
+    path('video/<int:movie_id>/master.m3u8',
+         master_manifest_view, name='video-master-manifest',),
+    path('video/<int:movie_id>/manifest.mpd',
+         VideoDashManifestAPIView.as_view(), name='video-dash-manifest',),
+    path('video/<int:movie_id>/thumbnails.vtt',
+         VideoTrickplayTrackAPIView.as_view(), name='video-trickplay-track',),
+    # before the segment route, which would match trickplay/<sprite>/ as well
+    path('video/<int:movie_id>/trickplay/<str:sprite>/',
+         VideoTrickplaySpriteAPIView.as_view(), name='video-trickplay-sprite',),
     path('video/<int:movie_id>/<str:resolution>/index.m3u8',
-         VideoStreamManifestAPIView.as_view(), name='video-stream',),
+         stream_manifest_view, name='video-stream',),
     path('video/<int:movie_id>/<str:resolution>/<str:segment>/',
-         VideoSegmentAPIView.as_view(), name='video-segment',),
+         segment_view, name='video-segment',),
 ]
@@ -1,29 +1,196 @@
-import os
+import re
+from xml.sax.saxutils import escape
 
 from rest_framework import generics
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
 from django.conf import settings
-from django.http import HttpResponse, FileResponse
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 
-from ..models import Video
-from .services import HLS_RESOLUTIONS
-from .serializers import VideoSerializer
+from ..models import Video, TranscodeJob, VideoUpload
+from .caching import (catalog_cache_key, catalog_etag, get_catalog_version,
+                      get_ready_renditions, get_rewritten_manifest, manifest_etag)
+from .catalog import get_category_rows
+from .delivery import serve_hls_file
+from .pagination import VideoCursorPagination
+from .permissions import HasValidSegmentSignature
+from .services import (HLS_DASH_MANIFEST, HLS_MASTER_PLAYLIST, HLS_TRICKPLAY_DIR, HLS_TRICKPLAY_TRACK,
+                       is_valid_rendition)
+from .serializers import VideoSerializer, VideoGridSerializer, TranscodeJobSerializer, VideoUploadSerializer
+from .storage import read_hls_text, stat_hls_file
+from .signing import segment_expiry, signed_segment_query
+from .uploads import complete_upload, create_upload_file, parse_content_range, record_chunk, write_chunk
+
+
+def stream_not_ready_payload(video):
+    """
+    Returns (data, status, headers) of the error response for a stream that is not ready (yet),
+    based on the transcode job of the video.
+    """
+    if video is None:
+        return {'detail': 'Video not found'}, 404, None
+    if not video.video_file:
+        return {"detail": "No video file for this movie"}, 404, None
+
+    job = getattr(video, 'transcode_job', None)
+    if job is not None and job.status == TranscodeJob.Status.FAILED:
+        return {"detail": "HLS generation failed for this video.", "status": job.status}, 404, None
+    return (
+        {
+            "detail": "HLS stream is still being generated.",
+            "status": job.status if job else TranscodeJob.Status.QUEUED,
+            "progress": job.progress if job else 0,
+        },
+        503,
+        {'Retry-After': '10'},
+    )
+
+
+def stream_not_ready_response(movie_id):
+    video = Video.objects.filter(pk=movie_id).select_related(
+        'transcode_job').first()
+    data, status, headers = stream_not_ready_payload(video)
+    return Response(data, status=status, headers=headers)
+
+
+def rewrite_media_playlist(content: str, base_url: str, version: int) -> str:
+    """
+    Turns the relative segment names of a media playlist into absolute segment URLs.
+    The trailing slash matches the segment route directly, without an APPEND_SLASH redirect per segment.
+    The playlist version (mtime) in the query makes the URLs of a re-transcoded video differ,
+    so segments can be cached as immutable. The init segment of fMP4 playlists (EXT-X-MAP) is rewritten the same way.
+    Single-file playlists repeat the media file URL per segment, the EXT-X-BYTERANGE tags stay unchanged.
+    """
+    new_lines = []
+    for line in content.splitlines():
+        if line.startswith('#EXT-X-MAP:'):
+            new_lines.append(re.sub(
+                r'URI="([^"]+)"', lambda match: f'URI="{base_url}{match.group(1)}/?v={version}"', line))
+        elif line.startswith('#') or not line.strip():
+            new_lines.append(line)
+        else:
+            new_lines.append(f"{base_url}{line.strip()}/?v={version}")
+    return '\n'.join(new_lines) + '\n'
+
+
+def rewrite_dash_manifest(content: str, base_url: str) -> str:
+    """
+    Adds the absolute BaseURL of the video to the DASH manifest; its segment URLs are relative to it.
+    """
+    return content.replace(
+        '  <Period', f'  <BaseURL>{escape(base_url)}</BaseURL>\n  <Period', 1)
+
+
+def manifest_signature(user, movie_id, resolution: str) -> str:
+    """
+    Query string that signs the segment URLs of the manifest for this user, '' if signing is disabled.
+    """
+    if not settings.HLS_SIGNED_SEGMENT_URLS:
+        return ''
+    return signed_segment_query(user.pk, movie_id, resolution, segment_expiry())
+
+
+def sign_media_playlist(content: str, version: int, signature: str) -> str:
+    if not signature:
+        return content
+    return content.replace(f"?v={version}", f"?v={version}&{signature}")
+
+
+def catalog_response(request, scope: str, build):
+    """
+    Serves catalog data (video list pages, category rows) as JSON bytes cached under the catalog version.
+    build() is only called on a cache miss; the ETag is derived from the cache key, so repeat requests get a 304.
+    """
+    key = catalog_cache_key(
+        scope, get_catalog_version(), request.build_absolute_uri('/'), request.query_params)
+    etag = catalog_etag(key)
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        content = cache.get(key)
+        if content is None:
+            content = JSONRenderer().render(build())
+            cache.set(key, content, timeout=settings.CATALOG_CACHE_TIMEOUT)
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def rewrite_trickplay_track(content: str, base_url: str, version: int) -> str:
+    """
+    Turns the sprite names of the WebVTT thumbnail track into absolute, versioned sprite URLs
+    (the #xywh fragment stays at the end).
+    """
+    new_lines = []
+    for line in content.splitlines():
+        if '#xywh=' in line:
+            name, fragment = line.split('#', 1)
+            line = f"{base_url}{name}/?v={version}#{fragment}"
+        new_lines.append(line)
+    return '\n'.join(new_lines) + '\n'
+
+
+def playlist_response(request, content_or_builder, etag: str, mtime: float,
+                      content_type: str = 'application/vnd.apple.mpegurl'):
+    """
+    Answers with 304 if the client already has this version of the playlist, otherwise with the playlist
+    and ETag/Last-Modified validators. content_or_builder is only called when a body is needed.
+    """
+    last_modified = int(mtime)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        content = content_or_builder() if callable(
+            content_or_builder) else content_or_builder
+        response = HttpResponse(content, content_type=content_type,)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 class VideoListAPIView(generics.ListAPIView):
     """
     Get /api/video/
-    Retrieves a list of all available videos.
+    Retrieves a cursor-paginated list of all available videos, newest first.
+    ?category=<name> filters by category, ?view=grid returns the compact grid data
+    and only loads the columns it needs.
+    Pages are cached as rendered JSON under the catalog version, which changes with every video
+    (or transcode status) change; the ETag is derived from it, so repeat requests get a 304.
+    The transcode progress in the list is only refreshed on status changes, the status endpoint is live.
     User needs to be authenticated
     """
 
-    queryset = Video.objects.all().order_by('-created_at')
+    queryset = Video.objects.select_related('transcode_job')
     serializer_class = VideoSerializer
+    pagination_class = VideoCursorPagination
     permission_classes = [IsAuthenticated]
 
+    def is_grid_view(self):
+        return self.request.query_params.get('view') == 'grid'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        category = self.request.query_params.get('category')
+        if category:
+            queryset = queryset.filter(category=category)
+        if self.is_grid_view():
+            queryset = queryset.only(*VideoGridSerializer.COLUMNS)
+        return queryset
+
+    def get_serializer_class(self):
+        if self.is_grid_view():
+            return VideoGridSerializer
+        return VideoSerializer
+
     def get_serializer_context(self):
         """
         gives the request context to the serializer to build full URLs for thumbnails
@@ -32,78 +199,327 @@ class VideoListAPIView(generics.ListAPIView):
         context['request'] = self.request
         return context
 
+    def list(self, request, *args, **kwargs):
+        return catalog_response(
+            request, 'list', lambda: super(VideoListAPIView, self).list(request, *args, **kwargs).data)
+
+
+class VideoCategoryRowsAPIView(APIView):
+    """
+    GET /api/video/rows/?per_row=<n>
+    Returns the catalog grouped into category rows (newest videos first, rows with the newest videos first),
+    for the home screen. The rows are materialized in Redis and rebuilt per category when videos change;
+    ?per_row limits the videos per row (at most CATALOG_ROW_SIZE).
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return catalog_response(request, 'rows', lambda: self.build_rows(request))
+
+    def build_rows(self, request):
+        try:
+            per_row = int(request.query_params.get(
+                'per_row', settings.CATALOG_ROW_SIZE))
+        except ValueError:
+            per_row = settings.CATALOG_ROW_SIZE
+        per_row = min(max(per_row, 1), settings.CATALOG_ROW_SIZE)
+
+        rows = sorted(
+            get_category_rows().items(),
+            key=lambda row: (row[1][0]['created_at'], row[1][0]['id']),
+            reverse=True,
+        )
+        return [
+            {
+                'category': category,
+                'videos': [self.with_absolute_urls(request, video) for video in videos[:per_row]],
+            }
+            for category, videos in rows
+        ]
+
+    def with_absolute_urls(self, request, video):
+        thumbnail_url = video.get('thumbnail_url')
+        return {
+            **video,
+            'thumbnail_url': request.build_absolute_uri(thumbnail_url) if thumbnail_url else None,
+            'thumbnail_variants': {
+                name: {descriptor: request.build_absolute_uri(url) for descriptor, url in sizes.items()}
+                for name, sizes in video.get('thumbnail_variants', {}).items()
+            },
+        }
+
+
+class VideoTranscodeStatusAPIView(APIView):
+    """
+    GET /api/video/<int:movie_id>/status/
+    Returns the transcoding state of the video with status and progress of every rendition.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, movie_id):
+        if not Video.objects.filter(pk=movie_id).exists():
+            return Response({'detail': 'Video not found'}, status=404)
+        job = TranscodeJob.objects.filter(
+            video_id=movie_id).prefetch_related('renditions').first()
+        if job is None:
+            return Response({'detail': 'No transcode job for this video'}, status=404)
+        return Response(TranscodeJobSerializer(job).data)
+
+
+class VideoMasterManifestAPIView(APIView):
+    """
+    GET /api/video/<int:movie_id>/master.m3u8
+    Returns the HLS master playlist which lists all renditions of the video, so the player can switch the bitrate adaptively.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, movie_id):
+        if not get_ready_renditions(movie_id):
+            return stream_not_ready_response(movie_id)
+
+        try:
+            stat = stat_hls_file(movie_id, HLS_MASTER_PLAYLIST)
+        except FileNotFoundError:
+            return stream_not_ready_response(movie_id)
+
+        def read_master():
+            return read_hls_text(movie_id, HLS_MASTER_PLAYLIST)
+
+        etag = manifest_etag(movie_id, HLS_MASTER_PLAYLIST, '', stat.mtime_ns)
+        return playlist_response(request, read_master, etag, stat.mtime)
+
+
+class VideoDashManifestAPIView(APIView):
+    """
+    GET /api/video/<int:movie_id>/manifest.mpd
+    Returns the DASH manifest of a video with fMP4 segments (HLS_SEGMENT_FORMAT=fmp4).
+    It references the same init segments and segments as the HLS playlists, served by the segment endpoint.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, movie_id):
+        if not get_ready_renditions(movie_id):
+            return stream_not_ready_response(movie_id)
+
+        try:
+            stat = stat_hls_file(movie_id, HLS_DASH_MANIFEST)
+        except FileNotFoundError:
+            return Response({"detail": "No DASH manifest for this video."}, status=404)
+
+        host = request.build_absolute_uri('/')
+        base_url = request.build_absolute_uri(f"/api/video/{movie_id}/")
+
+        def rewrite():
+            return rewrite_dash_manifest(read_hls_text(movie_id, HLS_DASH_MANIFEST), base_url)
+
+        etag = manifest_etag(movie_id, HLS_DASH_MANIFEST, host, stat.mtime_ns)
+        return playlist_response(
+            request,
+            lambda: get_rewritten_manifest(
+                movie_id, HLS_DASH_MANIFEST, host, stat.mtime_ns, rewrite),
+            etag, stat.mtime, content_type='application/dash+xml')
+
 
 class VideoStreamManifestAPIView(APIView):
     """
     GET /api/video/<int:movie_id>/<str:resolution>/index.m3u8
     Returns the HLS manifest file for the specified video and resolution.
+    The rewritten manifest is cached (local LRU + Redis), repeat requests are answered with 304.
+    With HLS_SIGNED_SEGMENT_URLS the segment URLs get a short-lived signature bound to user, video and resolution.
     """
 
     permission_classes = [IsAuthenticated]
 
     def get(self, request, movie_id, resolution):
-        if resolution not in HLS_RESOLUTIONS:
+        if not is_valid_rendition(resolution):
             return Response({'detail': 'Resolution not found'}, status=404)
 
-        try:
-            video = Video.objects.get(pk=movie_id)
-        except Video.DoesNotExist:
-            return Response({'detail': 'Video not found'}, status=404)
-
-        m3u8_path = os.path.join(settings.MEDIA_ROOT, 'hls', str(
-            video.id), resolution, 'index.m3u8')
-
-        if not os.path.exists(m3u8_path):
-            if not video.video_file:
-                return Response(
-                    {"detail": "No video file for this movie"},
-                    status=404,
-                )
-            return Response(
-                {"detail": "HLS stream is still being generated."},
-                status=503,
-            )
+        if resolution not in get_ready_renditions(movie_id):
+            return stream_not_ready_response(movie_id)
 
-        with open(m3u8_path, 'r') as f:
-            content = f.read()
+        try:
+            stat = stat_hls_file(movie_id, resolution, 'index.m3u8')
+        except FileNotFoundError:
+            return stream_not_ready_response(movie_id)
 
-        lines = content.splitlines()
-        new_lines = []
+        host = request.build_absolute_uri('/')
         base_url = request.build_absolute_uri(
-            f"/api/video/{video.id}/{resolution}/")
+            f"/api/video/{movie_id}/{resolution}/")
+
+        def rewrite():
+            return rewrite_media_playlist(
+                read_hls_text(movie_id, resolution, 'index.m3u8'), base_url, stat.mtime_ns)
 
-        for line in lines:
-            if line.startswith('#') or not line.strip():
-                new_lines.append(line)
-            else:
-                new_lines.append(base_url + line.strip())
-        rewritten_content = '\n'.join(new_lines) + '\n'
+        def build():
+            return sign_media_playlist(
+                get_rewritten_manifest(
+                    movie_id, resolution, host, stat.mtime_ns, rewrite),
+                stat.mtime_ns, signature)
 
-        return HttpResponse(rewritten_content, content_type='application/vnd.apple.mpegurl',)
+        signature = manifest_signature(request.user, movie_id, resolution)
+        etag = manifest_etag(movie_id, resolution,
+                             host + signature, stat.mtime_ns)
+        return playlist_response(request, build, etag, stat.mtime)
 
 
 class VideoSegmentAPIView(APIView):
     """
     GET /api/video/<int:movie_id>/<str:resolution>/<str:segment>/
-    Retrieves a single TS-segment for the HLS-video.
+    Retrieves a single segment (TS, or fMP4 segment/init segment) of the video.
+    Only authenticates and authorizes the request, the bytes are delivered by serve_hls_file (HLS_SEGMENT_DELIVERY).
+    Readiness is checked against the readiness index, so the hot path does not query the database.
+    A valid URL signature grants access without authenticating the user (no JWT decoding, no user lookup);
+    authentication only runs lazily when IsAuthenticated has to be checked.
     """
 
-    permission_classes = [IsAuthenticated]
+    permission_classes = [HasValidSegmentSignature | IsAuthenticated]
+
+    def perform_authentication(self, request):
+        pass
 
     def get(self, request, movie_id, resolution, segment):
-        if resolution not in HLS_RESOLUTIONS:
+        if not is_valid_rendition(resolution):
             return Response({"detail": "Resolution not found."}, status=404)
 
         if "/" in segment or ".." in segment:
             return Response({"detail": "Invalid segment name"}, status=404)
+        if resolution not in get_ready_renditions(movie_id):
+            return Response({"detail": "Segment not found."}, status=404)
+
+        return serve_hls_file(request, movie_id, resolution, segment)
+
+
+class VideoTrickplayTrackAPIView(APIView):
+    """
+    GET /api/video/<int:movie_id>/thumbnails.vtt
+    Returns the WebVTT thumbnail track for scrubbing previews. Every cue points to a tile of a sprite sheet.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, movie_id):
         try:
-            video = Video.objects.get(pk=movie_id)
-        except Video.DoesNotExist:
-            return Response({"detail": "Video not found"}, status=404)
+            stat = stat_hls_file(movie_id, HLS_TRICKPLAY_DIR, HLS_TRICKPLAY_TRACK)
+        except FileNotFoundError:
+            return Response({"detail": "No thumbnail track for this video."}, status=404)
 
-        segment_path = os.path.join(
-            settings.MEDIA_ROOT, 'hls', str(video.id), resolution, segment)
-        if not os.path.exists(segment_path):
-            return Response({"detail": "Segment not found."}, status=404)
+        host = request.build_absolute_uri('/')
+        base_url = request.build_absolute_uri(
+            f"/api/video/{movie_id}/{HLS_TRICKPLAY_DIR}/")
+
+        def rewrite():
+            return rewrite_trickplay_track(
+                read_hls_text(movie_id, HLS_TRICKPLAY_DIR, HLS_TRICKPLAY_TRACK), base_url, stat.mtime_ns)
+
+        etag = manifest_etag(movie_id, HLS_TRICKPLAY_DIR, host, stat.mtime_ns)
+        return playlist_response(
+            request,
+            lambda: get_rewritten_manifest(
+                movie_id, HLS_TRICKPLAY_DIR, host, stat.mtime_ns, rewrite),
+            etag, stat.mtime, content_type='text/vtt')
 
-        return FileResponse(open(segment_path, 'rb'), content_type="video/MP2T",)
+
+class VideoTrickplaySpriteAPIView(APIView):
+    """
+    GET /api/video/<int:movie_id>/trickplay/<str:sprite>/
+    Retrieves a sprite sheet of the thumbnail track, delivered like the segments (serve_hls_file).
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, movie_id, sprite):
+        if "/" in sprite or ".." in sprite or not sprite.endswith('.jpg'):
+            return Response({"detail": "Invalid sprite name"}, status=404)
+        return serve_hls_file(request, movie_id, HLS_TRICKPLAY_DIR, sprite)
+
+
+class VideoUploadCreateAPIView(APIView):
+    """
+    POST /api/video/uploads/
+    Starts a resumable upload of a source video. Expects the video metadata, the file name,
+    size and SHA-256 of the file, and creates the partial file the chunks are written into.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = VideoUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.save(user=request.user)
+        create_upload_file(upload)
+        return Response(
+            VideoUploadSerializer(upload).data, status=201,
+            headers={'Location': request.build_absolute_uri(f"/api/video/uploads/{upload.id}/")})
+
+
+class VideoUploadDetailAPIView(APIView):
+    """
+    GET /api/video/uploads/<uuid:upload_id>/  state and received byte ranges (to resume an upload)
+    PUT /api/video/uploads/<uuid:upload_id>/  one chunk, raw body with 'Content-Range: bytes <start>-<end>/<size>'
+    DELETE /api/video/uploads/<uuid:upload_id>/  aborts the upload
+    Chunks may be sent in any order and in parallel. The body is streamed to its offset in the partial file,
+    a chunk cut off by a disconnect still counts with the bytes that arrived. Once the upload is completing,
+    chunks are rejected with 409.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get_upload(self, request, upload_id):
+        return VideoUpload.objects.filter(pk=upload_id, user=request.user).first()
+
+    def get(self, request, upload_id):
+        upload = self.get_upload(request, upload_id)
+        if upload is None:
+            return Response({"detail": "Upload not found."}, status=404)
+        return Response(VideoUploadSerializer(upload).data)
+
+    def put(self, request, upload_id):
+        upload = self.get_upload(request, upload_id)
+        if upload is None:
+            return Response({"detail": "Upload not found."}, status=404)
+        if upload.status != VideoUpload.Status.UPLOADING:
+            return Response({"detail": f"The upload is {upload.status}."}, status=409)
+
+        start, end = parse_content_range(request.headers.get('Content-Range'), upload.size)
+        if request.stream is None:
+            raise ValidationError({'detail': 'The chunk body is empty.'})
+        written = write_chunk(upload, request.stream, start, end)
+        if written:
+            upload = record_chunk(upload.id, start, start + written)
+        if written < end - start + 1:
+            return Response(
+                {"detail": "The chunk body is shorter than its Content-Range.",
+                 "received": upload.received}, status=400)
+        return Response(VideoUploadSerializer(upload).data)
+
+    def delete(self, request, upload_id):
+        upload = self.get_upload(request, upload_id)
+        if upload is None:
+            return Response({"detail": "Upload not found."}, status=404)
+        upload.delete()
+        return Response(status=204)
+
+
+class VideoUploadCompleteAPIView(APIView):
+    """
+    POST /api/video/uploads/<uuid:upload_id>/complete/
+    Completes an upload once all bytes are received. A background job verifies the SHA-256 and creates the video,
+    which starts the HLS job: 202 while the upload is 'completing' (poll the upload detail for the video_id),
+    201 once it is complete.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, upload_id):
+        if not VideoUpload.objects.filter(pk=upload_id, user=request.user).exists():
+            return Response({"detail": "Upload not found."}, status=404)
+        upload = complete_upload(upload_id)
+        if upload.status != VideoUpload.Status.COMPLETE:
+            return Response(
+                VideoUploadSerializer(upload).data, status=202,
+                headers={'Location': request.build_absolute_uri(f"/api/video/uploads/{upload.id}/")})
+        return Response(VideoUploadSerializer(upload).data, status=201)
@@ -0,0 +1,76 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from videoflix_app.models import Video
+from videoflix_app.api.caching import bump_catalog_version
+from videoflix_app.api.catalog import refresh_category_rows
+from videoflix_app.api.thumbnails import render_thumbnail_variants, remove_stale_thumbnail_variants
+
+
+def _render(args):
+    video_id, thumbnail_name = args
+    try:
+        return render_thumbnail_variants(video_id, thumbnail_name), None
+    except Exception as e:
+        return None, str(e)
+
+
+class Command(BaseCommand):
+    """
+    Creates the WebP/JPEG thumbnail variants of existing videos.
+    Resizing is CPU bound, so the images are rendered in several processes; the results are written with bulk updates.
+    """
+
+    help = 'Backfills the resized thumbnail variants of existing videos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Render all thumbnails, not only videos without variants.')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Number of processes rendering at the same time.')
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Number of videos written per bulk update.')
+
+    def handle(self, *args, **options):
+        videos = Video.objects.exclude(thumbnail='').only(
+            'id', 'thumbnail', 'category')
+        if not options['all']:
+            videos = videos.filter(thumbnail_variants={})
+        videos = list(videos)
+
+        # the worker processes must not inherit open database connections
+        connections.close_all()
+
+        updated = 0
+        categories = set()
+        with ProcessPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            for start in range(0, len(videos), options['batch_size']):
+                batch = videos[start:start + options['batch_size']]
+                updated += self.render_batch(executor, batch)
+                categories.update(video.category for video in batch)
+
+        if updated:
+            refresh_category_rows(*categories)
+            bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(
+            f"Thumbnail variants stored for {updated} videos."))
+
+    def render_batch(self, executor, videos):
+        results = executor.map(
+            _render, [(video.id, video.thumbnail.name) for video in videos])
+
+        rendered = []
+        for video, (variants, error) in zip(videos, results):
+            if variants is None:
+                self.stderr.write(
+                    f"Could not render thumbnail of video {video.id}: {error}")
+                continue
+            video.thumbnail_variants = variants
+            rendered.append(video)
+
+        Video.objects.bulk_update(rendered, ['thumbnail_variants'])
+        for video in rendered:
+            remove_stale_thumbnail_variants(video.id, video.thumbnail_variants)
+        return len(rendered)
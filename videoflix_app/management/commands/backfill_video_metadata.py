@@ -0,0 +1,69 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from videoflix_app.models import Video
+from videoflix_app.api.caching import bump_catalog_version
+from videoflix_app.api.services import probe_source, video_metadata_from_probe
+from videoflix_app.api.storage import staged_source
+
+
+METADATA_FIELDS = ['duration', 'width', 'height',
+                   'frame_rate', 'video_codec', 'file_size']
+
+
+class Command(BaseCommand):
+    """
+    Probes the source files of existing videos with ffprobe and stores the media metadata.
+    Several files are probed in parallel and the results are written with bulk updates.
+    """
+
+    help = 'Backfills duration, dimensions, frame rate, codec and file size of existing videos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Probe all videos, not only videos without metadata.')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Number of ffprobe processes running at the same time.')
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Number of videos written per bulk update.')
+
+    def handle(self, *args, **options):
+        videos = Video.objects.exclude(video_file='').only('id', 'video_file')
+        if not options['all']:
+            videos = videos.filter(duration__isnull=True)
+
+        batch = []
+        updated = 0
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            for video in videos.iterator(chunk_size=options['batch_size']):
+                batch.append(video)
+                if len(batch) >= options['batch_size']:
+                    updated += self.probe_batch(executor, batch)
+                    batch = []
+            if batch:
+                updated += self.probe_batch(executor, batch)
+
+        if updated:
+            bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(
+            f"Metadata stored for {updated} videos."))
+
+    def probe_batch(self, executor, videos):
+        sources = executor.map(self.probe_video, videos)
+
+        probed = []
+        for video, source in zip(videos, sources):
+            if source['height'] is None and source['duration'] is None:
+                self.stderr.write(f"Could not probe video {video.id}")
+                continue
+            for field, value in video_metadata_from_probe(source).items():
+                setattr(video, field, value)
+            probed.append(video)
+
+        Video.objects.bulk_update(probed, METADATA_FIELDS)
+        return len(probed)
+
+    def probe_video(self, video):
+        with staged_source(video.video_file) as input_path:
+            return probe_source(input_path)
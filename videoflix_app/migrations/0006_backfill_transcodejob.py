@@ -0,0 +1,42 @@
+import os
+
+from django.conf import settings
+from django.db import migrations
+
+
+def create_jobs_for_existing_hls(apps, schema_editor):
+    """
+    Videos that were transcoded before jobs were tracked get a ready job for every rendition found on disk.
+    """
+    Video = apps.get_model('videoflix_app', 'Video')
+    TranscodeJob = apps.get_model('videoflix_app', 'TranscodeJob')
+    RenditionJob = apps.get_model('videoflix_app', 'RenditionJob')
+
+    for video_id in Video.objects.values_list('id', flat=True):
+        hls_root = os.path.join(settings.MEDIA_ROOT, 'hls', str(video_id))
+        if not os.path.isdir(hls_root):
+            continue
+        renditions = [
+            name for name in sorted(os.listdir(hls_root))
+            if os.path.exists(os.path.join(hls_root, name, 'index.m3u8'))
+        ]
+        if not renditions:
+            continue
+        job = TranscodeJob.objects.create(
+            video_id=video_id, status='ready', progress=100)
+        RenditionJob.objects.bulk_create([
+            RenditionJob(job=job, name=name, status='ready', progress=100)
+            for name in renditions
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_app', '0005_transcodejob'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_jobs_for_existing_hls,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-16 21:00
+
+import videoflix_app.api.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_app', '0009_video_thumbnail_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='video',
+            name='video_file',
+            field=models.FileField(storage=videoflix_app.api.storage.get_source_storage, upload_to='videos/'),
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='thumbnail',
+            field=models.ImageField(storage=videoflix_app.api.storage.get_source_storage, upload_to='thumbnails/'),
+        ),
+    ]
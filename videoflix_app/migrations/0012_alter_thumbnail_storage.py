@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-16 22:37
+
+import videoflix_app.api.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_app', '0011_videoupload'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='video',
+            name='thumbnail',
+            field=models.ImageField(storage=videoflix_app.api.storage.get_public_storage, upload_to='thumbnails/'),
+        ),
+        migrations.AlterField(
+            model_name='videoupload',
+            name='thumbnail',
+            field=models.ImageField(blank=True, storage=videoflix_app.api.storage.get_public_storage, upload_to='thumbnails/'),
+        ),
+    ]
@@ -1,13 +1,124 @@
+import uuid
+
+from django.conf import settings
 from django.db import models
 
+from .api.storage import get_public_storage, get_source_storage
+
 
 class Video(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
-    thumbnail = models.ImageField(upload_to='thumbnails/')
-    video_file = models.FileField(upload_to='videos/', blank=False, null=False)
+    thumbnail = models.ImageField(upload_to='thumbnails/', storage=get_public_storage)
+    video_file = models.FileField(upload_to='videos/', storage=get_source_storage, blank=False, null=False)
     category = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
+    duration = models.FloatField(null=True, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    frame_rate = models.FloatField(null=True, blank=True)
+    video_codec = models.CharField(max_length=50, blank=True)
+    file_size = models.BigIntegerField(null=True, blank=True)
+    # resized copies of the thumbnail: {format: {'<width>w': file name}}
+    thumbnail_variants = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        # match the cursor ordering of the video list, with and without category filter
+        indexes = [
+            models.Index(fields=['-created_at', '-id'],
+                         name='video_created_id_idx'),
+            models.Index(fields=['category', '-created_at', '-id'],
+                         name='video_category_created_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class TranscodeJob(models.Model):
+    """
+    State of the HLS transcoding of a video. There is one job per video, it is reset whenever the video is enqueued again.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        RUNNING = 'running', 'Running'
+        FAILED = 'failed', 'Failed'
+        READY = 'ready', 'Ready'
+
+    video = models.OneToOneField(
+        Video, on_delete=models.CASCADE, related_name='transcode_job')
+    status = models.CharField(
+        max_length=20, choices=Status.choices, default=Status.QUEUED)
+    progress = models.FloatField(default=0)
+    error = models.TextField(blank=True)
+    rq_job_id = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.video_id}: {self.status} ({self.progress:.0f}%)"
+
+
+class RenditionJob(models.Model):
+    """
+    State of a single rendition (e.g. 720p or the shared audio rendition) of a transcode job.
+    """
+
+    job = models.ForeignKey(
+        TranscodeJob, on_delete=models.CASCADE, related_name='renditions')
+    name = models.CharField(max_length=20)
+    status = models.CharField(
+        max_length=20, choices=TranscodeJob.Status.choices, default=TranscodeJob.Status.QUEUED)
+    progress = models.FloatField(default=0)
+    error = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['job', 'name'], name='unique_rendition_per_job'),
+        ]
+
+    def __str__(self):
+        return f"{self.job.video_id} {self.name}: {self.status}"
+
+
+class VideoUpload(models.Model):
+    """
+    Resumable chunked upload of a source video. Chunks are written to their offset in a partial file in
+    UPLOAD_DIR, the received byte ranges are tracked, and the Video is created by an RQ job once the upload is
+    complete and its SHA-256 matches.
+    """
+
+    class Status(models.TextChoices):
+        UPLOADING = 'uploading', 'Uploading'
+        COMPLETING = 'completing', 'Completing'
+        COMPLETE = 'complete', 'Complete'
+        FAILED = 'failed', 'Failed'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='video_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    title = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    category = models.CharField(max_length=100)
+    thumbnail = models.ImageField(upload_to='thumbnails/', storage=get_public_storage)
+    # merged [start, end) byte ranges that were written
+    received = models.JSONField(default=list, blank=True)
+    bytes_received = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(
+        max_length=20, choices=Status.choices, default=Status.UPLOADING)
+    error = models.TextField(blank=True)
+    video = models.OneToOneField(
+        Video, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename}: {self.status} ({self.bytes_received}/{self.size})"
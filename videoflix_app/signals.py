@@ -1,9 +1,28 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.db import transaction
 from django.dispatch import receiver
-from django_rq import get_queue
 
-from .models import Video
-from .api.services import generate_hls_for_video, delete_hls_for_video
+from .models import Video, VideoUpload
+from .api.caching import bump_catalog_version, clear_ready_renditions
+from .api.catalog import refresh_category_rows
+from .api.services import enqueue_hls_job, delete_hls_for_video, source_is_unchanged
+from .api.thumbnails import delete_thumbnail_variants, enqueue_thumbnail_job
+from .api.uploads import discard_upload_file
+
+
+@receiver(pre_save, sender=Video)
+def video_pre_save(sender, instance: Video, **kwargs):
+    """
+    Remembers the stored category and thumbnail, so a moved video also leaves its old category row
+    and thumbnail variants are only rendered for a new thumbnail.
+    """
+    instance._previous_category = None
+    instance._previous_thumbnail = None
+    if instance.pk:
+        previous = Video.objects.filter(pk=instance.pk).values_list(
+            'category', 'thumbnail').first()
+        if previous is not None:
+            instance._previous_category, instance._previous_thumbnail = previous
 
 
 @receiver(post_save, sender=Video)
@@ -11,19 +30,44 @@ def video_post_save(sender, instance: Video, created, **kwargs):
     """
     Automatically executed, when a video is uploaded. 
     If a video_file exists, a HLS will be created.
+    Nothing is enqueued if the HLS output already belongs to the current video_file.
+    Every save rebuilds the affected category rows and changes the catalog version,
+    so the cached video list is rebuilt.
     """
+    refresh_category_rows(
+        instance.category, getattr(instance, '_previous_category', None))
+    bump_catalog_version()
+    if instance.thumbnail and (instance.thumbnail.name != getattr(instance, '_previous_thumbnail', None)
+                               or not instance.thumbnail_variants):
+        transaction.on_commit(lambda: enqueue_thumbnail_job(instance.id))
     if instance.video_file:
+        if source_is_unchanged(instance):
+            print(
+                f"[SIGNAL] post_save for video {instance.id}, source unchanged - no HLS job")
+            return
         print(
             f"[SIGNAL] post_save for video {instance.id}, enqueue HLS job")
-        queue = get_queue("default")
-        queue.enqueue(generate_hls_for_video, instance.id)
+        # the job must not start before the video (e.g. of a completed upload) is committed
+        transaction.on_commit(lambda: enqueue_hls_job(instance.id))
 
 
 @receiver(post_delete, sender=Video)
 def video_post_delete(sender, instance: Video, **kwargs):
     """
     automatically executed when a video was deleted.
-    The HLS-Dir will be deleted too.
+    The HLS-Dir will be deleted too and the video is removed from the readiness index and the catalog.
     """
+    refresh_category_rows(instance.category)
+    bump_catalog_version()
     print(f"[SIGNAL] post_delete for video {instance.id}, deleting HLS-Files.")
+    clear_ready_renditions(instance.id)
     delete_hls_for_video(instance.id)
+    delete_thumbnail_variants(instance.id)
+
+
+@receiver(post_delete, sender=VideoUpload)
+def video_upload_post_delete(sender, instance: VideoUpload, **kwargs):
+    """
+    Removes the partial file of a deleted (aborted or finished) upload.
+    """
+    discard_upload_file(instance)
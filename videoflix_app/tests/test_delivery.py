@@ -0,0 +1,64 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from videoflix_app.api.delivery import (RangeNotSatisfiable, apresigned_hls_url, parse_range_header,
+                                        presigned_hls_url)
+
+
+class ParseRangeHeaderTests(SimpleTestCase):
+
+    def test_missing_or_malformed_header_is_ignored(self):
+        for header in (None, '', 'bytes=', 'bytes=-', 'items=0-10', 'bytes=0-10,20-30', 'bytes=a-b'):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range_header(header, 1000))
+
+    def test_closed_range(self):
+        self.assertEqual(parse_range_header('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_range_header(' bytes=100-199 ', 1000), (100, 199))
+
+    def test_open_range_ends_at_the_last_byte(self):
+        self.assertEqual(parse_range_header('bytes=900-', 1000), (900, 999))
+
+    def test_end_is_clamped_to_the_file(self):
+        self.assertEqual(parse_range_header('bytes=900-5000', 1000), (900, 999))
+
+    def test_suffix_range(self):
+        self.assertEqual(parse_range_header('bytes=-100', 1000), (900, 999))
+        self.assertEqual(parse_range_header('bytes=-5000', 1000), (0, 999))
+
+    def test_empty_suffix_is_not_satisfiable(self):
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range_header('bytes=-0', 1000)
+
+    def test_start_behind_the_file_is_not_satisfiable(self):
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range_header('bytes=1000-', 1000)
+
+    def test_end_before_start_is_ignored(self):
+        self.assertIsNone(parse_range_header('bytes=500-100', 1000))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                   S3_URL_EXPIRE=600)
+class PresignedUrlTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.storage = mock.Mock()
+        self.storage.url.side_effect = lambda name, expire: f'https://bucket/{name}?expire={expire}'
+
+    async def test_sync_and_async_requests_share_the_url_of_a_bucket(self):
+        url = presigned_hls_url(self.storage, '1/480p/seg.ts', now=1020)
+
+        self.assertEqual(await apresigned_hls_url(self.storage, '1/480p/seg.ts', now=1030), url)
+        self.storage.url.assert_called_once()
+
+    async def test_async_url_is_signed_once_and_cached(self):
+        first = await apresigned_hls_url(self.storage, '1/480p/seg.ts', now=1020)
+        second = await apresigned_hls_url(self.storage, '1/480p/seg.ts', now=1030)
+
+        self.assertEqual(first, second)
+        self.assertEqual(presigned_hls_url(self.storage, '1/480p/seg.ts', now=1040), first)
+        self.storage.url.assert_called_once()
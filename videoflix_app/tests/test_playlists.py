@@ -0,0 +1,135 @@
+import os
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+
+from videoflix_app.api.services import (HLS_AUDIO_RENDITION, _dash_segment_timeline, _read_playlist_entries,
+                                        _run_playlist_names, read_playlist_init_segment, split_into_chunks,
+                                        write_media_playlist)
+from videoflix_app.api.views import rewrite_media_playlist, sign_media_playlist
+
+
+SINGLE_FILE_PLAYLIST = '''#EXTM3U
+#EXT-X-VERSION:7
+#EXT-X-TARGETDURATION:6
+#EXT-X-MEDIA-SEQUENCE:0
+#EXT-X-PLAYLIST-TYPE:VOD
+#EXT-X-MAP:URI="media.m4s",BYTERANGE="800@0"
+#EXTINF:6.000000,
+#EXT-X-BYTERANGE:1000@800
+media.m4s
+#EXTINF:4.500000,
+#EXT-X-BYTERANGE:700
+media.m4s
+#EXT-X-ENDLIST
+'''
+
+
+class PlaylistTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write_playlist(self, name: str, content: str) -> str:
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+
+class ReadPlaylistTests(PlaylistTestCase):
+
+    def test_segment_entries(self):
+        path = self.write_playlist('index.m3u8', '#EXTM3U\n#EXTINF:6.0,\nsegment_000.ts\n'
+                                                 '#EXTINF:2.5,\nsegment_001.ts\n#EXT-X-ENDLIST\n')
+        self.assertEqual(_read_playlist_entries(path),
+                         [(6.0, 'segment_000.ts', None), (2.5, 'segment_001.ts', None)])
+        self.assertIsNone(read_playlist_init_segment(path))
+
+    def test_byte_ranges_without_offset_continue_the_previous_range(self):
+        path = self.write_playlist('index.m3u8', SINGLE_FILE_PLAYLIST)
+        self.assertEqual(_read_playlist_entries(path),
+                         [(6.0, 'media.m4s', (1000, 800)), (4.5, 'media.m4s', (700, 1800))])
+        self.assertEqual(read_playlist_init_segment(path), ('media.m4s', (800, 0)))
+
+
+@override_settings(HLS_SEGMENT_FORMAT='fmp4', HLS_SINGLE_FILE=True)
+class WriteMediaPlaylistTests(PlaylistTestCase):
+
+    def test_round_trip(self):
+        source = self.write_playlist('source.m3u8', SINGLE_FILE_PLAYLIST)
+        entries = _read_playlist_entries(source)
+        init_segment = read_playlist_init_segment(source)
+
+        path = os.path.join(self.tmp.name, 'index.m3u8')
+        write_media_playlist(path, entries, init_segment)
+
+        self.assertEqual(_read_playlist_entries(path), entries)
+        self.assertEqual(read_playlist_init_segment(path), init_segment)
+        with open(path) as f:
+            content = f.read()
+        self.assertIn('#EXT-X-VERSION:7\n', content)
+        self.assertIn('#EXT-X-TARGETDURATION:6\n', content)
+        self.assertTrue(content.endswith('#EXT-X-ENDLIST\n'))
+
+
+@override_settings(HLS_SEGMENT_FORMAT='mpegts', HLS_SINGLE_FILE=False)
+class StitchPlaylistTests(PlaylistTestCase):
+
+    def test_chunk_playlists_are_joined_in_order(self):
+        chunks = [
+            self.write_playlist('run_chunk_000.m3u8', '#EXTM3U\n#EXTINF:6.0,\nrun_c000_segment_000.ts\n'
+                                                      '#EXTINF:6.0,\nrun_c000_segment_001.ts\n#EXT-X-ENDLIST\n'),
+            self.write_playlist('run_chunk_001.m3u8', '#EXTM3U\n#EXTINF:6.2,\nrun_c001_segment_000.ts\n'
+                                                      '#EXTINF:1.0,\nrun_c001_segment_001.ts\n#EXT-X-ENDLIST\n'),
+        ]
+        entries = []
+        for path in chunks:
+            entries += _read_playlist_entries(path)
+        path = os.path.join(self.tmp.name, 'index.m3u8')
+        write_media_playlist(path, entries)
+
+        self.assertEqual([uri for _, uri, _ in _read_playlist_entries(path)], [
+            'run_c000_segment_000.ts', 'run_c000_segment_001.ts',
+            'run_c001_segment_000.ts', 'run_c001_segment_001.ts'])
+        with open(path) as f:
+            content = f.read()
+        self.assertIn('#EXT-X-VERSION:3\n', content)
+        self.assertIn('#EXT-X-TARGETDURATION:7\n', content)
+        self.assertNotIn('#EXT-X-MAP', content)
+
+    def test_run_playlists(self):
+        self.assertEqual(_run_playlist_names('abc', '720p', 2), ['abc_chunk_000.m3u8', 'abc_chunk_001.m3u8'])
+        self.assertEqual(_run_playlist_names('abc', HLS_AUDIO_RENDITION, 2), ['abc_audio.m3u8'])
+
+    def test_chunks_start_at_keyframes(self):
+        keyframes = [float(second) for second in range(0, 300, 2)]
+        self.assertEqual(split_into_chunks(keyframes, 300.0, 120), [(0.0, 120.0), (120.0, None)])
+
+    def test_short_tail_is_added_to_the_last_chunk(self):
+        keyframes = [float(second) for second in range(0, 250, 5)]
+        self.assertEqual(split_into_chunks(keyframes, 250.0, 100), [(0.0, 100.0), (100.0, None)])
+
+
+class RewritePlaylistTests(SimpleTestCase):
+
+    def test_segment_and_init_urls_are_absolute_and_versioned(self):
+        base_url = 'https://example.com/api/video/1/720p/'
+        content = rewrite_media_playlist(SINGLE_FILE_PLAYLIST, base_url, 42)
+
+        self.assertIn(f'#EXT-X-MAP:URI="{base_url}media.m4s/?v=42",BYTERANGE="800@0"', content)
+        self.assertEqual(content.count(f'\n{base_url}media.m4s/?v=42\n'), 2)
+        self.assertIn('#EXT-X-BYTERANGE:700\n', content)
+
+    def test_signature_is_appended_to_every_url(self):
+        content = rewrite_media_playlist(SINGLE_FILE_PLAYLIST, '/api/video/1/720p/', 42)
+        signed = sign_media_playlist(content, 42, 'u=1&exp=99&sig=abc')
+
+        self.assertEqual(signed.count('?v=42&u=1&exp=99&sig=abc'), 3)
+        self.assertEqual(sign_media_playlist(content, 42, ''), content)
+
+    def test_dash_timeline_folds_equal_durations(self):
+        entries = [(6.0, 'a', None), (6.0, 'b', None), (6.0, 'c', None), (4.5, 'd', None)]
+        self.assertEqual(_dash_segment_timeline(entries),
+                         ['<S t="0" d="6000" r="2"/>', '<S t="18000" d="4500"/>'])
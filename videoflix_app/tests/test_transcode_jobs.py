@@ -0,0 +1,100 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from videoflix_app.api.caching import get_ready_renditions, readiness_cache, refresh_ready_renditions
+from videoflix_app.api.services import (TranscodeProgress, _mark_job_queued, get_threads_per_rendition,
+                                        reset_rendition_jobs)
+from videoflix_app.models import RenditionJob, TranscodeJob, Video
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RenditionReadinessTests(TestCase):
+
+    def setUp(self):
+        readiness_cache.clear()
+        self.video = Video.objects.create(title='Video', category='drama')
+        self.job = TranscodeJob.objects.create(video=self.video, status=TranscodeJob.Status.READY)
+        RenditionJob.objects.create(job=self.job, name='720p', status=TranscodeJob.Status.READY, progress=100)
+        RenditionJob.objects.create(job=self.job, name='480p', status=TranscodeJob.Status.FAILED, error='ffmpeg')
+        refresh_ready_renditions(self.video.id)
+
+    def statuses(self) -> dict:
+        return dict(RenditionJob.objects.filter(job=self.job).values_list('name', 'status'))
+
+    def ready(self) -> frozenset:
+        readiness_cache.clear()
+        return get_ready_renditions(self.video.id)
+
+    def test_queued_job_keeps_ready_renditions(self):
+        _mark_job_queued(self.video.id, 'rq-job')
+
+        self.assertEqual(self.statuses(), {'720p': TranscodeJob.Status.READY, '480p': TranscodeJob.Status.QUEUED})
+        self.assertEqual(self.ready(), {'720p'})
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, TranscodeJob.Status.QUEUED)
+        self.assertEqual(self.job.rq_job_id, 'rq-job')
+
+    def test_chunked_reset_keeps_ready_renditions_playable(self):
+        _mark_job_queued(self.video.id, 'rq-job')
+        reset_rendition_jobs(self.job, ['480p', '720p', 'audio'], keep_ready=True)
+
+        self.assertEqual(self.statuses(), {
+            '720p': TranscodeJob.Status.READY,
+            '480p': TranscodeJob.Status.RUNNING,
+            'audio': TranscodeJob.Status.RUNNING,
+        })
+        self.assertEqual(self.ready(), {'720p'})
+
+    def test_encoded_renditions_switch_when_published(self):
+        progress = TranscodeProgress(self.job, ['480p', '720p'], duration=10)
+        progress.update(['480p', '720p'], 5)
+        progress.finish(['480p', '720p'])
+
+        self.assertEqual(self.statuses(), {'720p': TranscodeJob.Status.READY, '480p': TranscodeJob.Status.RUNNING})
+        self.assertEqual(self.ready(), {'720p'})
+
+        progress.publish(['480p', '720p'])
+
+        self.assertEqual(self.statuses(), {'720p': TranscodeJob.Status.READY, '480p': TranscodeJob.Status.READY})
+        self.assertEqual(self.ready(), {'480p', '720p'})
+
+    def test_reset_replaces_the_renditions(self):
+        reset_rendition_jobs(self.job, ['480p'])
+
+        self.assertEqual(self.statuses(), {'480p': TranscodeJob.Status.RUNNING})
+        self.assertEqual(self.ready(), frozenset())
+
+    @override_settings(HLS_READINESS_EMPTY_TIMEOUT=30)
+    def test_only_entries_with_renditions_never_expire(self):
+        with mock.patch('videoflix_app.api.caching.cache') as cache:
+            cache.get.return_value = None
+            get_ready_renditions(self.video.id)
+            get_ready_renditions(self.video.id + 1)
+
+        self.assertEqual(cache.set.call_args_list, [
+            mock.call(f'hls-ready:{self.video.id}', frozenset({'720p'}), timeout=None),
+            mock.call(f'hls-ready:{self.video.id + 1}', frozenset(), timeout=30),
+        ])
+
+
+@override_settings(HLS_THREADS_PER_RENDITION=0, HLS_MAX_PARALLEL_RENDITIONS=3)
+class ThreadBudgetTests(SimpleTestCase):
+
+    @mock.patch('os.cpu_count', return_value=8)
+    def test_cores_are_shared_between_the_encoded_renditions(self, cpu_count):
+        self.assertEqual(get_threads_per_rendition(1), 8)
+        self.assertEqual(get_threads_per_rendition(2), 4)
+        self.assertEqual(get_threads_per_rendition(3), 2)
+
+    @mock.patch('os.cpu_count', return_value=8)
+    @override_settings(HLS_MAX_PARALLEL_RENDITIONS=1)
+    def test_pool_size_limits_the_parallel_encodes(self, cpu_count):
+        self.assertEqual(get_threads_per_rendition(3), 8)
+
+    @override_settings(HLS_THREADS_PER_RENDITION=3)
+    def test_configured_budget(self):
+        self.assertEqual(get_threads_per_rendition(3), 3)
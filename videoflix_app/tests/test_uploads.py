@@ -0,0 +1,93 @@
+import hashlib
+import os
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.exceptions import ValidationError
+
+from videoflix_app.api.serializers import VideoUploadSerializer
+from videoflix_app.api.uploads import finish_upload, merge_ranges, parse_content_range, upload_path
+from videoflix_app.models import Video, VideoUpload
+
+
+class MergeRangesTests(SimpleTestCase):
+
+    def test_first_range(self):
+        self.assertEqual(merge_ranges([], 0, 100), [[0, 100]])
+
+    def test_separate_ranges_stay_sorted(self):
+        self.assertEqual(merge_ranges([[200, 300]], 0, 100), [[0, 100], [200, 300]])
+
+    def test_adjacent_ranges_are_merged(self):
+        self.assertEqual(merge_ranges([[0, 100]], 100, 200), [[0, 200]])
+
+    def test_overlapping_and_repeated_ranges_are_merged(self):
+        self.assertEqual(merge_ranges([[0, 100], [200, 300]], 50, 250), [[0, 300]])
+        self.assertEqual(merge_ranges([[0, 300]], 100, 200), [[0, 300]])
+
+
+@override_settings(UPLOAD_MAX_CHUNK_SIZE=1000)
+class ParseContentRangeTests(SimpleTestCase):
+
+    def test_inclusive_range(self):
+        self.assertEqual(parse_content_range('bytes 0-499/2000', 2000), (0, 499))
+        self.assertEqual(parse_content_range('bytes 1500-1999/2000', 2000), (1500, 1999))
+
+    def test_malformed_header(self):
+        for header in (None, '', 'bytes 0-499', 'bytes */2000', 'bytes=0-499/2000'):
+            with self.subTest(header=header), self.assertRaises(ValidationError):
+                parse_content_range(header, 2000)
+
+    def test_range_must_fit_the_upload(self):
+        for header in ('bytes 0-499/3000', 'bytes 500-499/2000', 'bytes 1500-2000/2000'):
+            with self.subTest(header=header), self.assertRaises(ValidationError):
+                parse_content_range(header, 2000)
+
+    def test_chunk_must_not_exceed_the_maximum_size(self):
+        with self.assertRaises(ValidationError):
+            parse_content_range('bytes 0-1000/2000', 2000)
+
+
+class VideoUploadSerializerTests(SimpleTestCase):
+
+    def test_thumbnail_is_required(self):
+        serializer = VideoUploadSerializer(data={
+            'filename': 'movie.mp4', 'size': 10, 'sha256': '0' * 64, 'title': 'Movie', 'category': 'drama'})
+
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('thumbnail', serializer.errors)
+
+
+class FinishUploadTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        upload_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.addCleanup(upload_dir.cleanup)
+        settings = override_settings(MEDIA_ROOT=media_root.name, UPLOAD_DIR=upload_dir.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.media_root = media_root.name
+
+        content = b'source video'
+        user = get_user_model().objects.create_user(username='uploader', password='secret')
+        self.upload = VideoUpload.objects.create(
+            user=user, filename='movie.mp4', size=len(content), sha256=hashlib.sha256(content).hexdigest(),
+            title='Movie', category='drama', thumbnail='thumbnails/movie.jpg',
+            received=[[0, len(content)]], bytes_received=len(content), status=VideoUpload.Status.COMPLETING)
+        with open(upload_path(self.upload), 'wb') as f:
+            f.write(content)
+
+    def test_moved_source_is_deleted_if_the_video_cannot_be_saved(self):
+        with mock.patch.object(Video, 'save', side_effect=DatabaseError('boom')), \
+                self.assertRaises(DatabaseError):
+            finish_upload(self.upload.id)
+
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'videos')), [])
+        self.upload.refresh_from_db()
+        self.assertEqual(self.upload.status, VideoUpload.Status.FAILED)
+        self.assertIsNone(self.upload.video)